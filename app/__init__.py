@@ -1,19 +1,44 @@
-from flask import Flask
+from flask import Flask, current_app, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from flask_migrate import Migrate
-from app.config import Config
+from app.config import Config, engine_options
 from app.custom_filters import format_number, format_datetime
+from app.compression import init_compression
+from app.replica import RoutingSession, init_replica
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 
+@event.listens_for(RoutingSession, 'after_begin')
+def _limit_request_statements(session, transaction, connection):
+    """
+    Aplica DB_STATEMENT_TIMEOUT_MS a cada transacción de una petición web en PostgreSQL
+    (SET LOCAL dura lo que la transacción). Las migraciones, la CLI y los hilos de
+    generación no tienen contexto de petición y no quedan limitados.
+    """
+    if not has_request_context() or connection.dialect.name != 'postgresql':
+        return
+    timeout = current_app.config['DB_STATEMENT_TIMEOUT_MS']
+    if timeout > 0:
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout)}")
+
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    # Opciones del pool de conexiones, salvo que la configuración las defina explícitamente
+    if not app.config.get('SQLALCHEMY_ENGINE_OPTIONS'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+    # Réplica de lectura opcional
+    init_replica(app)
     
     db.init_app(app)
     migrate.init_app(app, db)
     
+    # Compresión de las respuestas HTML y JSON
+    if app.config['COMPRESS_RESPONSES']:
+        init_compression(app)
+    
     # Registrar filtros personalizados
     app.jinja_env.filters['format_number'] = format_number
     app.jinja_env.filters['format_datetime'] = format_datetime
@@ -0,0 +1,292 @@
+"""
+Estadísticas diarias de la generación de libros (tabla daily_stats).
+
+Cada evento de la generación (capítulo guardado o fallido, ampliación, libro
+completado o con error, tokens consumidos) suma sus contadores a la fila del día
+(UTC) y el modelo con un único INSERT ... ON CONFLICT DO UPDATE, en su propia
+transacción justo después de guardar el evento. La latencia de los capítulos se
+acumula en un histograma por día (daily_latency_buckets) del que se calculan la
+media y los percentiles de cualquier rango de días sin recorrer books ni chapters.
+
+`rebuild_daily_stats` recalcula las filas a partir de books, chapters y
+generation_events para rellenar el histórico (ver `flask rebuild-stats`).
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+
+from app import db
+from app.models.stats import DailyLatencyBucket, DailyStat
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores (segundos) del histograma de latencia de los capítulos;
+# las latencias mayores se cuentan en el último intervalo
+LATENCY_BUCKETS = (5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 240, 300, 450, 600, 900, 1800, 3600)
+
+PERCENTILES = (50, 90, 95, 99)
+
+# Contadores de daily_stats que suman las consultas y la reconstrucción
+COUNTERS = (
+    'books_completed', 'books_failed', 'chapters', 'chapter_failures', 'expansions',
+    'expansion_failures', 'input_tokens', 'output_tokens', 'thinking_tokens',
+    'latency_count', 'latency_seconds_total'
+)
+
+UNKNOWN_MODEL = 'unknown'
+
+def utc_today():
+    return datetime.now(timezone.utc).date()
+
+def latency_bucket(seconds):
+    """Límite superior del intervalo del histograma en el que cae una latencia"""
+    return next((bound for bound in LATENCY_BUCKETS if seconds <= bound), LATENCY_BUCKETS[-1])
+
+def _upsert_increment(connection, table, key, values):
+    """
+    Suma `values` a la fila `key` de `table`, creándola si no existe, en una sola
+    sentencia atómica en PostgreSQL y SQLite (ON CONFLICT DO UPDATE).
+    """
+    if connection.dialect.name in ('postgresql', 'sqlite'):
+        if connection.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        statement = insert(table).values(**key, **values)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=list(key),
+            set_={column: table.c[column] + statement.excluded[column] for column in values}
+        ))
+        return
+    
+    # Otros motores: actualizar y, si la fila aún no existe, crearla
+    criteria = [table.c[column] == value for column, value in key.items()]
+    result = connection.execute(table.update().where(*criteria).values(
+        {column: table.c[column] + value for column, value in values.items()}
+    ))
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(**key, **values))
+
+def record(model, latency_seconds=None, day=None, **counts):
+    """
+    Suma contadores a la fila del día y el modelo en su propia transacción.
+    Como las trazas, un error al registrar nunca interrumpe la generación.
+    
+    Args:
+        model: Modelo de Claude que generó el contenido
+        latency_seconds: Latencia de generación de un capítulo, si aplica
+        day: Día (UTC) del evento; por defecto, hoy
+        **counts: Incrementos de las columnas de COUNTERS (p. ej. chapters=1, input_tokens=1200)
+    """
+    day = day or utc_today()
+    key = {'day': day, 'model': model or UNKNOWN_MODEL}
+    values = {column: value for column, value in counts.items() if value}
+    if latency_seconds is not None:
+        values.update(latency_count=1, latency_seconds_total=latency_seconds)
+    if not values:
+        return
+    
+    try:
+        with db.engine.begin() as connection:
+            _upsert_increment(connection, DailyStat.__table__, key, values)
+            if latency_seconds is not None:
+                _upsert_increment(
+                    connection, DailyLatencyBucket.__table__,
+                    {**key, 'le_seconds': latency_bucket(latency_seconds)},
+                    {'count': 1}
+                )
+    except Exception as e:
+        logger.error(f"No se pudieron registrar las estadísticas de {key['model']} del {day}: {str(e)}")
+
+def percentile(buckets, fraction):
+    """
+    Percentil estimado de un histograma {límite superior: recuento}, interpolando
+    linealmente dentro del intervalo (como histogram_quantile de Prometheus).
+    """
+    total = sum(buckets.values())
+    if not total:
+        return None
+    rank = fraction * total
+    lower = 0
+    seen = 0
+    for bound in sorted(buckets):
+        count = buckets[bound]
+        if count and seen + count >= rank:
+            return round(lower + (bound - lower) * (rank - seen) / count, 1)
+        seen += count
+        lower = bound
+    return float(max(buckets))
+
+def _empty_totals():
+    return {column: 0 for column in COUNTERS}
+
+def _summarize(totals, buckets):
+    """Fila de respuesta: contadores, tokens totales y latencia media y percentiles"""
+    row = {column: totals[column] for column in COUNTERS if column not in ('latency_count', 'latency_seconds_total')}
+    row['total_tokens'] = totals['input_tokens'] + totals['output_tokens'] + totals['thinking_tokens']
+    row['latency_seconds'] = {
+        'count': totals['latency_count'],
+        'mean': round(totals['latency_seconds_total'] / totals['latency_count'], 1) if totals['latency_count'] else None,
+        **{f"p{value}": percentile(buckets, value / 100) for value in PERCENTILES}
+    }
+    return row
+
+def query_stats(start, end, model=None):
+    """
+    Estadísticas entre `start` y `end` (ambos incluidos) leídas solo de las tablas diarias.
+    
+    Returns:
+        dict: 'days' (una fila por día y modelo), 'models' (totales por modelo) y 'totals'
+    """
+    stats_query = DailyStat.query.filter(DailyStat.day >= start, DailyStat.day <= end)
+    buckets_query = db.session.query(
+        DailyLatencyBucket.day, DailyLatencyBucket.model, DailyLatencyBucket.le_seconds, DailyLatencyBucket.count
+    ).filter(DailyLatencyBucket.day >= start, DailyLatencyBucket.day <= end)
+    if model:
+        stats_query = stats_query.filter(DailyStat.model == model)
+        buckets_query = buckets_query.filter(DailyLatencyBucket.model == model)
+    
+    day_buckets = {}
+    for day, row_model, le_seconds, count in buckets_query:
+        day_buckets.setdefault((day, row_model), {})[le_seconds] = count
+    
+    days = []
+    model_totals = {}
+    model_buckets = {}
+    totals = _empty_totals()
+    total_buckets = {}
+    for stat in stats_query.order_by(DailyStat.day, DailyStat.model):
+        values = {column: getattr(stat, column) for column in COUNTERS}
+        buckets = day_buckets.get((stat.day, stat.model), {})
+        days.append({'day': stat.day.isoformat(), 'model': stat.model, **_summarize(values, buckets)})
+        
+        for target, target_buckets in (
+            (model_totals.setdefault(stat.model, _empty_totals()), model_buckets.setdefault(stat.model, {})),
+            (totals, total_buckets)
+        ):
+            for column in COUNTERS:
+                target[column] += values[column]
+            for bound, count in buckets.items():
+                target_buckets[bound] = target_buckets.get(bound, 0) + count
+    
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'days': days,
+        'models': {name: _summarize(values, model_buckets[name]) for name, values in sorted(model_totals.items())},
+        'totals': _summarize(totals, total_buckets)
+    }
+
+def _day(value):
+    """Día de una fecha guardada en UTC (las columnas DateTime no guardan la zona horaria)"""
+    return value.date() if value else None
+
+def rebuild_daily_stats(since=None):
+    """
+    Recalcula las estadísticas diarias desde `since` (o todas) a partir de las tablas de origen.
+    
+    - Capítulos y sus tokens: tabla chapters, por día de creación. El modelo es el de
+      la traza más reciente del libro (o 'unknown' si no tiene trazas).
+    - Resto de tokens del libro (tabla de contenidos, capítulos fallidos o regenerados):
+      día de creación del libro.
+    - Libros completados y con error: día de su última actualización.
+    - Latencias, capítulos fallidos y ampliaciones: tramos generator.chapter y
+      generator.expansion de generation_events, con el modelo de su traza.
+    
+    No debe ejecutarse mientras se generan libros: los eventos de los días que se
+    recalculan durante la reconstrucción se perderían.
+    
+    Returns:
+        int: Número de filas (día y modelo) escritas
+    """
+    from app.models.book import Book, Chapter, GenerationEvent
+    
+    # Modelo de cada traza (atributo del tramo raíz) y del libro (su traza más reciente)
+    trace_models = {}
+    book_models = {}
+    roots = db.session.query(
+        GenerationEvent.book_id, GenerationEvent.trace_id, GenerationEvent.attributes
+    ).filter(GenerationEvent.parent_id.is_(None)).order_by(GenerationEvent.started_at)
+    for book_id, trace_id, attributes in roots:
+        model = (attributes or {}).get('model') or UNKNOWN_MODEL
+        trace_models[trace_id] = model
+        book_models[book_id] = model
+    
+    rows = {}
+    latency = {}
+    
+    def add(day, model, **values):
+        if since and day < since:
+            return
+        totals = rows.setdefault((day, model), _empty_totals())
+        for column, value in values.items():
+            totals[column] += value or 0
+    
+    chapter_tokens = {}
+    for book_id, created_at, input_tokens, output_tokens, thinking_tokens in db.session.query(
+        Chapter.book_id, Chapter.created_at, Chapter.input_tokens, Chapter.output_tokens, Chapter.thinking_tokens
+    ):
+        add(_day(created_at), book_models.get(book_id, UNKNOWN_MODEL), chapters=1,
+            input_tokens=input_tokens, output_tokens=output_tokens, thinking_tokens=thinking_tokens)
+        sums = chapter_tokens.setdefault(book_id, [0, 0, 0])
+        sums[0] += input_tokens or 0
+        sums[1] += output_tokens or 0
+        sums[2] += thinking_tokens or 0
+    
+    for book_id, created_at, last_updated, status, input_tokens, output_tokens, thinking_tokens in db.session.query(
+        Book.id, Book.created_at, Book.last_updated, Book.status,
+        Book.input_tokens, Book.output_tokens, Book.thinking_tokens
+    ):
+        model = book_models.get(book_id, UNKNOWN_MODEL)
+        sums = chapter_tokens.get(book_id, [0, 0, 0])
+        add(_day(created_at), model,
+            input_tokens=max((input_tokens or 0) - sums[0], 0),
+            output_tokens=max((output_tokens or 0) - sums[1], 0),
+            thinking_tokens=max((thinking_tokens or 0) - sums[2], 0))
+        if status in ('completed', 'error') and last_updated:
+            add(_day(last_updated), model, **{'books_completed' if status == 'completed' else 'books_failed': 1})
+    
+    spans = db.session.query(
+        GenerationEvent.trace_id, GenerationEvent.name, GenerationEvent.started_at,
+        GenerationEvent.duration_ms, GenerationEvent.status
+    ).filter(GenerationEvent.name.in_(('generator.chapter', 'generator.expansion')))
+    for trace_id, name, started_at, duration_ms, status in spans:
+        day, model = _day(started_at), trace_models.get(trace_id, UNKNOWN_MODEL)
+        if name == 'generator.expansion':
+            add(day, model, **{'expansions' if status == 'ok' else 'expansion_failures': 1})
+        elif status != 'ok':
+            add(day, model, chapter_failures=1)
+        elif not since or day >= since:
+            seconds = duration_ms / 1000
+            add(day, model, latency_count=1, latency_seconds_total=seconds)
+            bucket = latency.setdefault((day, model), {})
+            bound = latency_bucket(seconds)
+            bucket[bound] = bucket.get(bound, 0) + 1
+    
+    stats = DailyStat.__table__
+    buckets = DailyLatencyBucket.__table__
+    connection = db.session.connection()
+    for table in (stats, buckets):
+        delete = table.delete()
+        if since:
+            delete = delete.where(table.c.day >= since)
+        connection.execute(delete)
+    if rows:
+        connection.execute(stats.insert(), [{'day': day, 'model': model, **values} for (day, model), values in rows.items()])
+    bucket_rows = [
+        {'day': day, 'model': model, 'le_seconds': bound, 'count': count}
+        for (day, model), counts in latency.items() for bound, count in counts.items()
+    ]
+    if bucket_rows:
+        connection.execute(buckets.insert(), bucket_rows)
+    db.session.commit()
+    logger.info(f"Estadísticas diarias reconstruidas: {len(rows)} filas")
+    return len(rows)
+
+def default_range(days=30):
+    """Rango por defecto de /api/stats: los últimos `days` días, hoy incluido"""
+    end = utc_today()
+    return end - timedelta(days=days - 1), end
+
+def parse_day(value):
+    """Convierte AAAA-MM-DD en date (ValueError si el formato no es válido)"""
+    return datetime.strptime(value, '%Y-%m-%d').date()
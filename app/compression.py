@@ -0,0 +1,131 @@
+import gzip
+import zlib
+from flask import Response, current_app, request, stream_with_context
+
+try:
+    # Dependencia opcional: si no está instalada solo se usa gzip
+    import brotli
+except ImportError:
+    brotli = None
+
+# Sufijos que se añaden al ETag de cada codificación (el ETag fuerte identifica la representación)
+ETAG_SUFFIXES = {'br': '-br', 'gzip': '-gzip'}
+
+def _strip_etag_suffixes():
+    """
+    Quita de If-None-Match los sufijos de codificación para que las vistas comparen
+    con su ETag original; se guarda el valor recibido para las respuestas 304.
+    """
+    header = request.environ.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return
+    request.environ['libros.if_none_match'] = header
+    for suffix in ETAG_SUFFIXES.values():
+        header = header.replace(f'{suffix}"', '"')
+    request.environ['HTTP_IF_NONE_MATCH'] = header
+
+def _choose_encoding(app):
+    encodings = ['br', 'gzip'] if brotli is not None and app.config['COMPRESS_BROTLI'] else ['gzip']
+    return request.accept_encodings.best_match(encodings)
+
+def _compress(data, encoding, app):
+    if encoding == 'br':
+        return brotli.compress(data, quality=app.config['COMPRESS_BROTLI_QUALITY'])
+    return gzip.compress(data, compresslevel=app.config['COMPRESS_LEVEL'], mtime=0)
+
+def _compress_chunks(chunks, encoding, app):
+    """Comprime un flujo de bloques, vaciando el compresor tras cada uno para no retrasar el envío"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=app.config['COMPRESS_BROTLI_QUALITY'])
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        # wbits=31: formato gzip
+        compressor = zlib.compressobj(app.config['COMPRESS_LEVEL'], zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+def compressed_stream_response(chunks, mimetype, etag=None):
+    """
+    Respuesta en streaming comprimida al vuelo según Accept-Encoding.
+    El hook de after_request no comprime respuestas en streaming, así que las
+    vistas que generan JSON o HTML grandes por bloques usan esta función.
+    
+    Args:
+        chunks: Iterable de bloques de bytes
+        mimetype: Tipo MIME de la respuesta
+        etag: ETag fuerte de la representación sin comprimir (opcional)
+    """
+    app = current_app
+    encoding = _choose_encoding(app) if app.config['COMPRESS_RESPONSES'] else None
+    if encoding:
+        chunks = _compress_chunks(chunks, encoding, app)
+    
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if etag:
+        response.set_etag(f"{etag}{ETAG_SUFFIXES[encoding]}" if encoding else etag)
+    return response
+
+def _is_compressible(response, app):
+    return (
+        response.mimetype in app.config['COMPRESS_MIMETYPES']
+        and not response.direct_passthrough
+        and not response.is_streamed
+        and 'Content-Encoding' not in response.headers
+    )
+
+def _restore_not_modified_etag(response):
+    """Las respuestas 304 devuelven el ETag con el sufijo que conoce el cliente"""
+    original = request.environ.get('libros.if_none_match')
+    etag, weak = response.get_etag()
+    if not original or not etag or weak:
+        return
+    for suffix in ETAG_SUFFIXES.values():
+        if f'"{etag}{suffix}"' in original:
+            response.set_etag(f"{etag}{suffix}")
+            return
+
+def init_compression(app):
+    """
+    Comprime con brotli o gzip las respuestas HTML, JSON y de texto que superan
+    COMPRESS_MIN_SIZE. Las respuestas en streaming (SSE, ZIP, archivos) no se tocan.
+    """
+    
+    @app.before_request
+    def _prepare_conditional_request():
+        _strip_etag_suffixes()
+    
+    @app.after_request
+    def _compress_response(response):
+        if response.status_code == 304:
+            _restore_not_modified_etag(response)
+            return response
+        
+        if response.status_code != 200 or not _is_compressible(response, app):
+            return response
+        
+        response.vary.add('Accept-Encoding')
+        encoding = _choose_encoding(app)
+        if not encoding:
+            return response
+        
+        data = response.get_data()
+        if len(data) < app.config['COMPRESS_MIN_SIZE']:
+            return response
+        
+        response.set_data(_compress(data, encoding, app))
+        response.headers['Content-Encoding'] = encoding
+        
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(f"{etag}{ETAG_SUFFIXES[encoding]}")
+        return response
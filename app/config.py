@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,8 +9,109 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Pool de conexiones (ver engine_options). La generación solo usa una conexión durante
+    # cada escritura corta, así que el pool se dimensiona para las peticiones web.
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))  # Espera máxima (s) por una conexión libre
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # Reabrir conexiones con más de N segundos (-1 = nunca)
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    # Límite (ms) de cada sentencia de las peticiones web en PostgreSQL (0 = sin límite).
+    # No se aplica a las migraciones, la CLI ni los hilos de generación.
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+    
+    # Réplica de lectura opcional para las vistas GET y las exportaciones (ver app/replica.py)
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL') or None
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))
+    REPLICA_LAG_CHECK_SECONDS = float(os.environ.get('REPLICA_LAG_CHECK_SECONDS', 2))
+    # Tiempo que un cliente lee de la base de datos principal después de escribir
+    REPLICA_READ_YOUR_WRITES_SECONDS = int(os.environ.get('REPLICA_READ_YOUR_WRITES_SECONDS', 30))
+    
     # Configuración de Claude API
     CLAUDE_API_KEY = os.environ.get('CLAUDE_API_KEY')
     CLAUDE_API_URL = 'https://api.anthropic.com/v1/messages'
     CLAUDE_MODEL = os.environ.get('CLAUDE_MODEL')  
-    MAX_TOKENS = 100000  # Límite de tokens para las respuestas
\ No newline at end of file
+    MAX_TOKENS = 100000  # Límite de tokens para las respuestas
+    # Pausa (segundos) entre capítulos para no sobrecargar la API
+    CHAPTER_PAUSE_SECONDS = float(os.environ.get('CHAPTER_PAUSE_SECONDS', 2))
+    
+    # Comprobación de la API de Claude sin consumo de tokens (ver app/services/claude_health.py)
+    CLAUDE_HEALTH_MONITOR = os.environ.get('CLAUDE_HEALTH_MONITOR', 'true').lower() == 'true'
+    CLAUDE_HEALTH_INTERVAL_SECONDS = float(os.environ.get('CLAUDE_HEALTH_INTERVAL_SECONDS', 30))
+    CLAUDE_HEALTH_TTL_SECONDS = float(os.environ.get('CLAUDE_HEALTH_TTL_SECONDS', 60))
+    CLAUDE_HEALTH_PROBE_TIMEOUT = float(os.environ.get('CLAUDE_HEALTH_PROBE_TIMEOUT', 5))
+    # Archivo compartido por los procesos del servidor con el último resultado
+    CLAUDE_HEALTH_FILE = os.environ.get('CLAUDE_HEALTH_FILE', os.path.join(tempfile.gettempdir(), 'libros_claude_health.json'))
+    
+    # Intervalo de latido (segundos) de los canales Server-Sent Events
+    SSE_HEARTBEAT_SECONDS = int(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+    
+    # Compresión de respuestas (brotli se usa si el paquete opcional 'brotli' está instalado)
+    COMPRESS_RESPONSES = os.environ.get('COMPRESS_RESPONSES', 'true').lower() == 'true'
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+    COMPRESS_BROTLI = os.environ.get('COMPRESS_BROTLI', 'true').lower() == 'true'
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 5))
+    COMPRESS_MIMETYPES = {'text/html', 'application/json', 'text/plain', 'text/css', 'application/javascript', 'text/markdown'}
+    
+    # Tiempo (segundos) que se cachean las URL versionadas (?v=) de libros completados
+    BOOK_CACHE_MAX_AGE = int(os.environ.get('BOOK_CACHE_MAX_AGE', 86400))
+    
+    # Endpoint /metrics con las métricas en formato Prometheus
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    
+    # Token de los endpoints de administración (/admin/...); sin token quedan desactivados
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+    
+    # Perfilado de trabajos: tipos que se perfilan siempre ('generation', 'export'), separados por comas.
+    # Con ADMIN_TOKEN, una petición también puede pedirlo con la cabecera X-Profile: sample|cprofile
+    PROFILE_JOBS = {job.strip() for job in os.environ.get('PROFILE_JOBS', '').split(',') if job.strip()}
+    PROFILER = os.environ.get('PROFILER', 'sample')  # 'sample' (pilas colapsadas) o 'cprofile' (pstats)
+    PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', 0.005))
+    PROFILE_CPU_ONLY = os.environ.get('PROFILE_CPU_ONLY', 'true').lower() == 'true'
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'libros_profiles'))
+    PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 200))
+    
+    # Caché de páginas renderizadas (índice y libros completados) por versión
+    PAGE_CACHE_ENABLED = os.environ.get('PAGE_CACHE_ENABLED', 'true').lower() == 'true'
+    PAGE_CACHE_MAX_BYTES = int(os.environ.get('PAGE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    # Directorio compartido entre procesos (vacío = solo la caché en memoria de cada proceso)
+    PAGE_CACHE_DIR = os.environ.get('PAGE_CACHE_DIR') or None
+    
+    # Caché en disco de los libros exportados
+    EXPORT_CACHE_DIR = os.environ.get('EXPORT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'libros_export_cache'))
+    EXPORT_CACHE_MAX_BYTES = int(os.environ.get('EXPORT_CACHE_MAX_BYTES', 500 * 1024 * 1024))
+    EXPORT_PRERENDER_ON_COMPLETE = os.environ.get('EXPORT_PRERENDER_ON_COMPLETE', 'true').lower() == 'true'
+    
+    # Exportador DOCX: 'python-docx' (modelo de objetos completo) o 'streaming' (XML escrito capítulo a capítulo)
+    DOCX_WRITER = os.environ.get('DOCX_WRITER', 'python-docx')
+    
+    # Pool de procesos para exportar libros grandes y el catálogo completo (0 o 1 = sin pool)
+    EXPORT_POOL_WORKERS = int(os.environ.get('EXPORT_POOL_WORKERS', os.cpu_count() or 1))
+    # Capítulos a partir de los cuales un único libro se reparte entre los procesos
+    # (los libros generados tienen 10)
+    EXPORT_POOL_MIN_CHAPTERS = int(os.environ.get('EXPORT_POOL_MIN_CHAPTERS', 10))
+
+def engine_options(config, url=None):
+    """
+    Construye las opciones del motor de `url` (por defecto, SQLALCHEMY_DATABASE_URI)
+    a partir de las opciones DB_* de la configuración.
+    
+    SQLite conserva el pool que elige SQLAlchemy (no admite tamaño ni desbordamiento
+    en memoria). El límite por sentencia no es una opción del motor: se fija en cada
+    transacción de las peticiones web (ver app/__init__.py).
+    """
+    from sqlalchemy.engine import make_url
+    
+    options = {'pool_pre_ping': config['DB_POOL_PRE_PING']}
+    url = make_url(url or config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite':
+        return options
+    
+    options.update(
+        pool_size=config['DB_POOL_SIZE'],
+        max_overflow=config['DB_MAX_OVERFLOW'],
+        pool_timeout=config['DB_POOL_TIMEOUT'],
+        pool_recycle=config['DB_POOL_RECYCLE']
+    )
+    return options
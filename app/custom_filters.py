@@ -1,6 +1,9 @@
 from datetime import datetime, timezone
 import pytz
 
+# Zona horaria de Austria, creada una sola vez (pytz.timezone() no es gratuito por llamada)
+VIENNA_TZ = pytz.timezone('Europe/Vienna')
+
 def format_number(value):
     """Formatea un número con separadores de miles"""
     try:
@@ -28,8 +31,7 @@ def format_datetime(value):
         value = pytz.utc.localize(value)
     
     # Convertir a la zona horaria de Austria (Viena)
-    austria_tz = pytz.timezone('Europe/Vienna')
-    austria_time = value.astimezone(austria_tz)
+    austria_time = value.astimezone(VIENNA_TZ)
     
     # Formato: dd/mm/yyyy HH:MM (hora de Viena)
     return austria_time.strftime('%d/%m/%Y %H:%M') + ' (hora de Viena)'
\ No newline at end of file
@@ -0,0 +1,295 @@
+"""
+Métricas de la aplicación en el formato de texto de Prometheus (expuestas en /metrics).
+
+Registro mínimo y seguro entre hilos de contadores, medidores e histogramas con
+etiquetas. Los valores son del proceso actual: con varios procesos de servidor,
+Prometheus debe consultar cada uno (o sumarlos por instancia).
+"""
+import math
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Límites (segundos) de los histogramas de latencia de la API de Claude
+API_LATENCY_BUCKETS = (1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120, 180, 240, 300, math.inf)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Metric:
+    """Base de las métricas: nombre, ayuda y valores por combinación de etiquetas"""
+    
+    TYPE = None
+    
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        # Las métricas sin etiquetas se exponen desde el principio con valor 0
+        if not self.labelnames and self.TYPE != 'histogram':
+            self._values[()] = 0
+    
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"La métrica {self.name} requiere las etiquetas {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+    
+    def samples(self):
+        """Devuelve las líneas de la métrica en el formato de exposición"""
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+    
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+        lines.extend(self.samples())
+        return lines
+
+class Counter(Metric):
+    """Contador que solo aumenta (p. ej. respuestas recibidas por código de estado)"""
+    
+    TYPE = 'counter'
+    
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    """
+    Medidor de un valor que sube y baja. Con `set_function` el valor se calcula
+    en cada consulta de /metrics (dentro del contexto de la aplicación).
+    """
+    
+    TYPE = 'gauge'
+    
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+    
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+    
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+    
+    @contextmanager
+    def track_inprogress(self, **labels):
+        """Incrementa el medidor mientras se ejecuta el bloque"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+    
+    def set_function(self, function):
+        self._function = function
+    
+    def samples(self):
+        if self._function is not None:
+            try:
+                self.set(self._function())
+            except Exception as e:
+                logger.error(f"No se pudo calcular la métrica {self.name}: {str(e)}")
+        return super().samples()
+
+class Histogram(Metric):
+    """Histograma acumulado por intervalos, con suma y número de observaciones"""
+    
+    TYPE = 'histogram'
+    
+    def __init__(self, name, documentation, labelnames=(), buckets=API_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        buckets = tuple(sorted(buckets))
+        if buckets[-1] != math.inf:
+            buckets += (math.inf,)
+        self.buckets = buckets
+    
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+    
+    @contextmanager
+    def time(self, **labels):
+        """Observa la duración (segundos) del bloque"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+    
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        lines = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class MetricsRegistry:
+    """Conjunto de métricas que se exponen juntas"""
+    
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+    
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Métrica duplicada: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+    
+    def render(self):
+        """Texto completo para /metrics"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = MetricsRegistry()
+
+# API de Claude
+CLAUDE_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'claude_api_request_duration_seconds',
+    'Duración de cada llamada HTTP a la API de Claude.',
+    ['model', 'status']
+))
+CLAUDE_TIME_TO_FIRST_BYTE = REGISTRY.register(Histogram(
+    'claude_api_time_to_first_byte_seconds',
+    'Tiempo hasta recibir las cabeceras de la respuesta (la API se llama sin streaming).',
+    ['model']
+))
+CLAUDE_OUTPUT_TOKENS_PER_SECOND = REGISTRY.register(Histogram(
+    'claude_api_output_tokens_per_second',
+    'Tokens de salida por segundo de las respuestas correctas.',
+    ['model'],
+    buckets=(5, 10, 20, 30, 40, 50, 60, 80, 100, 150, 200)
+))
+CLAUDE_RESPONSES = REGISTRY.register(Counter(
+    'claude_api_responses_total',
+    'Respuestas de la API de Claude por código de estado (timeout y connection_error si no hubo respuesta).',
+    ['model', 'status']
+))
+CLAUDE_RETRIES = REGISTRY.register(Counter(
+    'claude_api_retries_total',
+    'Reintentos de llamadas a la API de Claude por causa.',
+    ['model', 'cause']
+))
+CLAUDE_TOKENS = REGISTRY.register(Counter(
+    'claude_api_tokens_total',
+    'Tokens consumidos en la API de Claude por tipo (input, output, thinking).',
+    ['model', 'type']
+))
+
+# Generación de libros
+CHAPTERS_GENERATED = REGISTRY.register(Counter(
+    'book_chapters_generated_total',
+    'Capítulos generados correctamente (rate() * 60 = capítulos por minuto).',
+    ['model']
+))
+CHAPTER_GENERATION_SECONDS = REGISTRY.register(Histogram(
+    'book_chapter_generation_seconds',
+    'Duración de la generación de un capítulo, incluida su ampliación.',
+    ['model'],
+    buckets=(30, 60, 90, 120, 180, 240, 300, 420, 600, 900)
+))
+CHAPTER_EXPANSIONS = REGISTRY.register(Counter(
+    'book_chapter_expansions_total',
+    'Capítulos demasiado cortos que se pidieron ampliar, por resultado (expanded, failed).',
+    ['outcome']
+))
+CHAPTER_WORD_SHORTFALL = REGISTRY.register(Histogram(
+    'book_chapter_word_shortfall_words',
+    'Palabras que faltaban hasta el objetivo en los capítulos que se pidieron ampliar.',
+    buckets=(250, 500, 1000, 1500, 2000, 2500, 3000, 3450)
+))
+GENERATIONS_ACTIVE = REGISTRY.register(Gauge(
+    'book_generations_active',
+    'Hilos de generación o regeneración en curso en este proceso.'
+))
+GENERATION_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'book_generation_queue_depth',
+    'Capítulos pendientes de los libros en proceso de generación.'
+))
+
+# Exportaciones
+EXPORT_SECONDS = REGISTRY.register(Histogram(
+    'book_export_duration_seconds',
+    'Duración de la generación de un archivo exportado (sin contar los servidos desde caché).',
+    ['format', 'exporter'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+))
+EXPORT_CACHE_REQUESTS = REGISTRY.register(Counter(
+    'book_export_cache_requests_total',
+    'Peticiones de exportación por formato y resultado de la caché (hit, miss).',
+    ['format', 'result']
+))
+
+# Réplica de lectura
+DB_READ_REQUESTS = REGISTRY.register(Counter(
+    'db_read_requests_total',
+    'Peticiones de las vistas de solo lectura por base de datos usada (replica, primary).',
+    ['target']
+))
+DB_REPLICA_LAG_SECONDS = REGISTRY.register(Gauge(
+    'db_replica_lag_seconds',
+    'Retraso estimado de la réplica en la última medida.'
+))
+
+# Estado de la API de Claude (comprobaciones sin consumo de tokens)
+CLAUDE_API_UP = REGISTRY.register(Gauge(
+    'claude_api_up',
+    'Resultado de la última comprobación de la API de Claude hecha por este proceso (1 = disponible).'
+))
+CLAUDE_HEALTH_CHECKS = REGISTRY.register(Counter(
+    'claude_health_checks_total',
+    'Comprobaciones de la API de Claude por resultado (ok, error).',
+    ['result']
+))
@@ -1,2 +1,3 @@
 # Este archivo permite importar los modelos desde app.models
-from .book import *
\ No newline at end of file
+from .book import *
+from .stats import *
\ No newline at end of file
@@ -1,5 +1,9 @@
+import json
 import uuid
+import zlib
 from datetime import datetime, timezone
+from sqlalchemy import event
+from sqlalchemy.ext.hybrid import hybrid_property
 from app import db
 
 def generate_uuid():
@@ -9,23 +13,39 @@ def get_utc_now():
     """Devuelve la fecha y hora actual en UTC con información de zona horaria"""
     return datetime.now(timezone.utc)
 
+def compress_text(text):
+    """Comprime un texto con zlib para almacenarlo en una columna binaria"""
+    if text is None:
+        return None
+    return zlib.compress(text.encode('utf-8'), 6)
+
+def decompress_text(data):
+    """Recupera el texto almacenado con compress_text"""
+    if data is None:
+        return None
+    return zlib.decompress(data).decode('utf-8')
+
 class Book(db.Model):
     __tablename__ = 'books'
     
     id = db.Column(db.Integer, primary_key=True)
     uuid = db.Column(db.String(36), default=generate_uuid, unique=True, nullable=False)
-    title = db.Column(db.String(255), nullable=False)
+    title = db.Column(db.String(255), nullable=False, index=True)
     market_niche = db.Column(db.String(255), nullable=False)
     purpose = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.DateTime, default=get_utc_now)
+    created_at = db.Column(db.DateTime, default=get_utc_now, index=True)
     input_tokens = db.Column(db.Integer, default=0)
     output_tokens = db.Column(db.Integer, default=0)
     thinking_tokens = db.Column(db.Integer, default=0)  # Nuevo campo para tokens de pensamiento extendido
-    status = db.Column(db.String(20), default='processing')  # 'processing', 'completed', 'error'
+    status = db.Column(db.String(20), default='processing', index=True)  # 'processing', 'completed', 'error'
     error_message = db.Column(db.Text)
     last_updated = db.Column(db.DateTime, default=get_utc_now, onupdate=get_utc_now)
+    # Contadores desnormalizados para servir el progreso sin cargar los capítulos
+    completed_chapters = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    progress_version = db.Column(db.Integer, default=0, nullable=False, server_default='0')
     
     chapters = db.relationship('Chapter', backref='book', lazy=True, cascade="all, delete-orphan")
+    generation_events = db.relationship('GenerationEvent', backref='book', lazy='dynamic', cascade="all, delete-orphan")
     
     def __repr__(self):
         return f'<Book {self.title}>'
@@ -43,18 +63,33 @@ class Book(db.Model):
             'input_tokens': self.input_tokens,
             'output_tokens': self.output_tokens,
             'thinking_tokens': self.thinking_tokens,  # Incluir tokens de pensamiento en la serialización
+            'completed_chapters': self.completed_chapters,
+            'progress_version': self.progress_version,
             'chapters': [chapter.to_dict() for chapter in sorted(self.chapters, key=lambda x: x.chapter_number)]
         }
 
 class Chapter(db.Model):
     __tablename__ = 'chapters'
+    __table_args__ = (
+        # Un libro no puede tener dos capítulos con el mismo número
+        db.Index('ix_chapters_book_id_chapter_number', 'book_id', 'chapter_number', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False)
     chapter_number = db.Column(db.Integer, nullable=False)
     title = db.Column(db.String(255), nullable=False)
     scope = db.Column(db.Text, nullable=False)
-    content = db.Column(db.Text, nullable=False)
+    # El contenido se guarda comprimido y no se carga salvo que se acceda a él
+    content_data = db.deferred(db.Column(db.LargeBinary, nullable=False))
+    word_count = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    # Representación prerenderizada del contenido (ver ChapterRenderer)
+    content_hash = db.Column(db.String(64))
+    content_html_data = db.deferred(db.Column(db.LargeBinary))
+    # Bloques (tipo, texto) que usan los exportadores, en JSON comprimido
+    blocks_data = db.deferred(db.Column(db.LargeBinary))
+    # Esquema y metadatos: versión, encabezados, índice y recuento de palabras
+    structure = db.deferred(db.Column(db.JSON))
     input_tokens = db.Column(db.Integer, default=0)
     output_tokens = db.Column(db.Integer, default=0)
     thinking_tokens = db.Column(db.Integer, default=0)  # Nuevo campo para tokens de pensamiento extendido
@@ -63,6 +98,44 @@ class Chapter(db.Model):
     def __repr__(self):
         return f'<Chapter {self.chapter_number}: {self.title}>'
     
+    @hybrid_property
+    def content(self):
+        """Texto del capítulo, descomprimido de forma transparente"""
+        return decompress_text(self.content_data)
+    
+    @content.setter
+    def content(self, value):
+        self.content_data = compress_text(value)
+    
+    @content.expression
+    def content(cls):
+        # A nivel SQL solo existe la columna comprimida
+        return cls.content_data
+    
+    @hybrid_property
+    def content_html(self):
+        """HTML prerenderizado del capítulo, comprimido como el contenido"""
+        return decompress_text(self.content_html_data)
+    
+    @content_html.setter
+    def content_html(self, value):
+        self.content_html_data = compress_text(value)
+    
+    @content_html.expression
+    def content_html(cls):
+        return cls.content_html_data
+    
+    @property
+    def blocks(self):
+        """Bloques prerenderizados del capítulo como lista de tuplas (tipo, texto)"""
+        if self.blocks_data is None:
+            return None
+        return [tuple(block) for block in json.loads(decompress_text(self.blocks_data))]
+    
+    @blocks.setter
+    def blocks(self, value):
+        self.blocks_data = compress_text(json.dumps(value, ensure_ascii=False)) if value is not None else None
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -71,8 +144,86 @@ class Chapter(db.Model):
             'title': self.title,
             'scope': self.scope,
             'content': self.content,
+            'word_count': self.word_count,
             'input_tokens': self.input_tokens,
             'output_tokens': self.output_tokens,
             'thinking_tokens': self.thinking_tokens,  # Incluir tokens de pensamiento
             'created_at': self.created_at.isoformat() if self.created_at else None
-        }
\ No newline at end of file
+        }
+
+class GenerationEvent(db.Model):
+    """Tramo de una traza de generación (ver app.tracing)"""
+    __tablename__ = 'generation_events'
+    __table_args__ = (
+        db.Index('ix_generation_events_book_id_started_at', 'book_id', 'started_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False)
+    trace_id = db.Column(db.String(32), nullable=False)
+    span_id = db.Column(db.String(16), nullable=False)
+    parent_id = db.Column(db.String(16))
+    name = db.Column(db.String(100), nullable=False)
+    started_at = db.Column(db.DateTime, nullable=False)
+    duration_ms = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(20), default='ok', nullable=False)
+    attributes = db.Column(db.JSON)
+    
+    def __repr__(self):
+        return f'<GenerationEvent {self.name} ({self.duration_ms:.0f} ms)>'
+    
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'duration_ms': self.duration_ms,
+            'status': self.status,
+            'attributes': self.attributes or {}
+        }
+
+def _bump_book_progress(connection, book_id, delta):
+    """
+    Ajusta el contador de capítulos y la versión de progreso de un libro
+    dentro de la misma transacción en la que se guarda o elimina el capítulo.
+    """
+    books = Book.__table__
+    connection.execute(
+        books.update()
+        .where(books.c.id == book_id)
+        .values(
+            completed_chapters=books.c.completed_chapters + delta,
+            progress_version=books.c.progress_version + 1,
+            last_updated=get_utc_now()
+        )
+    )
+
+@event.listens_for(Chapter, 'before_insert')
+@event.listens_for(Chapter, 'before_update')
+def _update_word_count(mapper, connection, target):
+    """Mantiene el recuento de palabras para no tener que cargar el contenido al mostrarlo"""
+    if db.inspect(target).attrs.content_data.history.has_changes():
+        target.word_count = len((target.content or '').split())
+
+@event.listens_for(Chapter, 'after_insert')
+def _chapter_inserted(mapper, connection, target):
+    _bump_book_progress(connection, target.book_id, 1)
+
+@event.listens_for(Chapter, 'after_delete')
+def _chapter_deleted(mapper, connection, target):
+    _bump_book_progress(connection, target.book_id, -1)
+
+# Columnas visibles del libro: si cambia alguna, cambia su versión (y sus ETags)
+VERSIONED_BOOK_COLUMNS = (
+    'title', 'market_niche', 'purpose', 'status', 'error_message',
+    'input_tokens', 'output_tokens', 'thinking_tokens'
+)
+
+@event.listens_for(Book, 'before_update')
+def _book_changed(mapper, connection, target):
+    """Incrementa la versión de progreso cuando cambia el estado, el error o cualquier otro dato visible"""
+    state = db.inspect(target)
+    if any(state.attrs[column].history.has_changes() for column in VERSIONED_BOOK_COLUMNS):
+        target.progress_version = Book.progress_version + 1
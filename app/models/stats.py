@@ -0,0 +1,36 @@
+from app import db
+
+class DailyStat(db.Model):
+    """Totales de generación de un día (UTC) y un modelo de Claude (ver app.analytics)"""
+    __tablename__ = 'daily_stats'
+    
+    day = db.Column(db.Date, primary_key=True)
+    model = db.Column(db.String(100), primary_key=True)
+    books_completed = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    books_failed = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    chapters = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    chapter_failures = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    expansions = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    expansion_failures = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    input_tokens = db.Column(db.BigInteger, default=0, nullable=False, server_default='0')
+    output_tokens = db.Column(db.BigInteger, default=0, nullable=False, server_default='0')
+    thinking_tokens = db.Column(db.BigInteger, default=0, nullable=False, server_default='0')
+    # Latencia de generación de los capítulos: número de medidas y suma, para la media
+    latency_count = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    latency_seconds_total = db.Column(db.Float, default=0, nullable=False, server_default='0')
+    
+    def __repr__(self):
+        return f'<DailyStat {self.day} {self.model}>'
+
+class DailyLatencyBucket(db.Model):
+    """Histograma de la latencia de los capítulos de un día y un modelo, para calcular percentiles"""
+    __tablename__ = 'daily_latency_buckets'
+    
+    day = db.Column(db.Date, primary_key=True)
+    model = db.Column(db.String(100), primary_key=True)
+    # Límite superior del intervalo en segundos (ver analytics.LATENCY_BUCKETS)
+    le_seconds = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    
+    def __repr__(self):
+        return f'<DailyLatencyBucket {self.day} {self.model} <={self.le_seconds}s>'
@@ -0,0 +1,229 @@
+"""
+Perfilado bajo demanda de trabajos de generación y de exportación.
+
+Un trabajo se perfila si su tipo está en PROFILE_JOBS o si la petición que lo
+inicia lleva la cabecera `X-Profile: sample|cprofile` junto con el token de
+administración. Hay dos perfiladores:
+
+- 'sample': un hilo toma cada PROFILE_SAMPLE_INTERVAL segundos la pila del hilo
+  del trabajo y acumula pilas colapsadas (formato de flamegraph.pl / speedscope).
+  Con PROFILE_CPU_ONLY se descartan las muestras en las que el hilo no consumió
+  CPU (esperas de red, sleep), para que destaquen los puntos calientes.
+- 'cprofile': cProfile sobre el hilo del trabajo, guardado como archivo pstats.
+
+Los resultados se guardan por libro en PROFILE_DIR y se descargan desde /admin/profiles.
+"""
+import os
+import re
+import sys
+import time
+import hmac
+import cProfile
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from flask import current_app, request
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PROFILERS = ('sample', 'cprofile')
+
+# Nombre de los archivos guardados: <uuid>-<trabajo>-<fecha>.<extensión>
+PROFILE_NAME_PATTERN = re.compile(r'^(?P<book>[0-9a-f-]{36})-(?P<job>[a-z0-9_-]+?)-(?P<created>\d{8}T\d{6}\d*)\.(?P<ext>folded|pstats)$')
+
+def _frame_label(frame):
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', '?')
+    return f"{module}.{getattr(code, 'co_qualname', code.co_name)}:{frame.f_lineno}"
+
+def _thread_cpu_clock(thread_id):
+    """Reloj de CPU de un hilo (solo en plataformas con pthread_getcpuclockid)"""
+    try:
+        clock_id = time.pthread_getcpuclockid(thread_id)
+        time.clock_gettime(clock_id)
+        return clock_id
+    except (AttributeError, OSError):
+        return None
+
+class SamplingProfiler:
+    """Perfilador por muestreo de un hilo, con un coste que no depende del número de llamadas"""
+    
+    extension = 'folded'
+    
+    def __init__(self, interval=0.005, cpu_only=True):
+        self.interval = interval
+        self.cpu_only = cpu_only
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._sampler = None
+    
+    def start(self):
+        self._target = threading.get_ident()
+        self._cpu_clock = _thread_cpu_clock(self._target) if self.cpu_only else None
+        self._sampler = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+        self._sampler.start()
+    
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+    
+    def _run(self):
+        last_cpu = time.clock_gettime(self._cpu_clock) if self._cpu_clock is not None else None
+        while not self._stop.wait(self.interval):
+            if self._cpu_clock is not None:
+                cpu = time.clock_gettime(self._cpu_clock)
+                busy = cpu - last_cpu >= self.interval / 2
+                last_cpu = cpu
+                if not busy:
+                    continue
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+    
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as output:
+            for stack, count in self.stacks.most_common():
+                output.write(f"{stack} {count}\n")
+
+class CProfileProfiler:
+    """cProfile sobre el hilo actual (más detalle, pero con sobrecoste en cada llamada)"""
+    
+    extension = 'pstats'
+    
+    def __init__(self):
+        self.profile = cProfile.Profile()
+    
+    def start(self):
+        self.profile.enable()
+    
+    def stop(self):
+        self.profile.disable()
+    
+    def dump(self, path):
+        self.profile.dump_stats(path)
+
+class ProfileStore:
+    """Directorio con los perfiles guardados, acotado a `max_files` (se borran los más antiguos)"""
+    
+    def __init__(self, directory, max_files):
+        self.directory = directory
+        self.max_files = max_files
+        os.makedirs(self.directory, exist_ok=True)
+    
+    def new_path(self, book_uuid, job, extension):
+        created = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+        return os.path.join(self.directory, f"{book_uuid}-{job}-{created}.{extension}")
+    
+    def list(self, book_uuid=None):
+        """Perfiles guardados, del más reciente al más antiguo"""
+        profiles = []
+        for name in os.listdir(self.directory):
+            match = PROFILE_NAME_PATTERN.match(name)
+            if not match or (book_uuid and match.group('book') != book_uuid):
+                continue
+            try:
+                size = os.path.getsize(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            profiles.append({
+                'name': name,
+                'book_uuid': match.group('book'),
+                'job': match.group('job'),
+                'format': match.group('ext'),
+                'created_at': datetime.strptime(match.group('created'), '%Y%m%dT%H%M%S%f').isoformat() + 'Z',
+                'size': size
+            })
+        return sorted(profiles, key=lambda profile: profile['created_at'], reverse=True)
+    
+    def path(self, name):
+        """Ruta de un perfil por su nombre, o None si el nombre no es válido o no existe"""
+        if not PROFILE_NAME_PATTERN.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+    
+    def prune(self):
+        for profile in self.list()[self.max_files:]:
+            try:
+                os.remove(os.path.join(self.directory, profile['name']))
+            except FileNotFoundError:
+                pass
+
+def get_profile_store():
+    """Devuelve el almacén de perfiles de la aplicación actual"""
+    store = current_app.extensions.get('profile_store')
+    if store is None:
+        store = ProfileStore(current_app.config['PROFILE_DIR'], current_app.config['PROFILE_MAX_FILES'])
+        current_app.extensions['profile_store'] = store
+    return store
+
+def is_admin_request():
+    """
+    Indica si la petición lleva el token de administración (ADMIN_TOKEN) en la cabecera
+    X-Admin-Token. No se acepta en la URL, donde quedaría en los registros de acceso,
+    de los proxies y en el historial del navegador.
+    """
+    expected = current_app.config['ADMIN_TOKEN']
+    provided = request.headers.get('X-Admin-Token')
+    return bool(expected and provided) and hmac.compare_digest(expected, provided)
+
+def requested_profiler(job):
+    """
+    Perfilador que debe usarse para un trabajo iniciado en la petición actual.
+    
+    Args:
+        job: Tipo de trabajo ('generation', 'export')
+    
+    Returns:
+        str: 'sample', 'cprofile' o None si el trabajo no se perfila
+    """
+    header = request.headers.get('X-Profile', '').strip().lower()
+    if header in PROFILERS and is_admin_request():
+        return header
+    if job in current_app.config['PROFILE_JOBS']:
+        return current_app.config['PROFILER']
+    return None
+
+@contextmanager
+def _profile(book_uuid, job, profiler_name):
+    if profiler_name == 'cprofile':
+        profiler = CProfileProfiler()
+    else:
+        profiler = SamplingProfiler(current_app.config['PROFILE_SAMPLE_INTERVAL'], current_app.config['PROFILE_CPU_ONLY'])
+    
+    store = get_profile_store()
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        path = store.new_path(book_uuid, job, profiler.extension)
+        try:
+            profiler.dump(path)
+            store.prune()
+            logger.info(f"Perfil del trabajo {job} del libro {book_uuid} guardado en {os.path.basename(path)}")
+        except OSError as e:
+            logger.error(f"No se pudo guardar el perfil del trabajo {job} del libro {book_uuid}: {str(e)}")
+
+def profile_job(book_uuid, job, profiler_name):
+    """
+    Perfila el bloque en el hilo actual si `profiler_name` no es None.
+    
+    Uso:
+        with profiling.profile_job(book.uuid, 'export-docx', profiler_name):
+            ...
+    """
+    if profiler_name is None:
+        return nullcontext()
+    return _profile(book_uuid, job, profiler_name)
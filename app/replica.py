@@ -0,0 +1,170 @@
+"""
+Lecturas desde una réplica de la base de datos.
+
+Con DATABASE_REPLICA_URL configurada, las vistas decoradas con @replica_reads
+ejecutan sus SELECT en la réplica (bind 'replica') cuando la petición es GET o HEAD;
+las escrituras, los hilos de generación y el resto de vistas usan la base de datos
+principal. La réplica solo se usa mientras su retraso estimado no supere
+REPLICA_MAX_LAG_SECONDS, y un cliente que acaba de escribir lee de la principal
+durante REPLICA_READ_YOUR_WRITES_SECONDS para ver sus propios cambios.
+
+En local basta con dos archivos SQLite, "replicando" con
+`sqlite3 principal.db ".backup replica.db"`, o con dos instancias de PostgreSQL.
+"""
+import functools
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+import sqlalchemy as sa
+from flask import current_app, request
+from flask_sqlalchemy.session import Session
+
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND = 'replica'
+
+# Cookie con el instante (epoch) hasta el que el cliente lee de la base de datos principal
+PRIMARY_COOKIE = 'db_primary_until'
+
+class RoutingSession(Session):
+    """
+    Sesión que envía las consultas SELECT a la réplica cuando la petición lo permite
+    (session.info['use_replica']). Los flush, las sentencias de escritura y todo lo
+    que se lea después de escribir en la misma sesión van a la base de datos principal.
+    
+    Las conexiones de solo lectura pedidas sin consulta se marcan con
+    db.session.connection(bind_arguments={'read_only': True}).
+    """
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, read_only=False, **kwargs):
+        is_read = read_only or isinstance(clause, sa.Select)
+        if bind is None and is_read and self.info.get('use_replica') and not self._flushing:
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@sa.event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(session, flush_context):
+    """Tras escribir, la sesión lee de la principal y la respuesta activa la lectura de las propias escrituras"""
+    session.info['use_replica'] = False
+    session.info['wrote'] = True
+
+class ReplicaMonitor:
+    """
+    Estima el retraso de la réplica comparando la última modificación de los libros
+    (books.last_updated, que también cambia al guardar o eliminar un capítulo) en las dos bases de datos.
+    
+    Si a la réplica le faltan cambios, el retraso se acota por arriba con el tiempo
+    transcurrido desde su última modificación. La medida se repite como mucho cada
+    `check_interval` segundos por proceso; mientras tanto se usa la anterior. Si la
+    réplica no responde se considera no disponible hasta la siguiente medida.
+    Las eliminaciones de libros no cambian la marca y no se detectan.
+    """
+    
+    def __init__(self, max_lag, check_interval):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+    
+    def is_fresh(self, engines):
+        """Indica si la réplica está disponible y su retraso no supera el máximo"""
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= self.check_interval:
+            # Una sola petición mide; las demás usan la medida anterior mientras tanto
+            if self._lock.acquire(blocking=False):
+                try:
+                    self.lag = self.measure(engines)
+                    self._checked_at = time.monotonic()
+                finally:
+                    self._lock.release()
+        return self.lag is not None and self.lag <= self.max_lag
+    
+    def measure(self, engines):
+        """
+        Returns:
+            float: Retraso estimado en segundos (0 si la réplica está al día) o None si no responde
+        """
+        from app.models.book import Book
+        
+        statement = sa.select(sa.func.max(Book.__table__.c.last_updated))
+        try:
+            with engines[None].connect() as connection:
+                primary_mark = connection.execute(statement).scalar()
+            with engines[REPLICA_BIND].connect() as connection:
+                replica_mark = connection.execute(statement).scalar()
+        except sa.exc.SQLAlchemyError as e:
+            logger.warning(f"Réplica no disponible, se lee de la base de datos principal: {str(e)}")
+            return None
+        
+        if primary_mark is None or (replica_mark is not None and replica_mark >= primary_mark):
+            lag = 0.0
+        elif replica_mark is None:
+            lag = float('inf')
+        else:
+            # Las marcas se guardan en UTC (sin zona horaria en SQLite y PostgreSQL)
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            lag = max((now - replica_mark.replace(tzinfo=None)).total_seconds(), 0.0)
+        metrics.DB_REPLICA_LAG_SECONDS.set(lag)
+        return lag
+
+def init_replica(app):
+    """
+    Registra el bind de la réplica y el control de lectura de las propias escrituras.
+    Debe llamarse antes de db.init_app(app).
+    """
+    url = app.config['DATABASE_REPLICA_URL']
+    if not url:
+        return
+    
+    from app.config import engine_options
+    
+    # SQLALCHEMY_ENGINE_OPTIONS solo se aplica al motor principal: la réplica lleva las suyas
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    binds[REPLICA_BIND] = {'url': url, **engine_options(app.config, url)}
+    app.config['SQLALCHEMY_BINDS'] = binds
+    app.extensions['replica_monitor'] = ReplicaMonitor(
+        app.config['REPLICA_MAX_LAG_SECONDS'],
+        app.config['REPLICA_LAG_CHECK_SECONDS']
+    )
+    app.after_request(_remember_writes)
+
+def _remember_writes(response):
+    """Si la petición escribió en la base de datos, el cliente lee de la principal durante un tiempo"""
+    session = current_app.extensions['sqlalchemy'].session
+    if session.registry.has() and session.info.get('wrote'):
+        window = current_app.config['REPLICA_READ_YOUR_WRITES_SECONDS']
+        response.set_cookie(PRIMARY_COOKIE, str(int(time.time() + window)), max_age=window, httponly=True, samesite='Lax')
+    return response
+
+def _replica_allowed():
+    monitor = current_app.extensions.get('replica_monitor')
+    if monitor is None or request.method not in ('GET', 'HEAD'):
+        return False
+    
+    # Lectura de las propias escrituras
+    try:
+        if float(request.cookies.get(PRIMARY_COOKIE, 0)) > time.time():
+            return False
+    except ValueError:
+        pass
+    
+    return monitor.is_fresh(current_app.extensions['sqlalchemy'].engines)
+
+def replica_reads(view):
+    """Permite que la vista lea de la réplica (si está configurada y al día) en las peticiones GET y HEAD"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        use_replica = _replica_allowed()
+        if use_replica:
+            current_app.extensions['sqlalchemy'].session.info['use_replica'] = True
+        if current_app.extensions.get('replica_monitor') is not None:
+            metrics.DB_READ_REQUESTS.inc(target='replica' if use_replica else 'primary')
+        return view(*args, **kwargs)
+    return wrapper
@@ -1,12 +1,22 @@
-from flask import render_template, redirect, url_for, request, jsonify, current_app, send_file
+from flask import render_template, redirect, url_for, request, jsonify, current_app, send_file, Response, stream_with_context, abort
 from app.routes import main_bp
-from app import db
+from app import analytics, db, metrics, profiling, tracing
+from app.replica import replica_reads
 from app.models.book import Book, Chapter
 from app.services.claude_api import ClaudeClient
-from app.services.book_generator import BookGenerator
-from app.services.docx_exporter import DocxExporter
+from app.services.claude_health import client_from_config, ensure_health_monitor, get_claude_health
+from app.services.book_generator import BookGenerator, book_info
+from app.services.event_broker import event_broker
+from app.services.chapter_renderer import chapter_renderer
+from app.services.export_cache import get_export_cache, open_docx_export, open_epub_export, open_markdown_export, prerender_docx_export
+from app.services.bulk_export import filter_books, iter_books_zip
+from app.services.page_cache import PageCache, get_page_cache
+from app.services.search_index import SearchUnavailable, search_chapters
+from app.serialization import book_json, iter_books, iter_json_array
+from app.compression import compressed_stream_response
 import threading
 from datetime import datetime
+import json
 import logging
 import os
 import time
@@ -19,10 +29,22 @@ logger = logging.getLogger(__name__)
 active_generation_threads = {}
 
 @main_bp.route('/')
+@replica_reads
 def index():
-    """Página principal con lista de libros generados"""
-    books = Book.query.order_by(Book.created_at.desc()).all()
-    return render_template('index.html', books=books)
+    """
+    Página principal con lista de libros generados.
+    
+    El HTML se guarda en la caché de páginas con la huella del catálogo, que cambia
+    al crear un libro o al cambiar la versión de cualquiera.
+    """
+    def render():
+        books = Book.query.order_by(Book.created_at.desc()).all()
+        return render_template('index.html', books=books)
+    
+    page_cache = get_page_cache()
+    if page_cache is None:
+        return render()
+    return page_cache.get_or_render(PageCache.index_key(_catalog_fingerprint()), render)
 
 @main_bp.route('/generate', methods=['GET', 'POST'])
 def generate():
@@ -93,36 +115,43 @@ def generate():
         
         # Guardar la app actual para usarla en el hilo
         app = current_app._get_current_object()
+        # El hilo trabaja con el id del libro, no con el objeto ORM de esta petición
+        book_id = book.id
+        book_uuid = book.uuid
+        profiler_name = profiling.requested_profiler('generation')
         
         # Iniciar la generación en un hilo separado
         def generate_book_thread():
-            with app.app_context():  # ¡IMPORTANTE! Crear un contexto de aplicación para el hilo
+            # ¡IMPORTANTE! Crear un contexto de aplicación para el hilo
+            with app.app_context(), metrics.GENERATIONS_ACTIVE.track_inprogress(), tracing.span('worker.generate_book'), \
+                    profiling.profile_job(book_uuid, 'generation', profiler_name):
                 try:
-                    logger.info(f"Iniciando generación del libro: {book.title} (ID: {book.id})")
+                    logger.info(f"Iniciando generación del libro: {title} (ID: {book_id})")
                     result = book_generator.generate_book(title, market_niche, purpose)
                     
                     if "error" in result:
-                        logger.error(f"Error en la generación del libro {book.id}: {result['error']}")
-                        book.status = 'error'
-                        book.error_message = result["error"]
-                        db.session.commit()
+                        logger.error(f"Error en la generación del libro {book_id}: {result['error']}")
+                        book_generator.update_book_status(book_id, 'error', result["error"])
                     else:
-                        logger.info(f"Libro generado con éxito: {book.title} (ID: {book.id})")
+                        logger.info(f"Libro generado con éxito: {title} (ID: {book_id})")
+                        # Dejar el DOCX listo para que la primera descarga sea inmediata
+                        with tracing.span('export.prerender_docx'):
+                            prerender_docx_export(db.session.get(Book, book_id))
                 except Exception as e:
-                    logger.error(f"Excepción no controlada durante la generación del libro {book.id}: {str(e)}")
-                    book.status = 'error'
-                    book.error_message = f"Error inesperado: {str(e)}"
-                    db.session.commit()
+                    logger.error(f"Excepción no controlada durante la generación del libro {book_id}: {str(e)}")
+                    book_generator.update_book_status(book_id, 'error', f"Error inesperado: {str(e)}")
                 finally:
                     # Eliminar el hilo del diccionario cuando termine
-                    if book.id in active_generation_threads:
-                        del active_generation_threads[book.id]
+                    if book_id in active_generation_threads:
+                        del active_generation_threads[book_id]
         
         # Iniciar el hilo solo si no hay otro activo para este libro
         if book.id not in active_generation_threads:
-            thread = threading.Thread(target=generate_book_thread)
-            thread.daemon = True  # El hilo se cerrará cuando el programa principal termine
-            thread.start()
+            # La traza empieza en la petición y el hilo hereda su contexto
+            with tracing.start_trace(book.id, 'http.generate', model=claude_client.model):
+                thread = threading.Thread(target=tracing.bind_context(generate_book_thread))
+                thread.daemon = True  # El hilo se cerrará cuando el programa principal termine
+                thread.start()
             
             # Guardar referencia al hilo activo
             active_generation_threads[book.id] = thread
@@ -143,11 +172,85 @@ def generate():
     
     return render_template('generate.html')
 
+def _book_cached_response(book, kind, build):
+    """
+    Respuesta con ETag fuerte derivado de la versión del libro, que cambia con cada
+    capítulo guardado y con cualquier cambio de sus datos.
+    
+    Si el cliente ya tiene esa versión se responde 304 sin construir la respuesta.
+    Los libros completados pedidos con ?v=<versión actual> (enlaces versionados)
+    se pueden cachear durante BOOK_CACHE_MAX_AGE; el resto se revalida siempre.
+    
+    Args:
+        book: Instancia del modelo Book
+        kind: Prefijo del ETag que distingue el tipo de respuesta
+        build: Función que construye la respuesta completa
+    """
+    etag = f"{kind}-{book.uuid}-{book.progress_version}"
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.make_response(build())
+    
+    response.set_etag(etag)
+    if book.status == 'completed' and request.args.get('v') == str(book.progress_version):
+        response.headers['Cache-Control'] = f"public, max-age={current_app.config['BOOK_CACHE_MAX_AGE']}"
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @main_bp.route('/book/<uuid>')
+@replica_reads
 def view_book(uuid):
-    """Página para ver un libro específico"""
+    """
+    Página para ver un libro específico.
+    
+    Solo se cargan los títulos, alcances y recuentos de palabras de los capítulos
+    (el contenido es una columna diferida); se pide bajo demanda al expandir cada capítulo.
+    La página de un libro completado se sirve desde la caché de páginas mientras
+    no cambie su versión.
+    """
     book = Book.query.filter_by(uuid=uuid).first_or_404()
-    return render_template('view_book.html', book=book)
+    
+    def render():
+        chapters = Chapter.query.filter_by(book_id=book.id).order_by(Chapter.chapter_number).all()
+        return render_template('view_book.html', book=book, chapters=chapters)
+    
+    page_cache = get_page_cache()
+    if page_cache is None or book.status != 'completed':
+        return _book_cached_response(book, 'book-page', render)
+    
+    key = PageCache.book_page_key(book.id, book.progress_version)
+    return _book_cached_response(book, 'book-page', lambda: page_cache.get_or_render(key, render))
+
+@main_bp.route('/book/<uuid>/chapter/<int:chapter_number>')
+@replica_reads
+def view_chapter_content(uuid, chapter_number):
+    """
+    Fragmento HTML con el contenido de un capítulo, cargado al expandirlo en la página del libro.
+    
+    El parámetro opcional 'v' es el hash del contenido que conoce la página: si coincide
+    con el del capítulo actual la respuesta es inmutable. No se usa el ID porque al
+    regenerar un capítulo el nuevo puede reutilizar el ID del eliminado (SQLite).
+    """
+    chapter = Chapter.query.join(Book).options(
+        db.undefer(Chapter.content_html_data),
+        db.undefer(Chapter.structure)
+    ).filter(
+        Book.uuid == uuid,
+        Chapter.chapter_number == chapter_number
+    ).first_or_404()
+    
+    # HTML prerenderizado al guardar el capítulo
+    chapter_html = chapter_renderer.get_html(chapter)
+    version = chapter_renderer.get_content_hash(chapter)
+    response = current_app.make_response(render_template('_chapter_content.html', chapter_html=chapter_html))
+    response.set_etag(f"chapter-{version}")
+    if request.args.get('v') == version:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 @main_bp.route('/book/<uuid>/regenerate/<int:chapter_number>')
 def regenerate_chapter(uuid, chapter_number):
@@ -173,6 +276,9 @@ def regenerate_chapter(uuid, chapter_number):
     db.session.delete(chapter)
     db.session.commit()
     
+    # Las exportaciones en caché ya no corresponden al contenido del libro
+    get_export_cache().invalidate(book.uuid)
+    
     # Actualizar el estado del libro
     book.status = 'processing'
     book.error_message = None
@@ -189,13 +295,20 @@ def regenerate_chapter(uuid, chapter_number):
     
     # Guardar la app actual para usarla en el hilo
     app = current_app._get_current_object()
+    # El hilo trabaja con una copia de los datos del libro, no con el objeto ORM de esta petición
+    info = book_info(book)
+    book_uuid = book.uuid
+    profiler_name = profiling.requested_profiler('generation')
     
     # Función para regenerar en un hilo separado
     def regenerate_chapter_thread():
-        with app.app_context():  # ¡IMPORTANTE! Crear un contexto de aplicación para el hilo
+        # ¡IMPORTANTE! Crear un contexto de aplicación para el hilo
+        with app.app_context(), metrics.GENERATIONS_ACTIVE.track_inprogress(), \
+                tracing.span('worker.regenerate_chapter', number=chapter_number), \
+                profiling.profile_job(book_uuid, 'regeneration', profiler_name):
             try:
                 # Obtener todos los capítulos actuales para mantener la coherencia
-                chapters = Chapter.query.filter_by(book_id=book.id).order_by(Chapter.chapter_number).all()
+                chapters = Chapter.query.filter_by(book_id=info.id).order_by(Chapter.chapter_number).all()
                 
                 # Construir el resumen de los capítulos anteriores
                 previous_chapters_summary = ""
@@ -219,56 +332,63 @@ def regenerate_chapter(uuid, chapter_number):
                         chapter_data['scope'] = f"Siguiente tema después de: {other_chapter.scope}"
                         break
                 
+                # Devolver la conexión al pool antes de la llamada a la API
+                db.session.close()
+                
                 # Generar el nuevo contenido del capítulo
-                chapter_result = book_generator.generate_chapter(book, chapter_data, previous_chapters_summary)
+                with tracing.span('generator.chapter', number=chapter_number) as chapter_span:
+                    chapter_result = book_generator.generate_chapter(info, chapter_data, previous_chapters_summary)
+                    if 'error' in chapter_result:
+                        chapter_span.set_error(chapter_result['error'])
                 
                 if 'error' in chapter_result:
                     logger.error(f"Error al regenerar el capítulo {chapter_number}: {chapter_result.get('error')}")
-                    book.status = 'error'
-                    book.error_message = f"Error al regenerar el capítulo {chapter_number}: {chapter_result.get('error')}"
-                    db.session.commit()
+                    book_generator.add_tokens(info.id, chapter_result, chapter_failures=1)
+                    book_generator.update_book_status(
+                        info.id, 'error',
+                        f"Error al regenerar el capítulo {chapter_number}: {chapter_result.get('error')}",
+                        record_stats=False
+                    )
                     return
                 
-                # Crear el capítulo en la base de datos
-                new_chapter = Chapter(
-                    book_id=book.id,
-                    chapter_number=chapter_number,
-                    title=chapter_data['title'],
-                    scope=chapter_data['scope'],
-                    content=chapter_result['content'],
-                    input_tokens=chapter_result['input_tokens'],
-                    output_tokens=chapter_result['output_tokens']
-                )
-                
-                # Actualizar los tokens en el libro
-                book.input_tokens += chapter_result['input_tokens']
-                book.output_tokens += chapter_result['output_tokens']
-                
-                db.session.add(new_chapter)
-                book.status = 'completed'
-                db.session.commit()
-                
-                logger.info(f"Capítulo {chapter_number} regenerado con éxito para el libro {book.id}")
+                # Crear el capítulo en la base de datos y sumar sus tokens al libro
+                book_generator.save_chapter(info.id, chapter_data, chapter_result)
+                book_generator.update_book_status(info.id, 'completed', record_stats=False)
                 
+                logger.info(f"Capítulo {chapter_number} regenerado con éxito para el libro {info.id}")
+                with tracing.span('export.prerender_docx'):
+                    prerender_docx_export(db.session.get(Book, info.id))
+            
             except Exception as e:
                 logger.error(f"Error al regenerar el capítulo {chapter_number}: {str(e)}")
-                book.status = 'error'
-                book.error_message = f"Error al regenerar el capítulo {chapter_number}: {str(e)}"
-                db.session.commit()
+                book_generator.update_book_status(
+                    info.id, 'error',
+                    f"Error al regenerar el capítulo {chapter_number}: {str(e)}",
+                    record_stats=False
+                )
     
-    # Iniciar el hilo
-    thread = threading.Thread(target=regenerate_chapter_thread)
-    thread.daemon = True
-    thread.start()
+    # Iniciar el hilo dentro de una traza nueva
+    with tracing.start_trace(book.id, 'http.regenerate_chapter', number=chapter_number, model=claude_client.model):
+        thread = threading.Thread(target=tracing.bind_context(regenerate_chapter_thread))
+        thread.daemon = True
+        thread.start()
     
     return jsonify({
         'message': f'Regeneración del capítulo {chapter_number} iniciada',
         'status': 'processing'
     })
 
-@main_bp.route('/book/<uuid>/export/docx')
-def export_book_docx(uuid):
-    """Exportar libro a formato DOCX optimizado para Kindle"""
+def _send_book_export(uuid, build_export, mimetype, extension, label):
+    """
+    Envía un libro exportado en el formato indicado, desde la caché de exportación.
+    
+    Args:
+        uuid: UUID del libro
+        build_export: Función que recibe el libro y devuelve el archivo abierto
+        mimetype: Tipo MIME del archivo
+        extension: Extensión del archivo descargado
+        label: Nombre del formato para los mensajes de error
+    """
     book = Book.query.filter_by(uuid=uuid).first_or_404()
     
     # Verificar que el libro esté completo
@@ -278,57 +398,247 @@ def export_book_docx(uuid):
             'status': book.status
         }), 400
     
-    if len(book.chapters) < 10:
+    if book.completed_chapters < 10:
         return jsonify({
             'error': 'El libro no tiene los 10 capítulos requeridos.',
             'status': 'incomplete'
         }), 400
     
-    # Crear el exportador DOCX
-    docx_exporter = DocxExporter(book)
-    
     try:
-        # Generar el archivo DOCX
-        docx_buffer = docx_exporter.generate_docx()
+        # Obtener el archivo de la caché (o generarlo si el contenido cambió)
+        with profiling.profile_job(book.uuid, f'export-{extension}', profiling.requested_profiler('export')):
+            export_file = build_export(book)
         
         # Establecer nombre de archivo seguro
-        filename = f"{book.title.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.docx"
+        filename = f"{book.title.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.{extension}"
         
-        # Enviar el archivo al cliente
-        return send_file(
-            docx_buffer,
-            mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+        # Enviar el archivo ya abierto (send_file lo cierra): aunque se elimine de la caché
+        # mientras tanto, se sigue leyendo
+        file_stat = os.fstat(export_file.fileno())
+        response = send_file(
+            export_file,
+            mimetype=mimetype,
             as_attachment=True,
-            download_name=filename
+            download_name=filename,
+            last_modified=file_stat.st_mtime
         )
+        if response.status_code == 200:
+            response.content_length = file_stat.st_size
+        return response
     except Exception as e:
-        logger.error(f"Error al exportar libro a DOCX: {str(e)}")
+        logger.error(f"Error al exportar libro a {label}: {str(e)}")
         return jsonify({
-            'error': f'Error al generar el archivo DOCX: {str(e)}',
+            'error': f'Error al generar el archivo {label}: {str(e)}',
             'status': 'error'
         }), 500
 
+@main_bp.route('/book/<uuid>/export/docx')
+@replica_reads
+def export_book_docx(uuid):
+    """Exportar libro a formato DOCX optimizado para Kindle"""
+    return _send_book_export(
+        uuid,
+        open_docx_export,
+        'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+        'docx',
+        'DOCX'
+    )
+
+@main_bp.route('/book/<uuid>/export/epub')
+@replica_reads
+def export_book_epub(uuid):
+    """Exportar libro a formato EPUB"""
+    return _send_book_export(uuid, open_epub_export, 'application/epub+zip', 'epub', 'EPUB')
+
+@main_bp.route('/book/<uuid>/export/md')
+@replica_reads
+def export_book_markdown(uuid):
+    """Exportar libro a formato Markdown"""
+    return _send_book_export(uuid, open_markdown_export, 'text/markdown', 'md', 'Markdown')
+
+@main_bp.route('/books/export/docx.zip')
+@replica_reads
+def export_books_zip():
+    """
+    Exportar varios libros en un único ZIP de archivos DOCX, enviado en streaming.
+    
+    Filtros (query string): status (por defecto 'completed'), niche, from y to
+    (AAAA-MM-DD, fecha de creación) y uuid (repetible o separado por comas).
+    """
+    try:
+        created_from = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else None
+        created_to = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else None
+    except ValueError:
+        return jsonify({
+            'error': 'Las fechas deben tener el formato AAAA-MM-DD.',
+            'status': 'error'
+        }), 400
+    
+    uuids = [value.strip() for arg in request.args.getlist('uuid') for value in arg.split(',') if value.strip()]
+    query = filter_books(
+        status=request.args.get('status', 'completed') or None,
+        niche=request.args.get('niche') or None,
+        created_from=created_from,
+        created_to=created_to,
+        uuids=uuids or None
+    )
+    
+    if query.first() is None:
+        return jsonify({
+            'error': 'Ningún libro exportable coincide con el filtro.',
+            'status': 'empty'
+        }), 404
+    
+    filename = f"libros_{datetime.now().strftime('%Y%m%d')}.zip"
+    return Response(
+        stream_with_context(iter_books_zip(query)),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
 @main_bp.route('/api/book/<uuid>')
+@replica_reads
 def get_book(uuid):
     """API para obtener los datos de un libro específico"""
     book = Book.query.filter_by(uuid=uuid).first_or_404()
-    return jsonify(book.to_dict())
+    return _book_cached_response(
+        book,
+        'book',
+        lambda: current_app.response_class(book_json(book.uuid), mimetype='application/json')
+    )
+
+@main_bp.route('/api/book/<uuid>/timeline')
+def get_book_timeline(uuid):
+    """
+    Trazas de generación de un libro: cada tramo (llamadas a Claude, reintentos,
+    esperas, ampliaciones...) con su inicio relativo, duración y tiempo propio,
+    y un resumen del tiempo por tipo de tramo.
+    """
+    book = Book.query.filter_by(uuid=uuid).first_or_404()
+    timeline = tracing.load_timeline(book.id)
+    timeline.update(book_uuid=book.uuid, title=book.title, status=book.status)
+    return jsonify(timeline)
+
+@main_bp.route('/book/<uuid>/timeline')
+def view_book_timeline(uuid):
+    """Vista en cascada de las trazas de generación de un libro"""
+    book = Book.query.filter_by(uuid=uuid).first_or_404()
+    return render_template('timeline.html', book=book)
+
+def _catalog_fingerprint():
+    """Huella barata del catálogo: cambia al crear un libro o al cambiar la versión de cualquiera"""
+    return tuple(db.session.query(
+        db.func.count(Book.id),
+        db.func.coalesce(db.func.sum(Book.progress_version), 0),
+        db.func.coalesce(db.func.max(Book.id), 0)
+    ).one())
+
+@main_bp.route('/api/search')
+@replica_reads
+def search():
+    """
+    Búsqueda de texto completo en los capítulos de todos los libros (o de uno, con ?book=<uuid>).
+    
+    Parámetros: q (texto buscado), page y per_page. Los resultados se ordenan por
+    relevancia e incluyen un fragmento del capítulo con los términos marcados con <mark>.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Falta el texto a buscar (parámetro q)'}), 400
+    
+    book_id = None
+    book_uuid = request.args.get('book')
+    if book_uuid:
+        book_id = db.session.query(Book.id).filter_by(uuid=book_uuid).scalar()
+        if book_id is None:
+            abort(404)
+    
+    try:
+        results = search_chapters(
+            query,
+            page=request.args.get('page', 1, type=int),
+            per_page=request.args.get('per_page', 20, type=int),
+            book_id=book_id
+        )
+    except SearchUnavailable as e:
+        return jsonify({'error': str(e)}), 501
+    
+    return jsonify(results)
 
 @main_bp.route('/api/books')
+@replica_reads
 def get_books():
-    """API para obtener la lista de todos los libros"""
-    books = Book.query.order_by(Book.created_at.desc()).all()
-    return jsonify([book.to_dict() for book in books])
+    """
+    API para obtener la lista de todos los libros.
+    
+    El array se genera en streaming a partir de una única consulta por lotes,
+    un libro cada vez, para que la memoria no crezca con el catálogo.
+    """
+    etag = "books-{}-{}-{}".format(*_catalog_fingerprint())
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+    else:
+        response = compressed_stream_response(iter_json_array(iter_books()), 'application/json', etag=etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
-@main_bp.route('/api/book/<uuid>/progress')
-def get_book_progress(uuid):
-    """API para verificar el progreso de generación de un libro"""
-    book = Book.query.filter_by(uuid=uuid).first_or_404()
-    completed_chapters = len(book.chapters)
+@main_bp.route('/api/stats')
+@replica_reads
+def get_stats():
+    """
+    Estadísticas diarias de la generación: libros completados y fallidos, capítulos,
+    ampliaciones, tokens y latencia media y percentiles de los capítulos.
+    
+    Parámetros: from y to (AAAA-MM-DD, ambos incluidos; por defecto los últimos 30 días)
+    y model (solo un modelo). Se sirven de las tablas de estadísticas diarias.
+    """
+    start, end = analytics.default_range()
+    try:
+        if request.args.get('from'):
+            start = analytics.parse_day(request.args['from'])
+        if request.args.get('to'):
+            end = analytics.parse_day(request.args['to'])
+    except ValueError:
+        return jsonify({
+            'error': 'Las fechas deben tener el formato AAAA-MM-DD.',
+            'status': 'error'
+        }), 400
+    if start > end:
+        return jsonify({
+            'error': "La fecha 'from' no puede ser posterior a 'to'.",
+            'status': 'error'
+        }), 400
+    
+    response = jsonify(analytics.query_stats(start, end, model=request.args.get('model') or None))
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def _query_book_progress(*criteria):
+    """Obtiene solo las columnas necesarias para informar del progreso de un libro"""
+    return db.session.query(
+        Book.id,
+        Book.uuid,
+        Book.title,
+        Book.status,
+        Book.error_message,
+        Book.completed_chapters,
+        Book.progress_version,
+        Book.last_updated
+    ).filter(*criteria)
+
+def _build_progress_payload(book):
+    """
+    Construye la respuesta de progreso a partir de la fila del libro.
+    
+    Returns:
+        tuple: (diccionario con el progreso, si la generación parece atascada)
+    """
+    completed_chapters = book.completed_chapters
     
     # Si el libro está en estado de error, devolver el mensaje de error
     if book.status == 'error':
-        return jsonify({
+        return {
             'book_id': book.id,
             'uuid': book.uuid,
             'title': book.title,
@@ -337,17 +647,17 @@ def get_book_progress(uuid):
             'total_chapters': 10,
             'completed_chapters': completed_chapters,
             'progress_percentage': (completed_chapters / 10) * 100 if completed_chapters > 0 else 0
-        })
+        }, False
     
     # Verificar si el libro está "atascado"
     is_stalled = False
     if book.status == 'processing' and book.last_updated:
-        time_since_update = (datetime.utcnow() - book.last_updated).total_seconds()
+        time_since_update = (datetime.utcnow() - book.last_updated.replace(tzinfo=None)).total_seconds()
         # Si han pasado más de 10 minutos sin actualización, considerarlo atascado
         if time_since_update > 600:
             is_stalled = True
     
-    return jsonify({
+    return {
         'book_id': book.id,
         'uuid': book.uuid,
         'title': book.title,
@@ -357,13 +667,187 @@ def get_book_progress(uuid):
         'completed_chapters': completed_chapters,
         'progress_percentage': (completed_chapters / 10) * 100 if completed_chapters > 0 else 0,
         'last_updated': book.last_updated.isoformat() if book.last_updated else None
-    })
+    }, is_stalled
+
+@main_bp.route('/api/book/<uuid>/progress')
+@replica_reads
+def get_book_progress(uuid):
+    """
+    API para verificar el progreso de generación de un libro.
+    
+    Lee únicamente las columnas necesarias de la fila del libro (sin cargar capítulos)
+    y responde con ETag para que los sondeos sin cambios devuelvan 304.
+    """
+    book = _query_book_progress(Book.uuid == uuid).first_or_404()
+    payload, is_stalled = _build_progress_payload(book)
+    response = jsonify(payload)
+    
+    # La versión de progreso cambia con cada capítulo guardado o cambio de estado
+    response.set_etag(f"{book.uuid}-{book.progress_version}-{'stalled' if is_stalled else 'active'}")
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+def _format_sse(event_type, data):
+    """Serializa un evento en el formato de Server-Sent Events"""
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+def _sse_response(stream):
+    """Envuelve un generador de eventos en una respuesta text/event-stream sin buffering"""
+    response = Response(stream_with_context(stream), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Evitar que nginx acumule los eventos
+    return response
+
+@main_bp.route('/api/book/<uuid>/events')
+def book_events(uuid):
+    """
+    Canal Server-Sent Events con el progreso de un libro.
+    
+    Envía el estado actual al conectarse y después un evento por cada cambio de
+    estado o capítulo completado. En cada latido se vuelve a consultar la versión
+    de progreso, de modo que los cambios hechos por otros procesos también llegan.
+    """
+    book_id = db.session.query(Book.id).filter(Book.uuid == uuid).scalar()
+    if book_id is None:
+        abort(404)
+    
+    heartbeat = current_app.config['SSE_HEARTBEAT_SECONDS']
     
+    def stream():
+        # Suscribirse al empezar a enviar la respuesta: si nunca se recorre (HEAD,
+        # cliente que se desconecta antes, error previo) no queda ninguna cola registrada
+        subscriber = event_broker.subscribe(book_id)
+        try:
+            last_version = None
+            event_item = None
+            while True:
+                book = _query_book_progress(Book.id == book_id).first()
+                # Liberar la conexión mientras la petición espera eventos
+                db.session.close()
+                if book is None:
+                    yield _format_sse('deleted', {'uuid': uuid})
+                    return
+                
+                payload, is_stalled = _build_progress_payload(book)
+                if event_item and event_item['type'] == 'chapter':
+                    yield _format_sse('chapter', {
+                        'uuid': uuid,
+                        'chapter_number': event_item['chapter_number'],
+                        'title': event_item['title'],
+                        'scope': event_item['scope'],
+                        'word_count': event_item['word_count'],
+                        'completed_chapters': payload['completed_chapters']
+                    })
+                
+                version = (book.progress_version, is_stalled)
+                if version != last_version:
+                    yield _format_sse('progress', payload)
+                    last_version = version
+                
+                event_item = event_broker.listen(subscriber, heartbeat)
+                if event_item is None:
+                    yield ": keepalive\n\n"
+        finally:
+            event_broker.unsubscribe(book_id, subscriber)
+    
+    return _sse_response(stream())
+
+@main_bp.route('/api/books/events')
+def books_events():
+    """
+    Canal Server-Sent Events para la lista de libros.
+    
+    Envía un evento 'progress' por cada libro que cambia y un evento 'refresh'
+    cuando se crea un libro o se detectan cambios hechos por otro proceso.
+    
+    La huella del catálogo solo se actualiza en los latidos: si se recalculara tras
+    cada evento de este proceso, absorbería los cambios que otro proceso confirmara
+    entretanto y nunca se enviaría su 'refresh'. A cambio, un latido puede enviar
+    un 'refresh' por cambios que ya se notificaron como 'progress'.
+    """
+    heartbeat = current_app.config['SSE_HEARTBEAT_SECONDS']
+    
+    def stream():
+        subscriber = event_broker.subscribe(event_broker.ALL_BOOKS)
+        try:
+            last_fingerprint = _catalog_fingerprint()
+            db.session.close()
+            next_heartbeat = time.monotonic() + heartbeat
+            while True:
+                event_item = event_broker.listen(subscriber, max(next_heartbeat - time.monotonic(), 0))
+                if event_item is not None:
+                    if event_item['type'] == 'created':
+                        yield _format_sse('refresh', {})
+                    else:
+                        book = _query_book_progress(Book.id == event_item['book_id']).first()
+                        if book is not None:
+                            payload, _ = _build_progress_payload(book)
+                            yield _format_sse('progress', payload)
+                    db.session.close()
+                    # Con eventos continuos el latido no debe posponerse indefinidamente
+                    if time.monotonic() < next_heartbeat:
+                        continue
+                
+                fingerprint = _catalog_fingerprint()
+                db.session.close()
+                next_heartbeat = time.monotonic() + heartbeat
+                if fingerprint != last_fingerprint:
+                    last_fingerprint = fingerprint
+                    yield _format_sse('refresh', {})
+                elif event_item is None:
+                    yield ": keepalive\n\n"
+        finally:
+            event_broker.unsubscribe(event_broker.ALL_BOOKS, subscriber)
+    
+    return _sse_response(stream())
+
+def _generation_queue_depth():
+    """Capítulos que faltan por generar en los libros en proceso (de 10 por libro)"""
+    return db.session.query(
+        db.func.coalesce(db.func.sum(10 - Book.completed_chapters), 0)
+    ).filter(Book.status == 'processing', Book.completed_chapters < 10).scalar()
+
+metrics.GENERATION_QUEUE_DEPTH.set_function(_generation_queue_depth)
+
+@main_bp.route('/metrics')
+def prometheus_metrics():
+    """Métricas de la API de Claude, la generación y las exportaciones en formato Prometheus"""
+    if not current_app.config['METRICS_ENABLED']:
+        abort(404)
+    response = current_app.response_class(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@main_bp.route('/admin/profiles')
+def list_profiles():
+    """Perfiles guardados (todos o los de ?book=<uuid>); requiere el token de administración"""
+    if not profiling.is_admin_request():
+        abort(404)
+    return jsonify(profiling.get_profile_store().list(request.args.get('book')))
+
+@main_bp.route('/admin/profiles/<name>')
+def download_profile(name):
+    """Descarga un perfil: pilas colapsadas (.folded) o estadísticas de cProfile (.pstats)"""
+    if not profiling.is_admin_request():
+        abort(404)
+    path = profiling.get_profile_store().path(name)
+    if path is None:
+        abort(404)
+    mimetype = 'text/plain' if name.endswith('.folded') else 'application/octet-stream'
+    return send_file(path, mimetype=mimetype, as_attachment=True, download_name=name)
+
+@main_bp.before_app_request
+def _start_claude_health_monitor():
+    ensure_health_monitor()
+
 @main_bp.route('/api/check-claude-connection')
 def check_claude_connection():
     """
-    Verifica la conexión con la API de Claude usando un mensaje simple
-    para comprobar si la configuración es correcta.
+    Verifica la conexión con la API de Claude para comprobar si la configuración es correcta.
+    
+    Responde con el último resultado de la comprobación sin consumo de tokens
+    (ver app/services/claude_health.py), compartido entre procesos y renovado en
+    segundo plano, de modo que no espera a la API ni a sus reintentos.
     """
     api_key = current_app.config['CLAUDE_API_KEY']
     model = current_app.config['CLAUDE_MODEL']
@@ -403,51 +887,50 @@ def check_claude_connection():
         # La key parece válida, así que la marcamos como potencialmente correcta
         diagnostics['api_key_status'] = 'Formato correcto, verificando validez...'
         
-        claude_client = ClaudeClient(
-            api_key=api_key,
-            api_url=current_app.config['CLAUDE_API_URL'],
-            model=model
-        )
-        
-        # Enviar un mensaje simple para verificar la conexión
-        result = claude_client.generate_text(
-            "Por favor responde con un 'OK' para verificar la conexión.", 
-            max_tokens=10
-        )
+        result = get_claude_health().status(client_from_config(current_app.config))
+        user_message.update(checked_at=result['checked_at'], cached=result['cached'], latency_ms=result['latency_ms'])
+        diagnostics['probe'] = {key: result[key] for key in ('status_code', 'error', 'latency_ms', 'checked_at')}
         
-        if 'error' in result:
+        if not result['ok']:
             # Analizar el error para dar información más específica
-            error_msg = result.get('error', '')
+            status_code = result['status_code']
             
-            if '401' in error_msg or 'unauthorized' in error_msg.lower():
+            if status_code in (401, 403):
                 diagnostics['suggested_action'] = 'La API key no es válida. Verifica que has copiado la key correctamente.'
                 user_message.update({
                     'status': 'error',
                     'message': 'API key rechazada por Anthropic. Verifica que has copiado la key correctamente y que está activa.'
                 })
-            elif '404' in error_msg or 'not found' in error_msg.lower():
+            elif status_code == 404:
+                diagnostics['api_key_status'] = 'Válida'
                 diagnostics['suggested_action'] = 'El modelo especificado no existe o no está disponible con tu plan.'
                 diagnostics['model_status'] = 'No disponible'
                 user_message.update({
                     'status': 'error',
                     'message': f'El modelo "{model}" no existe o no está disponible con tu cuenta. Prueba con otro modelo.'
                 })
-            elif '429' in error_msg or 'rate' in error_msg.lower() or 'limit' in error_msg.lower():
+            elif status_code == 429:
                 diagnostics['suggested_action'] = 'Tu cuenta ha alcanzado el límite de uso. Espera unos minutos o verifica tu plan.'
                 user_message.update({
                     'status': 'error',
                     'message': 'Has alcanzado el límite de uso de la API. Espera unos minutos e intenta de nuevo, o verifica los límites de tu cuenta.'
                 })
+            elif status_code is not None and (status_code == 529 or status_code >= 500):
+                diagnostics['suggested_action'] = 'La API de Claude está saturada o no disponible. Intenta de nuevo en unos minutos.'
+                user_message.update({
+                    'status': 'error',
+                    'message': 'La API de Claude está saturada o no disponible en este momento. Intenta de nuevo en unos minutos.'
+                })
             else:
                 user_message.update({
                     'status': 'error',
-                    'message': f"Error al conectar con la API de Claude: {result.get('error')}"
+                    'message': f"Error al conectar con la API de Claude: {result['error']}"
                 })
             
             # Incluir diagnósticos completos solo en entorno de desarrollo
             if current_app.config.get('FLASK_ENV') == 'development':
                 user_message['diagnostics'] = diagnostics
-                
+            
             return jsonify(user_message), 400
         
         # Conexión exitosa
@@ -458,15 +941,15 @@ def check_claude_connection():
         user_message.update({
             'status': 'success',
             'message': 'Conexión con la API de Claude exitosa',
-            'response': result['text']
+            'response': f"Modelo disponible (respuesta en {result['latency_ms']:.0f} ms)"
         })
         
         # Incluir diagnósticos completos solo en entorno de desarrollo
         if current_app.config.get('FLASK_ENV') == 'development':
             user_message['diagnostics'] = diagnostics
-            
-        return jsonify(user_message)
         
+        return jsonify(user_message)
+    
     except Exception as e:
         user_message.update({
             'status': 'error',
@@ -477,5 +960,5 @@ def check_claude_connection():
         if current_app.config.get('FLASK_ENV') == 'development':
             diagnostics['error_details'] = str(e)
             user_message['diagnostics'] = diagnostics
-            
-        return jsonify(user_message), 500
\ No newline at end of file
+        
+        return jsonify(user_message), 500
@@ -0,0 +1,125 @@
+import json
+from app import db
+from app.models.book import Book, Chapter, decompress_text
+
+try:
+    # Dependencia opcional: codificador JSON mucho más rápido que el de la biblioteca estándar
+    import orjson
+except ImportError:
+    orjson = None
+
+# Tamaño aproximado de cada bloque de la respuesta en streaming
+CHUNK_SIZE = 64 * 1024
+
+# Filas leídas de la base de datos por lote
+BATCH_ROWS = 200
+
+def dumps(value):
+    """Serializa a JSON (bytes UTF-8) con orjson si está disponible"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+# Columnas exactas que necesita cada libro y capítulo serializado (sin HTML ni estructura)
+BOOK_COLUMNS = (
+    Book.id, Book.uuid, Book.title, Book.market_niche, Book.purpose, Book.created_at,
+    Book.status, Book.error_message, Book.input_tokens, Book.output_tokens,
+    Book.thinking_tokens, Book.completed_chapters, Book.progress_version
+)
+CHAPTER_COLUMNS = (
+    Chapter.id.label('chapter_id'),
+    Chapter.chapter_number,
+    Chapter.title.label('chapter_title'),
+    Chapter.scope,
+    Chapter.content_data,
+    Chapter.word_count,
+    Chapter.input_tokens.label('chapter_input_tokens'),
+    Chapter.output_tokens.label('chapter_output_tokens'),
+    Chapter.thinking_tokens.label('chapter_thinking_tokens'),
+    Chapter.created_at.label('chapter_created_at')
+)
+
+def _book_payload(row):
+    """Mismo formato que Book.to_dict(), a partir de una fila de BOOK_COLUMNS"""
+    return {
+        'id': row.id,
+        'uuid': row.uuid,
+        'title': row.title,
+        'market_niche': row.market_niche,
+        'purpose': row.purpose,
+        'created_at': _isoformat(row.created_at),
+        'status': row.status,
+        'error_message': row.error_message,
+        'input_tokens': row.input_tokens,
+        'output_tokens': row.output_tokens,
+        'thinking_tokens': row.thinking_tokens,
+        'completed_chapters': row.completed_chapters,
+        'progress_version': row.progress_version,
+        'chapters': []
+    }
+
+def _chapter_payload(row):
+    """Mismo formato que Chapter.to_dict(), a partir de una fila de CHAPTER_COLUMNS"""
+    return {
+        'id': row.chapter_id,
+        'book_id': row.id,
+        'chapter_number': row.chapter_number,
+        'title': row.chapter_title,
+        'scope': row.scope,
+        'content': decompress_text(row.content_data),
+        'word_count': row.word_count,
+        'input_tokens': row.chapter_input_tokens,
+        'output_tokens': row.chapter_output_tokens,
+        'thinking_tokens': row.chapter_thinking_tokens,
+        'created_at': _isoformat(row.chapter_created_at)
+    }
+
+def _book_rows(*criteria):
+    """Libros con sus capítulos en una sola consulta, leída por lotes y agrupada por libro"""
+    return db.session.query(*BOOK_COLUMNS, *CHAPTER_COLUMNS).outerjoin(
+        Chapter, Chapter.book_id == Book.id
+    ).filter(*criteria).order_by(
+        Book.created_at.desc(), Book.id.desc(), Chapter.chapter_number
+    ).yield_per(BATCH_ROWS)
+
+def iter_books(*criteria):
+    """
+    Genera los libros (con sus capítulos) como diccionarios, uno a uno.
+    Solo hay en memoria un libro y un lote de filas a la vez.
+    """
+    current = None
+    for row in _book_rows(*criteria):
+        if current is None or current['id'] != row.id:
+            if current is not None:
+                yield current
+            current = _book_payload(row)
+        if row.chapter_id is not None:
+            current['chapters'].append(_chapter_payload(row))
+    if current is not None:
+        yield current
+
+def iter_json_array(items):
+    """
+    Serializa un iterable como array JSON en bloques de unos CHUNK_SIZE bytes,
+    sin construir nunca el documento completo.
+    """
+    buffer = bytearray(b'[')
+    first = True
+    for item in items:
+        if not first:
+            buffer += b','
+        buffer += dumps(item)
+        first = False
+        if len(buffer) >= CHUNK_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += b']'
+    yield bytes(buffer)
+
+def book_json(book_uuid):
+    """JSON de un libro (mismo formato que Book.to_dict()) o None si no existe"""
+    books = list(iter_books(Book.uuid == book_uuid))
+    return dumps(books[0]) if books else None
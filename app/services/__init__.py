@@ -1,4 +1,34 @@
-# Este archivo permite importar los servicios desde app.services
-from app.services.claude_api import ClaudeClient
-from app.services.book_generator import BookGenerator
-from app.services.docx_exporter import DocxExporter
\ No newline at end of file
+# Este archivo permite importar los servicios desde app.services.
+# Los módulos se importan al acceder a cada nombre: importar un servicio ligero
+# (p. ej. app.services.event_broker) no debe cargar python-docx, lxml ni requests.
+import importlib
+
+_EXPORTS = {
+    'ClaudeClient': 'app.services.claude_api',
+    'ClaudeHealth': 'app.services.claude_health',
+    'BookGenerator': 'app.services.book_generator',
+    'DocxExporter': 'app.services.docx_exporter',
+    'StreamingDocxExporter': 'app.services.docx_stream_writer',
+    'EpubExporter': 'app.services.epub_exporter',
+    'MarkdownExporter': 'app.services.markdown_exporter',
+    'ParsedBook': 'app.services.parsed_book',
+    'EventBroker': 'app.services.event_broker',
+    'ChapterRenderer': 'app.services.chapter_renderer',
+    'ExportCache': 'app.services.export_cache',
+    'ExportPipeline': 'app.services.export_pipeline',
+    'PageCache': 'app.services.page_cache',
+    'SearchIndex': 'app.services.search_index',
+    'ZipStreamWriter': 'app.services.zip_stream',
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -3,8 +3,9 @@ import re
 import time
 import logging
 import traceback
+from collections import namedtuple
 from flask import current_app
-from app import db
+from app import analytics, db, metrics, tracing
 from app.models.book import Book, Chapter
 from app.services.claude_api import ClaudeClient
 from sqlalchemy.exc import SQLAlchemyError
@@ -13,6 +14,13 @@ from sqlalchemy.exc import SQLAlchemyError
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Copia de los datos del libro que usan los prompts. Se pasa en lugar del objeto ORM
+# para poder cerrar la sesión (y devolver la conexión al pool) durante las llamadas a la API.
+BookInfo = namedtuple('BookInfo', ['id', 'uuid', 'title', 'market_niche', 'purpose'])
+
+def book_info(book):
+    return BookInfo(book.id, book.uuid, book.title, book.market_niche, book.purpose)
+
 class BookGenerator:
     def __init__(self, claude_client):
         self.claude_client = claude_client
@@ -76,6 +84,7 @@ class BookGenerator:
             try:
                 toc_data = json.loads(response['text'])
                 logger.info("JSON extraído correctamente de la respuesta")
+                tracing.annotate(parse='json')
                 return {
                     'toc': toc_data,
                     'input_tokens': response['input_tokens'],
@@ -101,6 +110,7 @@ class BookGenerator:
                         raise ValueError("El JSON extraído no contiene la clave 'chapters'")
                     
                     logger.info(f"JSON extraído mediante regex: {len(toc_data['chapters'])} capítulos encontrados")
+                    tracing.annotate(parse='regex')
                     return {
                         'toc': toc_data,
                         'input_tokens': response['input_tokens'],
@@ -112,6 +122,7 @@ class BookGenerator:
                     raise ValueError("No se encontró JSON en la respuesta")
         except Exception as e:
             logger.error(f"Error al parsear la tabla de contenidos: {str(e)}")
+            tracing.current_span().set_error(f"Error al parsear la tabla de contenidos: {str(e)}")
             logger.error(f"Respuesta recibida (primeros 500 caracteres): {response['text'][:500]}...")
             return None
     
@@ -120,14 +131,15 @@ class BookGenerator:
         Genera el contenido de un capítulo específico.
         
         Args:
-            book: Instancia del modelo Book
+            book: BookInfo (o instancia del modelo Book) con título, nicho y propósito
             chapter_data: Información del capítulo a generar
             previous_chapters_summary: Resumen de los capítulos anteriores
-            
+        
         Returns:
             dict: El contenido generado y los tokens consumidos
         """
         logger.info(f"Generando capítulo {chapter_data['number']}: {chapter_data['title']}")
+        start_time = time.time()
         
         # Preparar el contexto de los capítulos anteriores de forma más eficiente
         context = ""
@@ -208,6 +220,7 @@ class BookGenerator:
         # Verificar que el contenido generado tenga un tamaño adecuado
         content = response['text']
         word_count = len(content.split())
+        expansions = expansion_failures = 0
         
         # Verificar si el contenido es demasiado corto
         if word_count < 2500:  # Un capítulo muy corto probablemente indica un error
@@ -225,6 +238,7 @@ class BookGenerator:
             # Si es corto pero no hay error aparente, intentamos regenerarlo solicitando más contenido
             else:
                 logger.warning(f"Intentando ampliar el capítulo para alcanzar el mínimo de 3,450 palabras")
+                metrics.CHAPTER_WORD_SHORTFALL.observe(3450 - word_count)
                 
                 # Prompt para ampliar el contenido
                 expansion_prompt = f"""
@@ -245,7 +259,10 @@ class BookGenerator:
                 """
                 
                 # Intentar ampliar el contenido
-                expansion_response = self.claude_client.generate_text(expansion_prompt, max_tokens=max_output_tokens)
+                with tracing.span('generator.expansion', words=word_count, shortfall=3450 - word_count) as expansion_span:
+                    expansion_response = self.claude_client.generate_text(expansion_prompt, max_tokens=max_output_tokens)
+                    if 'error' in expansion_response:
+                        expansion_span.set_error(expansion_response['error'])
                 
                 if 'error' not in expansion_response:
                     expanded_content = expansion_response['text']
@@ -258,8 +275,12 @@ class BookGenerator:
                     response['input_tokens'] += expansion_response['input_tokens']
                     response['output_tokens'] += expansion_response['output_tokens']
                     word_count = expanded_word_count
+                    expansions += 1
+                    metrics.CHAPTER_EXPANSIONS.inc(outcome='expanded')
                 else:
                     logger.error(f"Error al ampliar el capítulo: {expansion_response.get('error')}")
+                    expansion_failures += 1
+                    metrics.CHAPTER_EXPANSIONS.inc(outcome='failed')
                     # Continuamos con el contenido original, aunque sea corto
         
         # Verificar si el contenido está por debajo del objetivo de 3,450 palabras pero es utilizable
@@ -268,13 +289,21 @@ class BookGenerator:
         else:
             logger.info(f"Capítulo {chapter_data['number']} generado con éxito: {word_count} palabras")
         
+        tracing.annotate(words=word_count)
+        generation_seconds = time.time() - start_time
+        metrics.CHAPTERS_GENERATED.inc(model=self.claude_client.model)
+        metrics.CHAPTER_GENERATION_SECONDS.observe(generation_seconds, model=self.claude_client.model)
+        
         return {
             'content': content,
             'input_tokens': response['input_tokens'],
-            'output_tokens': response['output_tokens']
+            'output_tokens': response['output_tokens'],
+            'generation_seconds': generation_seconds,
+            'expansions': expansions,
+            'expansion_failures': expansion_failures
         }
     
-    def update_book_status(self, book_id, status, error=None):
+    def update_book_status(self, book_id, status, error=None, record_stats=True):
         """
         Actualiza el estado del libro en la base de datos.
         
@@ -282,10 +311,14 @@ class BookGenerator:
             book_id: ID del libro
             status: Estado del libro ('processing', 'completed', 'error')
             error: Mensaje de error, si aplica
+            record_stats: Contar el libro como completado o fallido en las estadísticas
+                diarias si cambia a ese estado (no en las regeneraciones de capítulos)
         """
+        changed = False
         try:
-            book = Book.query.get(book_id)
+            book = db.session.get(Book, book_id)
             if book:
+                changed = book.status != status
                 book.status = status
                 book.error_message = error
                 db.session.commit()
@@ -293,16 +326,95 @@ class BookGenerator:
         except SQLAlchemyError as e:
             logger.error(f"Error al actualizar el estado del libro {book_id}: {str(e)}")
             db.session.rollback()
+            changed = False
+        finally:
+            db.session.close()
+        
+        if changed and record_stats and status in ('completed', 'error'):
+            analytics.record(self.claude_client.model, **{'books_completed' if status == 'completed' else 'books_failed': 1})
+    
+    def add_tokens(self, book_id, result, **stats):
+        """
+        Suma al libro los tokens consumidos por una llamada a la API en una transacción corta.
+        
+        Args:
+            book_id: ID del libro
+            result: Resultado con 'input_tokens', 'output_tokens' y opcionalmente 'thinking_tokens'
+            **stats: Otros contadores de las estadísticas diarias (p. ej. chapter_failures=1)
+        """
+        try:
+            book = db.session.get(Book, book_id)
+            book.input_tokens += result['input_tokens']
+            book.output_tokens += result['output_tokens']
+            book.thinking_tokens += result.get('thinking_tokens', 0)
+            db.session.commit()
+        finally:
+            db.session.close()
+        
+        analytics.record(
+            self.claude_client.model,
+            input_tokens=result['input_tokens'],
+            output_tokens=result['output_tokens'],
+            thinking_tokens=result.get('thinking_tokens', 0),
+            **stats
+        )
+    
+    def save_chapter(self, book_id, chapter_data, chapter_result):
+        """
+        Guarda un capítulo generado y suma sus tokens al libro en una única transacción corta.
+        
+        Returns:
+            Chapter: El capítulo guardado (desvinculado de la sesión)
+        """
+        chapter = Chapter(
+            book_id=book_id,
+            chapter_number=chapter_data['number'],
+            title=chapter_data['title'],
+            scope=chapter_data['scope'],
+            content=chapter_result['content'],
+            input_tokens=chapter_result['input_tokens'],
+            output_tokens=chapter_result['output_tokens'],
+            thinking_tokens=chapter_result.get('thinking_tokens', 0)
+        )
+        try:
+            book = db.session.get(Book, book_id)
+            book.input_tokens += chapter_result['input_tokens']
+            book.output_tokens += chapter_result['output_tokens']
+            book.thinking_tokens += chapter_result.get('thinking_tokens', 0)
+            db.session.add(chapter)
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.close()
+        
+        analytics.record(
+            self.claude_client.model,
+            latency_seconds=chapter_result.get('generation_seconds'),
+            chapters=1,
+            input_tokens=chapter_result['input_tokens'],
+            output_tokens=chapter_result['output_tokens'],
+            thinking_tokens=chapter_result.get('thinking_tokens', 0),
+            expansions=chapter_result.get('expansions', 0),
+            expansion_failures=chapter_result.get('expansion_failures', 0)
+        )
+        return chapter
     
     def generate_book(self, title, market_niche, purpose):
         """
         Genera un libro completo con todos sus capítulos.
         
+        La generación dura lo que tardan todas las llamadas a Claude, así que no se
+        mantiene ninguna transacción (ni conexión del pool) abierta durante ellas: cada
+        escritura abre la sesión, confirma y la cierra, y los prompts se construyen con
+        una copia de los datos del libro (BookInfo) en lugar del objeto ORM.
+        
         Args:
             title: Título del libro
             market_niche: Nicho de mercado
             purpose: Propósito del libro
-            
+        
         Returns:
             dict: Resultado de la operación con id del libro generado
         """
@@ -326,29 +438,32 @@ class BookGenerator:
                 book.status = 'processing'
                 book.error_message = None
                 db.session.commit()
+            info = book_info(book)
         except SQLAlchemyError as e:
             logger.error(f"Error al crear/actualizar el libro en la base de datos: {str(e)}")
+            db.session.rollback()
             return {"error": f"Error de base de datos: {str(e)}"}
+        finally:
+            db.session.close()
         
         try:
             # Generar la tabla de contenidos
-            toc_result = self.generate_table_of_contents(title, market_niche, purpose)
+            with tracing.span('generator.table_of_contents'):
+                toc_result = self.generate_table_of_contents(title, market_niche, purpose)
             if not toc_result:
                 error_msg = "No se pudo generar la tabla de contenidos. Verifica la configuración de la API de Claude."
                 logger.error(error_msg)
-                self.update_book_status(book.id, 'error', error_msg)
+                self.update_book_status(info.id, 'error', error_msg)
                 return {"error": error_msg}
             
             toc = toc_result['toc']
-            book.input_tokens += toc_result['input_tokens']
-            book.output_tokens += toc_result['output_tokens']
-            db.session.commit()
+            self.add_tokens(info.id, toc_result)
             
             # Verificar que la tabla de contenidos tenga el formato esperado
             if 'chapters' not in toc or not isinstance(toc['chapters'], list) or len(toc['chapters']) == 0:
                 error_msg = "Formato de tabla de contenidos inválido"
                 logger.error(f"{error_msg}: {toc}")
-                self.update_book_status(book.id, 'error', error_msg)
+                self.update_book_status(info.id, 'error', error_msg)
                 return {"error": error_msg}
             
             logger.info(f"Tabla de contenidos generada con {len(toc['chapters'])} capítulos")
@@ -360,65 +475,43 @@ class BookGenerator:
             for chapter_data in toc['chapters']:
                 try:
                     # Verificar si el capítulo ya existe para evitar duplicados
-                    existing_chapter = Chapter.query.filter_by(
-                        book_id=book.id,
-                        chapter_number=chapter_data['number']
-                    ).first()
+                    try:
+                        existing_chapter = Chapter.query.filter_by(
+                            book_id=info.id,
+                            chapter_number=chapter_data['number']
+                        ).first()
+                        existing_content = existing_chapter.content if existing_chapter else None
+                    finally:
+                        db.session.close()
                     
-                    if existing_chapter:
+                    if existing_content is not None:
                         logger.info(f"Capítulo {chapter_data['number']} ya existe, saltando generación")
                         
                         # Actualizar el resumen para los siguientes capítulos
                         if len(previous_chapters_summary) > 0:
                             previous_chapters_summary += "\n\n"
-                        previous_chapters_summary += f"Capítulo {chapter_data['number']}: {chapter_data['title']} - {chapter_data['scope']}\nResumen: {existing_chapter.content[:500]}..."
+                        previous_chapters_summary += f"Capítulo {chapter_data['number']}: {chapter_data['title']} - {chapter_data['scope']}\nResumen: {existing_content[:500]}..."
                         
                         continue
                     
                     # Generar contenido del capítulo
-                    chapter_result = self.generate_chapter(book, chapter_data, previous_chapters_summary)
-                    
-                    # Crear capítulo en la base de datos
-                    chapter = Chapter(
-                        book_id=book.id,
-                        chapter_number=chapter_data['number'],
-                        title=chapter_data['title'],
-                        scope=chapter_data['scope'],
-                        content=chapter_result['content'],
-                        input_tokens=chapter_result['input_tokens'],
-                        output_tokens=chapter_result['output_tokens'],
-                        thinking_tokens=chapter_result.get('thinking_tokens', 0)  # Capturar tokens de pensamiento
-                    )                    
-
-                    # Actualizar los tokens en el libro
-                    book.input_tokens += chapter_result['input_tokens']
-                    book.output_tokens += chapter_result['output_tokens']
-                    book.thinking_tokens += chapter_result.get('thinking_tokens', 0)  # Acumular tokens de pensamiento
+                    with tracing.span('generator.chapter', number=chapter_data['number']) as chapter_span:
+                        chapter_result = self.generate_chapter(info, chapter_data, previous_chapters_summary)
+                        if 'error' in chapter_result:
+                            chapter_span.set_error(chapter_result['error'])
                     
                     # Verificar si hubo error en la generación del capítulo
                     if 'error' in chapter_result:
                         logger.error(f"Error al generar el capítulo {chapter_data['number']}: {chapter_result.get('error')}")
                         error_message = f"Error en capítulo {chapter_data['number']}: {chapter_result.get('error')}"
-                        self.update_book_status(book.id, 'error', error_message)
+                        # Los tokens consumidos antes del error también se contabilizan
+                        self.add_tokens(info.id, chapter_result, chapter_failures=1)
+                        self.update_book_status(info.id, 'error', error_message)
                         return {"error": error_message}
                     
                     # Crear capítulo en la base de datos
-                    chapter = Chapter(
-                        book_id=book.id,
-                        chapter_number=chapter_data['number'],
-                        title=chapter_data['title'],
-                        scope=chapter_data['scope'],
-                        content=chapter_result['content'],
-                        input_tokens=chapter_result['input_tokens'],
-                        output_tokens=chapter_result['output_tokens']
-                    )
-                    
-                    # Actualizar los tokens en el libro
-                    book.input_tokens += chapter_result['input_tokens']
-                    book.output_tokens += chapter_result['output_tokens']
-                    
-                    db.session.add(chapter)
-                    db.session.commit()
+                    with tracing.span('db.save_chapter', number=chapter_data['number']):
+                        self.save_chapter(info.id, chapter_data, chapter_result)
                     logger.info(f"Capítulo {chapter_data['number']} guardado en la base de datos")
                     
                     # Actualizar el resumen de los capítulos anteriores
@@ -427,24 +520,25 @@ class BookGenerator:
                     previous_chapters_summary += f"Capítulo {chapter_data['number']}: {chapter_data['title']} - {chapter_data['scope']}\nResumen: {chapter_result['content'][:500]}..."
                     
                     # Para no sobrecargar la API, esperamos un breve período entre cada llamada
-                    time.sleep(2)
+                    with tracing.span('generator.pause'):
+                        time.sleep(current_app.config['CHAPTER_PAUSE_SECONDS'])
                 
                 except Exception as e:
                     error_message = f"Error inesperado al generar el capítulo {chapter_data['number']}: {str(e)}"
                     logger.error(error_message)
                     logger.error(traceback.format_exc())
-                    self.update_book_status(book.id, 'error', error_message)
+                    self.update_book_status(info.id, 'error', error_message)
                     return {"error": error_message}
             
             # Actualizar el estado del libro a completado
-            self.update_book_status(book.id, 'completed')
-            logger.info(f"Libro '{book.title}' generado completamente con {len(book.chapters)} capítulos")
+            self.update_book_status(info.id, 'completed')
+            logger.info(f"Libro '{info.title}' generado completamente con {len(toc['chapters'])} capítulos")
             
-            return {"success": True, "book_id": book.id, "book_uuid": book.uuid}
+            return {"success": True, "book_id": info.id, "book_uuid": info.uuid}
         
         except Exception as e:
             error_message = f"Error inesperado durante la generación del libro: {str(e)}"
             logger.error(error_message)
             logger.error(traceback.format_exc())
-            self.update_book_status(book.id, 'error', error_message)
-            return {"error": error_message}
\ No newline at end of file
+            self.update_book_status(info.id, 'error', error_message)
+            return {"error": error_message}
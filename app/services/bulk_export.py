@@ -0,0 +1,115 @@
+import logging
+from datetime import datetime, timedelta
+from app import db
+from app.models.book import Book
+from app.services.export_cache import open_docx_export
+from app.services.zip_stream import ZipStreamWriter
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Tamaño de los bloques leídos de cada DOCX al añadirlo al ZIP
+READ_CHUNK_SIZE = 64 * 1024
+
+def archive_filename(title, book_uuid):
+    """Nombre de archivo único y seguro para el DOCX de un libro dentro de un lote"""
+    from slugify import slugify
+    
+    return f"{slugify(title) or 'libro'}-{book_uuid[:8]}.docx"
+
+def filter_books(status='completed', niche=None, created_from=None, created_to=None, uuids=None):
+    """
+    Consulta de los libros exportables (al menos 10 capítulos) que cumplen el filtro.
+    
+    Args:
+        status: Estado de los libros (None para cualquiera)
+        niche: Nicho de mercado exacto
+        created_from: Fecha (date) de creación mínima, inclusive
+        created_to: Fecha (date) de creación máxima, inclusive
+        uuids: Lista de UUIDs concretos
+    """
+    query = Book.query.filter(Book.completed_chapters >= 10)
+    if status:
+        query = query.filter(Book.status == status)
+    if niche:
+        query = query.filter(Book.market_niche == niche)
+    if created_from:
+        query = query.filter(Book.created_at >= datetime.combine(created_from, datetime.min.time()))
+    if created_to:
+        query = query.filter(Book.created_at < datetime.combine(created_to + timedelta(days=1), datetime.min.time()))
+    if uuids:
+        query = query.filter(Book.uuid.in_(uuids))
+    return query.order_by(Book.created_at, Book.id)
+
+class _ChunkBuffer:
+    """Destino de escritura que acumula bytes hasta que el generador los entrega"""
+    
+    def __init__(self):
+        self.chunks = []
+    
+    def write(self, data):
+        if data:
+            self.chunks.append(bytes(data))
+    
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        return b''.join(chunks)
+
+def _read_file(docx_file):
+    with docx_file:
+        while True:
+            chunk = docx_file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+def iter_books_zip(query):
+    """
+    Genera un ZIP con el DOCX de cada libro de la consulta, bloque a bloque.
+    
+    Cada libro se toma de la caché de exportación (generándolo si hace falta) y se
+    copia al ZIP sin volver a comprimirlo, de modo que la memoria usada es constante
+    independientemente del número de libros. Los libros que fallan o se eliminan
+    mientras tanto se omiten y se enumeran en ERRORES.txt al final del archivo.
+    
+    Args:
+        query: Consulta de libros (ver filter_books)
+    
+    Yields:
+        bytes: Fragmentos del archivo ZIP
+    """
+    books = query.with_entities(Book.id, Book.uuid).all()
+    buffer = _ChunkBuffer()
+    errors = []
+    
+    with ZipStreamWriter(buffer) as archive:
+        for book_id, book_uuid in books:
+            book = db.session.get(Book, book_id)
+            if book is None:
+                # Eliminado después de tomar la lista: el ZIP ya empezó a enviarse
+                logger.warning(f"El libro {book_id} se eliminó durante la exportación en lote")
+                errors.append(f"{book_uuid}\t\tEl libro se eliminó durante la exportación")
+                continue
+            
+            try:
+                docx_file = open_docx_export(book)
+            except Exception as e:
+                logger.error(f"Error al exportar el libro {book.id} en lote: {str(e)}")
+                errors.append(f"{book.uuid}\t{book.title}\t{str(e)}")
+                continue
+            
+            name = archive_filename(book.title, book.uuid)
+            # El DOCX ya está comprimido: se guarda tal cual, entregando cada bloque leído
+            for _ in archive.iter_stored(name, _read_file(docx_file)):
+                data = buffer.drain()
+                # Un bloque vacío terminaría la respuesta con codificación chunked
+                if data:
+                    yield data
+            
+            # No acumular en la sesión los libros ya enviados
+            db.session.expunge_all()
+        
+        if errors:
+            archive.write_bytes('ERRORES.txt', '\n'.join(errors).encode('utf-8'))
+    yield buffer.drain()
@@ -0,0 +1,201 @@
+import re
+import hashlib
+import logging
+from markupsafe import escape
+from sqlalchemy import event, inspect as db_inspect
+from app.models.book import Chapter
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Incrementar cuando cambie el análisis o el HTML generado para invalidar lo almacenado
+RENDERER_VERSION = 2
+
+# Caracteres no permitidos en XML 1.0 (el texto del modelo puede contener controles sueltos)
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# Patrón para detectar encabezados (líneas cortas que no terminan con punto)
+HEADING_PATTERN = re.compile(r"(?m)^([A-Z][^\.]{5,60})$")
+
+def clean_text(text):
+    """Elimina los caracteres de control que ningún formato de salida admite"""
+    return INVALID_XML_CHARS.sub('', text) if text else text
+
+def extract_headings(text):
+    """
+    Extrae los encabezados del texto del capítulo.
+    Busca líneas que parezcan encabezados (generalmente en negritas o con formato especial).
+    """
+    # Detectar posibles encabezados
+    potential_headings = HEADING_PATTERN.findall(text)
+    
+    # Filtrar para evitar falsos positivos
+    headings = []
+    for heading in potential_headings:
+        # Verificar que sea lo suficientemente corto para ser un encabezado
+        if heading.strip() and len(heading.strip()) < 80:
+            headings.append(heading.strip())
+    
+    return headings
+
+def parse_chapter_content(content):
+    """
+    Procesa el contenido del capítulo para separar encabezados y párrafos.
+    
+    Args:
+        content: Texto del capítulo
+    
+    Returns:
+        Lista de tuplas (tipo, texto) donde tipo puede ser 'heading' o 'paragraph'
+    """
+    processed_content = []
+    
+    # Dividir el contenido por líneas
+    lines = content.strip().split("\n")
+    
+    i = 0
+    while i < len(lines):
+        current_line = lines[i].strip()
+        
+        # Saltar líneas vacías
+        if not current_line:
+            i += 1
+            continue
+        
+        # Detectar si es un posible encabezado
+        is_heading = (
+            current_line and 
+            len(current_line) < 80 and 
+            not current_line.endswith('.') and
+            (i == 0 or not lines[i-1].strip()) and
+            (i == len(lines)-1 or not lines[i+1].strip() or len(lines[i+1].strip()) > 150)
+        )
+        
+        if is_heading:
+            processed_content.append(('heading', current_line))
+            i += 1
+        else:
+            # Recolectar párrafo (líneas consecutivas que no están vacías)
+            paragraph_lines = [current_line]
+            j = i + 1
+            while j < len(lines) and lines[j].strip():
+                paragraph_lines.append(lines[j].strip())
+                j += 1
+            
+            paragraph_text = ' '.join(paragraph_lines)
+            processed_content.append(('paragraph', paragraph_text))
+            i = j
+    
+    return processed_content
+
+def content_hash(content):
+    """Hash del contenido junto con la versión del renderizador"""
+    return hashlib.sha256(f"{RENDERER_VERSION}:{content}".encode('utf-8')).hexdigest()
+
+class ChapterRenderer:
+    """
+    Analiza el contenido de un capítulo una sola vez y guarda su esquema y metadatos
+    (encabezados, recuento de palabras) junto con el HTML y los bloques, ambos
+    comprimidos, para que ni las vistas ni los exportadores tengan que volver a
+    recorrer el texto. Bloques y encabezados se guardan ya limpios de caracteres de control.
+    """
+    
+    def render(self, content):
+        """
+        Construye la representación estructurada y el HTML de un capítulo.
+        
+        Args:
+            content: Texto del capítulo
+        
+        Returns:
+            dict: 'content_hash', 'structure', 'blocks' y 'html'
+        """
+        blocks = [(block_type, clean_text(text)) for block_type, text in parse_chapter_content(content)]
+        structure = {
+            'version': RENDERER_VERSION,
+            'headings': [clean_text(heading) for heading in extract_headings(content)],
+            'outline': [text for block_type, text in blocks if block_type == 'heading'],
+            'word_count': len(content.split())
+        }
+        return {
+            'content_hash': content_hash(content),
+            'structure': structure,
+            'blocks': blocks,
+            'html': self.render_html(blocks)
+        }
+    
+    def render_html(self, blocks):
+        """Genera el HTML del capítulo a partir de sus bloques, escapando el texto"""
+        parts = []
+        for block_type, text in blocks:
+            if block_type == 'heading':
+                parts.append(f'<h5 class="chapter-heading">{escape(text)}</h5>')
+            else:
+                parts.append(f'<p>{escape(text)}</p>')
+        return '\n'.join(parts)
+    
+    def apply(self, chapter):
+        """Calcula y asigna al capítulo su estructura, bloques y HTML prerenderizados"""
+        rendered = self.render(chapter.content or '')
+        chapter.content_hash = rendered['content_hash']
+        chapter.structure = rendered['structure']
+        chapter.blocks = rendered['blocks']
+        chapter.content_html = rendered['html']
+    
+    @staticmethod
+    def has_current_structure(chapter):
+        """Indica si la estructura almacenada corresponde a la versión actual del renderizador"""
+        structure = chapter.structure
+        return bool(structure) and structure.get('version') == RENDERER_VERSION
+    
+    @classmethod
+    def has_current_html(cls, chapter):
+        """Indica si el HTML almacenado está actualizado, sin cargar los bloques"""
+        return cls.has_current_structure(chapter) and chapter.content_html_data is not None
+    
+    @classmethod
+    def is_current(cls, chapter):
+        """Indica si la estructura, los bloques y el HTML almacenados están actualizados"""
+        return cls.has_current_html(chapter) and chapter.blocks_data is not None
+    
+    def get_structure(self, chapter):
+        """
+        Devuelve la estructura del capítulo, analizándolo al vuelo (sin guardar)
+        si todavía no se ha prerenderizado con la versión actual.
+        No consulta el HTML, para no cargar esa columna diferida al exportar.
+        """
+        if self.has_current_structure(chapter):
+            return chapter.structure
+        return self.render(chapter.content or '')['structure']
+    
+    def get_blocks(self, chapter):
+        """
+        Devuelve los bloques (tipo, texto) del capítulo. Solo se analiza el contenido
+        al vuelo (sin guardar) si el capítulo no está prerenderizado con la versión actual.
+        Como get_structure, no consulta el HTML para no cargar esa columna al exportar.
+        """
+        if self.has_current_structure(chapter) and chapter.blocks_data is not None:
+            return chapter.blocks
+        return self.render(chapter.content or '')['blocks']
+    
+    def get_content_hash(self, chapter):
+        """Devuelve el hash del contenido que corresponde al HTML que sirve get_html"""
+        if self.has_current_html(chapter) and chapter.content_hash:
+            return chapter.content_hash
+        return content_hash(chapter.content or '')
+    
+    def get_html(self, chapter):
+        """Devuelve el HTML del capítulo, renderizándolo al vuelo si no está actualizado"""
+        if self.has_current_html(chapter):
+            return chapter.content_html
+        return self.render(chapter.content or '')['html']
+
+chapter_renderer = ChapterRenderer()
+
+@event.listens_for(Chapter, 'before_insert')
+@event.listens_for(Chapter, 'before_update')
+def _prerender_chapter(mapper, connection, target):
+    """Etapa posterior a la generación: prerenderiza el capítulo cada vez que se guarda su contenido"""
+    if db_inspect(target).attrs.content_data.history.has_changes():
+        chapter_renderer.apply(target)
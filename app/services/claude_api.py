@@ -1,8 +1,8 @@
-import requests
 import json
 import time
 import logging
-from requests.exceptions import RequestException, Timeout
+from urllib.parse import quote
+from app import metrics, tracing
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -36,10 +36,65 @@ class ClaudeClient:
             'x-api-key': self.api_key
         }
     
+    @staticmethod
+    def _http_error_cause(status_code):
+        """Causa de reintento (para las métricas) según el código de estado HTTP"""
+        if status_code == 429:
+            return 'rate_limit'
+        if status_code == 529 or status_code >= 500:
+            return 'server_error'
+        if status_code == 400:
+            return 'bad_request'
+        return f'http_{status_code}'
+    
     def get_token_limit(self, model_name):
         """Obtiene el límite de tokens para un modelo específico"""
         return self.MODEL_LIMITS.get(model_name.lower(), self.MODEL_LIMITS['default'])
     
+    def models_url(self):
+        """URL del modelo configurado en la API de modelos (GET /v1/models/{modelo})"""
+        base = self.api_url.rstrip('/')
+        if base.endswith('/messages'):
+            base = base[:-len('/messages')]
+        return f"{base}/models/{quote(self.model, safe='')}"
+    
+    def probe(self, timeout=5):
+        """
+        Comprueba la API key y el modelo sin generar texto ni consumir tokens: una
+        única petición (sin reintentos) a la API de modelos con un timeout corto.
+        
+        Returns:
+            dict: 'ok', 'status_code' (None si no hubo respuesta), 'error' y 'latency_ms'
+        """
+        import requests
+        from requests.exceptions import RequestException
+        
+        start = time.perf_counter()
+        try:
+            response = requests.get(self.models_url(), headers=self.headers, timeout=timeout)
+        except RequestException as e:
+            return {
+                'ok': False,
+                'status_code': None,
+                'error': f"Error de conexión: {str(e)}",
+                'latency_ms': round((time.perf_counter() - start) * 1000, 1)
+            }
+        latency_ms = round((time.perf_counter() - start) * 1000, 1)
+        
+        if response.status_code == 200:
+            return {'ok': True, 'status_code': 200, 'error': None, 'latency_ms': latency_ms}
+        
+        try:
+            message = response.json().get('error', {}).get('message') or response.text[:200]
+        except ValueError:
+            message = response.text[:200]
+        return {
+            'ok': False,
+            'status_code': response.status_code,
+            'error': f"Error HTTP {response.status_code}: {message}",
+            'latency_ms': latency_ms
+        }
+    
     def generate_text(self, prompt, max_tokens=None):
         """
         Genera texto usando la API de Claude con reintentos y manejo de errores mejorado.
@@ -51,6 +106,23 @@ class ClaudeClient:
         Returns:
             dict: Contiene el texto generado y los tokens consumidos
         """
+        with tracing.span('claude.generate_text', model=self.model, prompt_chars=len(prompt)) as span:
+            result = self._generate_text(prompt, max_tokens)
+            span.set_attributes(
+                input_tokens=result.get('input_tokens', 0),
+                output_tokens=result.get('output_tokens', 0),
+                thinking_tokens=result.get('thinking_tokens', 0)
+            )
+            if 'error' in result:
+                span.set_error(result['error'])
+            return result
+    
+    def _generate_text(self, prompt, max_tokens):
+        """Implementación de generate_text (llamadas a la API con reintentos)"""
+        # requests se carga en la primera llamada: los procesos que solo sirven páginas no lo necesitan
+        import requests
+        from requests.exceptions import RequestException, Timeout
+        
         # Verificar el límite de tokens para el modelo actual
         model_limit = self.get_token_limit(self.model)
         
@@ -94,29 +166,42 @@ class ClaudeClient:
         if len(prompt) > 200:
             logger.debug(f"Inicio del prompt: {prompt[:200]}...")
         
+        # Causa del último intento fallido, para las métricas de reintentos
+        retry_cause = None
+        
         for attempt in range(1, self.max_retries + 1):
             try:
                 # Añadir un pequeño retraso entre reintentos
                 if attempt > 1:
+                    metrics.CLAUDE_RETRIES.inc(model=self.model, cause=retry_cause or 'unknown')
                     sleep_time = 2 ** attempt  # Backoff exponencial
                     logger.info(f"Reintento {attempt}/{self.max_retries} después de {sleep_time} segundos...")
-                    time.sleep(sleep_time)
+                    with tracing.span('claude.backoff', attempt=attempt, cause=retry_cause or 'unknown'):
+                        time.sleep(sleep_time)
                 
                 # Registrar el intento
                 logger.info(f"Enviando solicitud a Claude (intento {attempt}/{self.max_retries})")
                 
                 # Realizar la solicitud con timeout
                 start_time = time.time()
-                response = requests.post(
-                    self.api_url,
-                    headers=self.headers,
-                    json=payload,  # Usar json en lugar de data para manejo automático de la serialización
-                    timeout=self.timeout
-                )
+                with tracing.span('claude.request', attempt=attempt, max_tokens=payload['max_tokens']) as request_span:
+                    response = requests.post(
+                        self.api_url,
+                        headers=self.headers,
+                        json=payload,  # Usar json en lugar de data para manejo automático de la serialización
+                        timeout=self.timeout
+                    )
+                    request_span.set_attribute('status', response.status_code)
+                    if response.status_code != 200:
+                        request_span.set_error(f"HTTP {response.status_code}")
                 
                 # Registrar tiempo de respuesta
                 elapsed_time = time.time() - start_time
                 logger.info(f"Respuesta recibida en {elapsed_time:.2f} segundos")
+                status = str(response.status_code)
+                metrics.CLAUDE_REQUEST_SECONDS.observe(elapsed_time, model=self.model, status=status)
+                metrics.CLAUDE_TIME_TO_FIRST_BYTE.observe(response.elapsed.total_seconds(), model=self.model)
+                metrics.CLAUDE_RESPONSES.inc(model=self.model, status=status)
                 
                 # Intentar extraer detalles del error si existe
                 if response.status_code != 200:
@@ -143,6 +228,7 @@ class ClaudeClient:
                                         # Actualizar también el límite almacenado para este modelo
                                         self.MODEL_LIMITS[self.model.lower()] = actual_limit
                                         logger.warning(f"Actualizando límite conocido para {self.model} a {actual_limit}")
+                                        retry_cause = 'max_tokens'
                                         continue
                                     
                             # Si el error es sobre thinking budget_tokens, ajustar para el próximo intento
@@ -156,6 +242,7 @@ class ClaudeClient:
                                         # Usar el valor máximo permitido
                                         logger.warning(f"Ajustando budget_tokens a {actual_limit} basado en mensaje de error")
                                         payload['thinking']['budget_tokens'] = actual_limit
+                                        retry_cause = 'thinking_budget'
                                         continue
                     except:
                         logger.error(f"No se pudo extraer detalle del error. Respuesta: {response.text[:500]}")
@@ -169,6 +256,7 @@ class ClaudeClient:
                         payload['messages'][0]['content'] = prompt
                     
                     # Lanzar la excepción para que sea manejada por el bloque except
+                    retry_cause = self._http_error_cause(response.status_code)
                     response.raise_for_status()
                 
                 # Parsear la respuesta
@@ -181,6 +269,7 @@ class ClaudeClient:
                     
                     # Si es un error recuperable, reintentar
                     if "rate_limit" in error_msg or "timeout" in error_msg:
+                        retry_cause = 'rate_limit' if "rate_limit" in error_msg else 'timeout'
                         continue
                     
                     return {
@@ -212,6 +301,11 @@ class ClaudeClient:
                     logger.info(f"El pensamiento extendido utilizó {thinking_tokens} tokens adicionales")
                 
                 logger.info(f"Texto generado con éxito. Tokens de entrada: {input_tokens}, Tokens de salida: {output_tokens}")
+                metrics.CLAUDE_TOKENS.inc(input_tokens, model=self.model, type='input')
+                metrics.CLAUDE_TOKENS.inc(output_tokens, model=self.model, type='output')
+                metrics.CLAUDE_TOKENS.inc(thinking_tokens, model=self.model, type='thinking')
+                if output_tokens and elapsed_time > 0:
+                    metrics.CLAUDE_OUTPUT_TOKENS_PER_SECOND.observe(output_tokens / elapsed_time, model=self.model)
                 
                 return {
                     'text': generated_text,
@@ -222,6 +316,8 @@ class ClaudeClient:
                 
             except Timeout:
                 logger.error(f"Timeout al llamar a la API de Claude (intento {attempt}/{self.max_retries})")
+                metrics.CLAUDE_RESPONSES.inc(model=self.model, status='timeout')
+                retry_cause = 'timeout'
                 if attempt == self.max_retries:
                     return {
                         'text': "Error: La solicitud a la API de Claude agotó el tiempo de espera. Por favor, inténtalo de nuevo más tarde.",
@@ -232,6 +328,10 @@ class ClaudeClient:
             
             except RequestException as e:
                 logger.error(f"Error en la solicitud HTTP (intento {attempt}/{self.max_retries}): {str(e)}")
+                if getattr(e, 'response', None) is None:
+                    # Sin respuesta (conexión rechazada, DNS...); los errores HTTP ya se contaron
+                    metrics.CLAUDE_RESPONSES.inc(model=self.model, status='connection_error')
+                    retry_cause = 'connection_error'
                 if attempt == self.max_retries:
                     # Intentar obtener detalles adicionales del error si están disponibles
                     error_detail = ""
@@ -253,6 +353,7 @@ class ClaudeClient:
             
             except Exception as e:
                 logger.error(f"Error inesperado (intento {attempt}/{self.max_retries}): {str(e)}")
+                retry_cause = 'unexpected'
                 if attempt == self.max_retries:
                     return {
                         'text': f"Error inesperado al generar el texto: {str(e)}",
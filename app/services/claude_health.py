@@ -0,0 +1,188 @@
+"""
+Estado de la conexión con la API de Claude.
+
+La comprobación (ClaudeClient.probe) pide el modelo configurado a la API de
+modelos: valida la API key y el modelo sin generar texto ni consumir tokens, con
+un único intento y un timeout corto. El último resultado se guarda en un archivo
+JSON compartido por todos los procesos del servidor (CLAUDE_HEALTH_FILE) y vale
+durante CLAUDE_HEALTH_TTL_SECONDS. Un hilo de fondo por proceso lo renueva cada
+CLAUDE_HEALTH_INTERVAL_SECONDS, salvo que otro proceso ya lo haya hecho, de modo
+que /api/check-claude-connection responde con el resultado guardado.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from flask import current_app
+from app import metrics
+from app.services.claude_api import ClaudeClient
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def client_from_config(config):
+    """Cliente de Claude con la configuración de la aplicación"""
+    return ClaudeClient(
+        api_key=config['CLAUDE_API_KEY'],
+        api_url=config['CLAUDE_API_URL'],
+        model=config['CLAUDE_MODEL']
+    )
+
+def client_fingerprint(client):
+    """Huella de la configuración comprobada: un resultado guardado no vale para otra key, URL o modelo"""
+    return hashlib.sha256(f"{client.api_url}|{client.model}|{client.api_key}".encode('utf-8')).hexdigest()[:16]
+
+class ClaudeHealth:
+    """Último resultado de la comprobación de la API, compartido entre procesos en un archivo"""
+    
+    def __init__(self, path, ttl, probe_timeout):
+        self.path = path
+        self.ttl = ttl
+        self.probe_timeout = probe_timeout
+        self._refreshing = threading.Lock()
+    
+    def load(self, client):
+        """
+        Returns:
+            dict: Último resultado guardado para la configuración del cliente (None si no hay)
+        """
+        try:
+            with open(self.path, encoding='utf-8') as source:
+                result = json.load(source)
+        except (OSError, ValueError):
+            return None
+        return result if result.get('fingerprint') == client_fingerprint(client) else None
+    
+    def age(self, result):
+        """Segundos desde la comprobación que produjo el resultado"""
+        return time.time() - result['checked_at_epoch']
+    
+    def is_fresh(self, result):
+        return result is not None and self.age(result) < self.ttl
+    
+    def check(self, client):
+        """Comprueba la API ahora, guarda el resultado y lo devuelve"""
+        result = client.probe(timeout=self.probe_timeout)
+        now = time.time()
+        result.update(
+            model=client.model,
+            fingerprint=client_fingerprint(client),
+            checked_at=datetime.fromtimestamp(now, timezone.utc).isoformat(),
+            checked_at_epoch=now
+        )
+        metrics.CLAUDE_API_UP.set(1 if result['ok'] else 0)
+        metrics.CLAUDE_HEALTH_CHECKS.inc(result='ok' if result['ok'] else 'error')
+        if not result['ok']:
+            logger.warning(f"La API de Claude no responde correctamente: {result['error']}")
+        self._save(result)
+        return result
+    
+    def _save(self, result):
+        # Escritura atómica: los demás procesos nunca leen un archivo a medias
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            fd, temporary = tempfile.mkstemp(dir=os.path.dirname(self.path) or '.', suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as output:
+                json.dump(result, output)
+            os.replace(temporary, self.path)
+        except OSError as e:
+            logger.error(f"No se pudo guardar el estado de la API de Claude en {self.path}: {str(e)}")
+    
+    def status(self, client):
+        """
+        Resultado para mostrar al usuario sin esperar a la API: el guardado si está
+        vigente; si caducó, el guardado mientras se renueva en segundo plano. Solo se
+        comprueba en la petición si nunca se ha hecho (como mucho probe_timeout segundos).
+        
+        Returns:
+            dict: Resultado con 'cached' indicando si procede de una comprobación anterior
+        """
+        result = self.load(client)
+        if result is None:
+            return dict(self.check(client), cached=False)
+        if not self.is_fresh(result):
+            self.refresh_in_background(client)
+        return dict(result, cached=True)
+    
+    def refresh_in_background(self, client):
+        """Renueva el resultado en un hilo (si no hay ya una renovación en curso en este proceso)"""
+        if not self._refreshing.acquire(blocking=False):
+            return
+        
+        def refresh():
+            try:
+                self.check(client)
+            finally:
+                self._refreshing.release()
+        
+        threading.Thread(target=refresh, name='claude-health-refresh', daemon=True).start()
+
+class ClaudeHealthMonitor:
+    """Hilo que renueva periódicamente el resultado guardado mientras el proceso sirve peticiones"""
+    
+    def __init__(self, health, client, interval):
+        self.health = health
+        self.client = client
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='claude-health-monitor', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+    
+    def _run(self):
+        while not self._stop.is_set():
+            result = self.health.load(self.client)
+            # Otro proceso pudo comprobarlo hace poco: no repetir la petición
+            if result is None or self.health.age(result) >= self.interval:
+                try:
+                    self.health.check(self.client)
+                except Exception as e:
+                    logger.error(f"Error en la comprobación periódica de la API de Claude: {str(e)}")
+            self._stop.wait(self.interval)
+
+def get_claude_health():
+    """Devuelve el estado compartido de la API de Claude de la aplicación actual"""
+    health = current_app.extensions.get('claude_health')
+    if health is None:
+        health = ClaudeHealth(
+            current_app.config['CLAUDE_HEALTH_FILE'],
+            current_app.config['CLAUDE_HEALTH_TTL_SECONDS'],
+            current_app.config['CLAUDE_HEALTH_PROBE_TIMEOUT']
+        )
+        current_app.extensions['claude_health'] = health
+    return health
+
+_monitor_lock = threading.Lock()
+
+def ensure_health_monitor():
+    """
+    Arranca el monitor de la aplicación actual la primera vez que se llama. Se
+    llama en las peticiones, no al crear la aplicación, para que cada proceso del
+    servidor (después del fork) tenga su hilo y la CLI no arranque ninguno.
+    """
+    app = current_app._get_current_object()
+    if 'claude_health_monitor' in app.extensions:
+        return
+    with _monitor_lock:
+        if 'claude_health_monitor' in app.extensions:
+            return
+        monitor = None
+        api_key = app.config['CLAUDE_API_KEY']
+        if app.config['CLAUDE_HEALTH_MONITOR'] and api_key and api_key != 'tu_api_key_de_claude_aqui':
+            monitor = ClaudeHealthMonitor(
+                get_claude_health(),
+                client_from_config(app.config),
+                app.config['CLAUDE_HEALTH_INTERVAL_SECONDS']
+            )
+            monitor.start()
+        app.extensions['claude_health_monitor'] = monitor
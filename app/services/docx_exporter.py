@@ -1,5 +1,4 @@
 import io
-import re
 from docx import Document
 from docx.shared import Pt, Inches, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_LINE_SPACING
@@ -7,51 +6,66 @@ from docx.enum.style import WD_STYLE_TYPE
 from docx.oxml.ns import qn
 from docx.oxml import OxmlElement
 from slugify import slugify
+from app.services.chapter_renderer import extract_headings, parse_chapter_content
+from app.services.parsed_book import ParsedBook
 
 class DocxExporter:
     """Clase para manejar la exportación de libros a formato DOCX optimizado para Kindle"""
     
-    def __init__(self, book):
+    # Incrementar cuando cambie el documento generado para invalidar la caché de exportación
+    EXPORTER_VERSION = 1
+    
+    def __init__(self, book, parsed_book=None):
         """
         Inicializa el exportador con un libro específico
         
         Args:
             book: Instancia del modelo Book a exportar
+            parsed_book: Libro ya cargado (ParsedBook), p. ej. en un proceso del pipeline
+                de exportación, donde no hay acceso a la base de datos
         """
         self.book = book
-        self.document = Document()
+        # Capítulos ya analizados (estructura prerenderizada, sin el contenido comprimido)
+        self.parsed_book = parsed_book or ParsedBook.load(book)
+        self.document = self.create_base_document()
         self._setup_document_properties()
     
-    def _setup_document_properties(self):
-        """Configurar las propiedades del documento para Kindle"""
-        # Configurar metadatos
-        core_properties = self.document.core_properties
-        core_properties.title = self.book.title
-        core_properties.subject = self.book.market_niche
-        core_properties.category = self.book.market_niche
-        
-        # Limitar el campo purpose a 255 caracteres para evitar errores
-        if self.book.purpose and len(self.book.purpose) > 250:
-            purpose_truncated = self.book.purpose[:250] + "..."
-            core_properties.comments = purpose_truncated
-        else:
-            core_properties.comments = self.book.purpose
+    @classmethod
+    def create_base_document(cls):
+        """
+        Crea un documento vacío con los estilos y el tamaño de página optimizados para Kindle.
+        También sirve de plantilla para StreamingDocxExporter.
+        """
+        document = Document()
         
         # Configurar estilos
-        self._setup_styles()
+        cls._setup_styles(document)
         
         # Configurar tamaño de página (optimizado para Kindle)
-        section = self.document.sections[0]
+        section = document.sections[0]
         section.page_width = Inches(6)
         section.page_height = Inches(9)
         section.left_margin = Inches(0.5)
         section.right_margin = Inches(0.5)
         section.top_margin = Inches(0.5)
         section.bottom_margin = Inches(0.5)
+        
+        return document
+    
+    def _setup_document_properties(self):
+        """Configurar las propiedades del documento para Kindle"""
+        # Configurar metadatos
+        core_properties = self.document.core_properties
+        core_properties.title = self.parsed_book.title
+        core_properties.subject = self.parsed_book.market_niche
+        core_properties.category = self.parsed_book.market_niche
+        # Propósito limitado a 255 caracteres para evitar errores
+        core_properties.comments = self.parsed_book.description
     
-    def _setup_styles(self):
+    @staticmethod
+    def _setup_styles(document):
         """Configurar los estilos del documento para Kindle"""
-        styles = self.document.styles
+        styles = document.styles
         
         # Estilo de título principal
         title_style = styles.add_style('TitleStyle', WD_STYLE_TYPE.PARAGRAPH)
@@ -132,75 +146,17 @@ class DocxExporter:
         tag.append(end)
     
     def _extract_headings(self, text):
-        """
-        Extrae los encabezados del texto del capítulo.
-        Busca líneas que parezcan encabezados (generalmente en negritas o con formato especial).
-        """
-        # Patrón para detectar encabezados (líneas cortas que no terminan con punto)
-        heading_pattern = r"(?m)^([A-Z][^\.]{5,60})$"
-        
-        # Detectar posibles encabezados
-        potential_headings = re.findall(heading_pattern, text)
-        
-        # Filtrar para evitar falsos positivos
-        headings = []
-        for heading in potential_headings:
-            # Verificar que no sea parte de un párrafo (tiene líneas vacías alrededor)
-            # y que sea lo suficientemente corto para ser un encabezado
-            if heading.strip() and len(heading.strip()) < 80:
-                headings.append(heading.strip())
-        
-        return headings
+        """Extrae los encabezados del texto del capítulo (ver chapter_renderer.extract_headings)"""
+        return extract_headings(text)
     
     def _process_chapter_content(self, content):
         """
         Procesa el contenido del capítulo para separar encabezados y párrafos.
         
-        Args:
-            content: Texto del capítulo
-            
         Returns:
             Lista de tuplas (tipo, texto) donde tipo puede ser 'heading' o 'paragraph'
         """
-        processed_content = []
-        
-        # Dividir el contenido por líneas
-        lines = content.strip().split("\n")
-        
-        i = 0
-        while i < len(lines):
-            current_line = lines[i].strip()
-            
-            # Saltar líneas vacías
-            if not current_line:
-                i += 1
-                continue
-            
-            # Detectar si es un posible encabezado
-            is_heading = (
-                current_line and 
-                len(current_line) < 80 and 
-                not current_line.endswith('.') and
-                (i == 0 or not lines[i-1].strip()) and
-                (i == len(lines)-1 or not lines[i+1].strip() or len(lines[i+1].strip()) > 150)
-            )
-            
-            if is_heading:
-                processed_content.append(('heading', current_line))
-                i += 1
-            else:
-                # Recolectar párrafo (líneas consecutivas que no están vacías)
-                paragraph_lines = [current_line]
-                j = i + 1
-                while j < len(lines) and lines[j].strip():
-                    paragraph_lines.append(lines[j].strip())
-                    j += 1
-                
-                paragraph_text = ' '.join(paragraph_lines)
-                processed_content.append(('paragraph', paragraph_text))
-                i = j
-        
-        return processed_content
+        return parse_chapter_content(content)
     
     def _add_toc_entry(self, text, level=1):
         """Añade una entrada a la tabla de contenidos"""
@@ -228,7 +184,7 @@ class DocxExporter:
             self._add_table_of_contents()
             
             # Agregar capítulos
-            for chapter in sorted(self.book.chapters, key=lambda x: x.chapter_number):
+            for chapter in self.parsed_book.chapters:
                 self._add_chapter(chapter)
             
             # Guardar el documento en un buffer BytesIO
@@ -246,7 +202,7 @@ class DocxExporter:
     def _add_title_page(self):
         """Añade la página de título al documento"""
         # Título del libro
-        title_paragraph = self.document.add_paragraph(self.book.title, style='TitleStyle')
+        title_paragraph = self.document.add_paragraph(self.parsed_book.title, style='TitleStyle')
         title_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
         
         # Salto de página
@@ -258,13 +214,12 @@ class DocxExporter:
         toc_title.alignment = WD_ALIGN_PARAGRAPH.CENTER
         
         # Agregar entradas de la tabla de contenidos
-        for chapter in sorted(self.book.chapters, key=lambda x: x.chapter_number):
-            bookmark_name = f"chapter_{chapter.chapter_number}"
-            self._add_toc_entry(f"Capítulo {chapter.chapter_number}: {chapter.title}")
+        for chapter in self.parsed_book.chapters:
+            bookmark_name = f"chapter_{chapter.number}"
+            self._add_toc_entry(chapter.full_title)
             
-            # Extraer subtítulos del capítulo
-            headings = self._extract_headings(chapter.content)
-            for heading in headings[:5]:  # Limitar a 5 subtítulos por capítulo para no sobrecargar el TOC
+            # Usar los subtítulos extraídos al guardar el capítulo
+            for heading in chapter.headings[:5]:  # Limitar a 5 subtítulos por capítulo para no sobrecargar el TOC
                 subheading_bookmark = slugify(heading)
                 self._add_toc_entry(heading, level=2)
         
@@ -276,18 +231,14 @@ class DocxExporter:
         Añade un capítulo al documento.
         
         Args:
-            chapter: Instancia del modelo Chapter
+            chapter: Capítulo analizado (ParsedChapter)
         """
         # Título del capítulo
-        chapter_title = f"Capítulo {chapter.chapter_number}: {chapter.title}"
-        chapter_para = self.document.add_paragraph(chapter_title, style='ChapterStyle')
-        self._add_bookmark(chapter_para, f"chapter_{chapter.chapter_number}")
-        
-        # Procesar el contenido del capítulo
-        processed_content = self._process_chapter_content(chapter.content)
+        chapter_para = self.document.add_paragraph(chapter.full_title, style='ChapterStyle')
+        self._add_bookmark(chapter_para, f"chapter_{chapter.number}")
         
-        # Añadir el contenido procesado
-        for content_type, text in processed_content:
+        # Añadir el contenido ya procesado al guardar el capítulo
+        for content_type, text in chapter.blocks:
             if content_type == 'heading':
                 heading_para = self.document.add_paragraph(text, style='HeadingStyle')
                 self._add_bookmark(heading_para, slugify(text))
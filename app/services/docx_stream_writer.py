@@ -0,0 +1,231 @@
+import io
+import re
+import zipfile
+import tempfile
+import threading
+from itertools import chain
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape
+from app.services.chapter_renderer import INVALID_XML_CHARS
+from app.services.parsed_book import ParsedBook
+from app.services.zip_stream import ZipStreamWriter, deflate_chunk
+
+# Tamaño a partir del cual el archivo generado pasa de memoria a disco
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+_template = None
+_template_lock = threading.Lock()
+
+class DocxTemplate:
+    """
+    Paquete DOCX vacío con los estilos y el formato de página de DocxExporter.
+    
+    Se construye una sola vez por proceso con python-docx; después solo se
+    reutilizan sus partes (ya comprimidas) y se sustituyen document.xml y core.xml.
+    """
+    
+    def __init__(self):
+        # python-docx solo se carga al construir la plantilla (una vez por proceso)
+        from app.services.docx_exporter import DocxExporter
+        
+        buffer = io.BytesIO()
+        DocxExporter.create_base_document().save(buffer)
+        buffer.seek(0)
+        
+        with zipfile.ZipFile(buffer) as package:
+            parts = [(info.filename, package.read(info.filename)) for info in package.infolist()]
+        # Pares (datos, fragmento deflate) para no recomprimir las partes fijas en cada libro
+        self.parts = [(name, (data, deflate_chunk(data))) for name, data in parts]
+        
+        document_xml = dict(parts)['word/document.xml'].decode('utf-8')
+        # Etiqueta de apertura con todos los espacios de nombres y propiedades de sección
+        self.document_open = document_xml[document_xml.index('<w:document'):document_xml.index('<w:body>')]
+        self.section_properties = re.search(r'<w:sectPr\b.*?</w:sectPr>', document_xml, re.DOTALL).group(0)
+
+def get_template():
+    """Devuelve la plantilla DOCX del proceso, creándola la primera vez"""
+    global _template
+    if _template is None:
+        with _template_lock:
+            if _template is None:
+                _template = DocxTemplate()
+    return _template
+
+def _text(text):
+    """Escapa un texto para incluirlo en un elemento w:t"""
+    text = INVALID_XML_CHARS.sub('', text)
+    space = ' xml:space="preserve"' if text != text.strip() else ''
+    return f'<w:t{space}>{escape(text)}</w:t>'
+
+def _paragraph(text, style=None, centered=False, bookmark=None):
+    """
+    Genera el XML de un párrafo.
+    
+    Args:
+        text: Texto del párrafo
+        style: ID del estilo de párrafo (None para 'Normal')
+        centered: Si el párrafo se alinea al centro
+        bookmark: Tupla (id, nombre) de un marcador para la navegación en Kindle
+    """
+    properties = ''
+    if style or centered:
+        properties = '<w:pPr>'
+        if style:
+            properties += f'<w:pStyle w:val="{style}"/>'
+        if centered:
+            properties += '<w:jc w:val="center"/>'
+        properties += '</w:pPr>'
+    
+    marker = ''
+    if bookmark:
+        bookmark_id, bookmark_name = bookmark
+        marker = (f'<w:bookmarkStart w:id="{bookmark_id}" w:name="{escape(bookmark_name)}"/>'
+                  f'<w:bookmarkEnd w:id="{bookmark_id}"/>')
+    
+    return f'<w:p>{properties}<w:r>{_text(text)}</w:r>{marker}</w:p>'
+
+PAGE_BREAK = '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+
+def render_title_xml(title):
+    """XML de la página de título"""
+    return _paragraph(title, style='TitleStyle', centered=True) + PAGE_BREAK
+
+def render_toc_xml(entries):
+    """
+    XML de la tabla de contenidos.
+    
+    Args:
+        entries: Lista de tuplas (número, título, encabezados) de cada capítulo
+    """
+    parts = [_paragraph("Tabla de Contenidos", style='TitleStyle', centered=True)]
+    for chapter_number, title, headings in entries:
+        parts.append(_paragraph(f"Capítulo {chapter_number}: {title}", style='TOC1'))
+        # Limitar a 5 subtítulos por capítulo para no sobrecargar el TOC
+        for heading in headings[:5]:
+            parts.append(_paragraph(heading, style='TOC2'))
+    parts.append(PAGE_BREAK)
+    return ''.join(parts)
+
+def render_chapter_xml(chapter_number, title, blocks):
+    """
+    XML completo de un capítulo a partir de sus bloques prerenderizados.
+    
+    Es una función pura (solo recibe datos simples), de modo que puede ejecutarse
+    en otro proceso. Los IDs de los marcadores se derivan del número de capítulo
+    para que sean únicos en el documento sin coordinación entre capítulos.
+    
+    Args:
+        chapter_number: Número del capítulo
+        title: Título del capítulo
+        blocks: Lista de pares (tipo, texto) con tipo 'heading' o 'paragraph'
+    """
+    from slugify import slugify
+    
+    bookmark_base = chapter_number * 10000
+    parts = [_paragraph(
+        f"Capítulo {chapter_number}: {title}",
+        style='ChapterStyle',
+        bookmark=(bookmark_base, f"chapter_{chapter_number}")
+    )]
+    for index, (block_type, text) in enumerate(blocks, start=1):
+        if block_type == 'heading':
+            parts.append(_paragraph(text, style='HeadingStyle', bookmark=(bookmark_base + index, slugify(text))))
+        else:
+            parts.append(_paragraph(text))
+    return ''.join(parts)
+
+def render_core_xml(title, subject, description):
+    """XML de las propiedades del documento (docProps/core.xml)"""
+    now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    return (
+        "<?xml version='1.0' encoding='UTF-8' standalone='yes'?>\n"
+        '<cp:coreProperties xmlns:cp="http://schemas.openxmlformats.org/package/2006/metadata/core-properties" '
+        'xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:dcterms="http://purl.org/dc/terms/" '
+        'xmlns:dcmitype="http://purl.org/dc/dcmitype/" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+        f'<dc:title>{escape(title or "")}</dc:title>'
+        f'<dc:subject>{escape(subject or "")}</dc:subject>'
+        f'<dc:description>{escape(description or "")}</dc:description>'
+        f'<cp:category>{escape(subject or "")}</cp:category>'
+        '<cp:revision>1</cp:revision>'
+        f'<dcterms:created xsi:type="dcterms:W3CDTF">{now}</dcterms:created>'
+        f'<dcterms:modified xsi:type="dcterms:W3CDTF">{now}</dcterms:modified>'
+        '</cp:coreProperties>'
+    )
+
+def book_core_xml(parsed_book):
+    """XML de las propiedades del documento de un libro, con los mismos campos que DocxExporter"""
+    return render_core_xml(parsed_book.title, parsed_book.market_niche, parsed_book.description)
+
+def deflate_fragment(xml):
+    """
+    Codifica y comprime un fragmento XML del cuerpo del documento.
+    
+    Returns:
+        tuple: (bytes sin comprimir, fragmento deflate concatenable)
+    """
+    data = xml.encode('utf-8')
+    return data, deflate_chunk(data)
+
+def write_docx_package(fileobj, core_xml, body_chunks):
+    """
+    Escribe el paquete DOCX en `fileobj` emitiendo document.xml de forma incremental.
+    
+    Args:
+        fileobj: Archivo binario de destino (no necesita soportar seek)
+        core_xml: XML de las propiedades del documento
+        body_chunks: Iterable de fragmentos del cuerpo ya comprimidos con deflate_fragment(), en orden
+    """
+    template = get_template()
+    with ZipStreamWriter(fileobj) as package:
+        for name, chunk in template.parts:
+            if name == 'docProps/core.xml':
+                package.write_bytes(name, core_xml.encode('utf-8'))
+            elif name == 'word/document.xml':
+                opening = "<?xml version='1.0' encoding='UTF-8' standalone='yes'?>\n" + template.document_open + '<w:body>'
+                closing = template.section_properties + '</w:body></w:document>'
+                package.write_deflated(name, chain(
+                    [deflate_fragment(opening)],
+                    body_chunks,
+                    [deflate_fragment(closing)]
+                ))
+            else:
+                package.write_deflated(name, [chunk])
+
+class StreamingDocxExporter:
+    """
+    Exportador DOCX que no usa el modelo de objetos de python-docx.
+    
+    Genera el mismo documento que DocxExporter, pero escribe cada capítulo como XML
+    directamente en el ZIP, capítulo a capítulo, sobre un archivo temporal que pasa
+    a disco cuando crece. Así se evita el árbol de python-docx/lxml de todo el
+    documento, aunque el libro (ParsedBook) sigue cargado entero en memoria, de modo
+    que la memoria usada crece con el texto del libro.
+    """
+    
+    # Incrementar cuando cambie el documento generado para invalidar la caché de exportación
+    EXPORTER_VERSION = 1
+    
+    def __init__(self, book):
+        """
+        Inicializa el exportador con un libro específico
+        
+        Args:
+            book: Instancia del modelo Book a exportar
+        """
+        self.book = book
+        self.parsed_book = ParsedBook.load(book)
+    
+    def generate_docx(self):
+        """
+        Genera el documento DOCX para el libro. Los libros grandes se renderizan
+        en paralelo con el pipeline de exportación (ver export_pipeline).
+        
+        Returns:
+            SpooledTemporaryFile: Contenido del documento DOCX, posicionado al inicio
+        """
+        from app.services.export_pipeline import get_export_pipeline
+        
+        output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        get_export_pipeline().write_book(output, self.parsed_book)
+        output.seek(0)
+        return output
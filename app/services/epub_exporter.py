@@ -0,0 +1,189 @@
+import tempfile
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape
+from app.services.parsed_book import ParsedBook, heading_text
+from app.services.zip_stream import ZipStreamWriter
+
+# Tamaño a partir del cual el archivo generado pasa de memoria a disco
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+CONTAINER_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+"""
+
+STYLES_CSS = """body { font-family: serif; line-height: 1.4; margin: 0 5%; }
+h1.book-title { text-align: center; font-size: 2em; margin-top: 30%; }
+h1.chapter-title { text-align: center; font-size: 1.6em; margin: 1.5em 0 1em; page-break-before: always; }
+h2 { font-size: 1.2em; margin: 1.2em 0 0.6em; }
+p { text-align: justify; text-indent: 1.5em; margin: 0 0 0.6em; }
+nav ol { list-style: none; padding-left: 0; }
+nav ol ol { padding-left: 1.5em; font-style: italic; }
+"""
+
+def _xhtml(title, body):
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<!DOCTYPE html>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" xml:lang="es" lang="es">\n'
+        f'<head><meta charset="UTF-8"/><title>{escape(title)}</title>'
+        '<link rel="stylesheet" type="text/css" href="styles.css"/></head>\n'
+        f'<body>\n{body}\n</body>\n</html>\n'
+    )
+
+def chapter_filename(number):
+    return f"chapter-{number:03d}.xhtml"
+
+def heading_id(number, index):
+    return f"c{number}-h{index}"
+
+def render_chapter_xhtml(chapter):
+    """XHTML de un capítulo (ParsedChapter); los encabezados llevan un id para la navegación"""
+    parts = [f'<section epub:type="chapter" id="chapter-{chapter.number}">',
+             f'<h1 class="chapter-title">{escape(chapter.full_title)}</h1>']
+    for index, (block_type, text) in enumerate(chapter.blocks, start=1):
+        if block_type == 'heading':
+            parts.append(f'<h2 id="{heading_id(chapter.number, index)}">{escape(heading_text(text))}</h2>')
+        else:
+            parts.append(f'<p>{escape(text)}</p>')
+    parts.append('</section>')
+    return _xhtml(chapter.full_title, '\n'.join(parts))
+
+def _chapter_headings(chapter):
+    """Pares (id, texto) de los encabezados del capítulo"""
+    return [
+        (heading_id(chapter.number, index), heading_text(text))
+        for index, (block_type, text) in enumerate(chapter.blocks, start=1)
+        if block_type == 'heading'
+    ]
+
+def render_nav_xhtml(parsed_book):
+    """Documento de navegación EPUB 3 (también se muestra como tabla de contenidos)"""
+    items = []
+    for chapter in parsed_book.chapters:
+        filename = chapter_filename(chapter.number)
+        item = f'<li><a href="{filename}">{escape(chapter.full_title)}</a>'
+        headings = _chapter_headings(chapter)
+        if headings:
+            item += '<ol>' + ''.join(
+                f'<li><a href="{filename}#{anchor}">{escape(text)}</a></li>' for anchor, text in headings
+            ) + '</ol>'
+        items.append(item + '</li>')
+    body = (
+        '<nav epub:type="toc" id="toc"><h1 class="chapter-title">Tabla de Contenidos</h1>'
+        f'<ol>{"".join(items)}</ol></nav>'
+    )
+    return _xhtml("Tabla de Contenidos", body)
+
+def render_ncx(parsed_book):
+    """toc.ncx para lectores EPUB 2 y herramientas de conversión antiguas"""
+    points = []
+    order = 0
+    for chapter in parsed_book.chapters:
+        order += 1
+        chapter_order = order
+        filename = chapter_filename(chapter.number)
+        children = []
+        for anchor, text in _chapter_headings(chapter):
+            order += 1
+            children.append(
+                f'<navPoint id="np-{order}" playOrder="{order}"><navLabel><text>{escape(text)}</text></navLabel>'
+                f'<content src="{filename}#{anchor}"/></navPoint>'
+            )
+        points.append(
+            f'<navPoint id="np-{chapter_order}" playOrder="{chapter_order}">'
+            f'<navLabel><text>{escape(chapter.full_title)}</text></navLabel>'
+            f'<content src="{filename}"/>{"".join(children)}</navPoint>'
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">'
+        f'<head><meta name="dtb:uid" content="urn:uuid:{parsed_book.uuid}"/></head>'
+        f'<docTitle><text>{escape(parsed_book.title)}</text></docTitle>'
+        f'<navMap>{"".join(points)}</navMap></ncx>'
+    )
+
+def render_opf(parsed_book):
+    """Paquete OPF: metadatos, manifiesto y orden de lectura"""
+    modified = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    manifest = [
+        '<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>',
+        '<item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>',
+        '<item id="css" href="styles.css" media-type="text/css"/>',
+        '<item id="title" href="title.xhtml" media-type="application/xhtml+xml"/>'
+    ]
+    spine = ['<itemref idref="title"/>', '<itemref idref="nav"/>']
+    for chapter in parsed_book.chapters:
+        manifest.append(
+            f'<item id="chapter-{chapter.number}" href="{chapter_filename(chapter.number)}" media-type="application/xhtml+xml"/>'
+        )
+        spine.append(f'<itemref idref="chapter-{chapter.number}"/>')
+    
+    metadata = [
+        f'<dc:identifier id="book-id">urn:uuid:{parsed_book.uuid}</dc:identifier>',
+        f'<dc:title>{escape(parsed_book.title)}</dc:title>',
+        '<dc:language>es</dc:language>',
+        f'<meta property="dcterms:modified">{modified}</meta>'
+    ]
+    if parsed_book.market_niche:
+        metadata.append(f'<dc:subject>{escape(parsed_book.market_niche)}</dc:subject>')
+    if parsed_book.description:
+        metadata.append(f'<dc:description>{escape(parsed_book.description)}</dc:description>')
+    
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id" xml:lang="es">'
+        f'<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">{"".join(metadata)}</metadata>'
+        f'<manifest>{"".join(manifest)}</manifest>'
+        f'<spine toc="ncx">{"".join(spine)}</spine>'
+        '</package>'
+    )
+
+class EpubExporter:
+    """
+    Exportador EPUB 3 (XHTML comprimido con documento de navegación y toc.ncx).
+    
+    Cada capítulo es un archivo XHTML independiente que se escribe en el ZIP a
+    partir del libro analizado, sin volver a recorrer el texto de los capítulos.
+    """
+    
+    # Incrementar cuando cambie el documento generado para invalidar la caché de exportación
+    EXPORTER_VERSION = 2
+    
+    def __init__(self, book):
+        """
+        Inicializa el exportador con un libro específico
+        
+        Args:
+            book: Instancia del modelo Book a exportar
+        """
+        self.book = book
+        self.parsed_book = ParsedBook.load(book)
+    
+    def generate_epub(self):
+        """
+        Genera el archivo EPUB para el libro.
+        
+        Returns:
+            SpooledTemporaryFile: Contenido del EPUB, posicionado al inicio
+        """
+        output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        parsed_book = self.parsed_book
+        with ZipStreamWriter(output) as package:
+            # El tipo MIME debe ser la primera entrada y sin comprimir
+            package.write_bytes('mimetype', b'application/epub+zip', compress=False)
+            package.write_bytes('META-INF/container.xml', CONTAINER_XML.encode('utf-8'))
+            package.write_bytes('OEBPS/content.opf', render_opf(parsed_book).encode('utf-8'))
+            package.write_bytes('OEBPS/nav.xhtml', render_nav_xhtml(parsed_book).encode('utf-8'))
+            package.write_bytes('OEBPS/toc.ncx', render_ncx(parsed_book).encode('utf-8'))
+            package.write_bytes('OEBPS/styles.css', STYLES_CSS.encode('utf-8'))
+            package.write_bytes('OEBPS/title.xhtml', _xhtml(
+                parsed_book.title, f'<h1 class="book-title">{escape(parsed_book.title)}</h1>'
+            ).encode('utf-8'))
+            for chapter in parsed_book.chapters:
+                package.write_bytes(f'OEBPS/{chapter_filename(chapter.number)}', render_chapter_xhtml(chapter).encode('utf-8'))
+        output.seek(0)
+        return output
@@ -0,0 +1,142 @@
+import queue
+import threading
+import logging
+from sqlalchemy import event, inspect as db_inspect
+from sqlalchemy.orm import Session, object_session
+from app.models.book import Book, Chapter
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class EventBroker:
+    """
+    Bus de eventos en memoria que notifica los cambios de los libros
+    a las conexiones Server-Sent Events abiertas en este proceso.
+    
+    Cada suscriptor tiene su propia cola. Los eventos se publican solo después
+    de que la transacción que los originó se haya confirmado. Además de las colas,
+    se pueden registrar funciones que se llaman de forma síncrona con cada evento
+    (p. ej. para invalidar cachés).
+    """
+    
+    # Canal que recibe los eventos de todos los libros
+    ALL_BOOKS = '*'
+    
+    def __init__(self, max_queue_size=100):
+        self.max_queue_size = max_queue_size
+        self._subscribers = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+    
+    def add_listener(self, callback):
+        """Registra una función callback(book_id, event_type, data) para todos los eventos"""
+        with self._lock:
+            self._listeners.append(callback)
+    
+    def subscribe(self, book_id=ALL_BOOKS):
+        """
+        Registra un nuevo suscriptor para un libro (o para todos los libros).
+        
+        Returns:
+            queue.Queue: Cola en la que se recibirán los eventos
+        """
+        subscriber = queue.Queue(maxsize=self.max_queue_size)
+        with self._lock:
+            self._subscribers.setdefault(book_id, set()).add(subscriber)
+        return subscriber
+    
+    def unsubscribe(self, book_id, subscriber):
+        """Elimina un suscriptor cuando se cierra su conexión"""
+        with self._lock:
+            subscribers = self._subscribers.get(book_id)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[book_id]
+    
+    def publish(self, book_id, event_type, data=None):
+        """
+        Envía un evento a los suscriptores del libro y a los del canal global.
+        
+        Args:
+            book_id: ID del libro afectado
+            event_type: Tipo de evento ('created', 'status', 'chapter', 'chapter_removed')
+            data: Información adicional del evento
+        """
+        payload = {'type': event_type, 'book_id': book_id}
+        payload.update(data or {})
+        
+        with self._lock:
+            subscribers = list(self._subscribers.get(book_id, ())) + list(self._subscribers.get(self.ALL_BOOKS, ()))
+            listeners = list(self._listeners)
+        
+        for callback in listeners:
+            try:
+                callback(book_id, event_type, payload)
+            except Exception as e:
+                logger.error(f"Error en el listener de eventos para el libro {book_id}: {str(e)}")
+        
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(payload)
+            except queue.Full:
+                # Un cliente lento no debe bloquear la generación; el siguiente
+                # latido volverá a sincronizar su estado desde la base de datos
+                logger.warning(f"Cola de eventos llena, descartando evento '{event_type}' del libro {book_id}")
+    
+    def listen(self, subscriber, timeout):
+        """
+        Espera el siguiente evento de un suscriptor.
+        
+        Returns:
+            dict: El evento recibido o None si se agotó el tiempo de espera
+        """
+        try:
+            return subscriber.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+# Instancia compartida por las rutas y los hilos de generación del proceso
+event_broker = EventBroker()
+
+def _queue_event(target, book_id, event_type, **data):
+    """Guarda un evento en la sesión hasta que la transacción se confirme"""
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('book_events', []).append((book_id, event_type, data))
+
+@event.listens_for(Book, 'after_insert')
+def _book_created(mapper, connection, target):
+    _queue_event(target, target.id, 'created', status=target.status)
+
+@event.listens_for(Book, 'after_update')
+def _book_updated(mapper, connection, target):
+    state = db_inspect(target)
+    if state.attrs.status.history.has_changes() or state.attrs.error_message.history.has_changes():
+        _queue_event(target, target.id, 'status', status=target.status)
+
+@event.listens_for(Chapter, 'after_insert')
+def _chapter_saved(mapper, connection, target):
+    _queue_event(
+        target,
+        target.book_id,
+        'chapter',
+        chapter_number=target.chapter_number,
+        title=target.title,
+        scope=target.scope,
+        word_count=target.word_count
+    )
+
+@event.listens_for(Chapter, 'after_delete')
+def _chapter_removed(mapper, connection, target):
+    _queue_event(target, target.book_id, 'chapter_removed', chapter_number=target.chapter_number)
+
+@event.listens_for(Session, 'after_commit')
+def _publish_committed_events(session):
+    for book_id, event_type, data in session.info.pop('book_events', []):
+        event_broker.publish(book_id, event_type, data)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back_events(session):
+    session.info.pop('book_events', None)
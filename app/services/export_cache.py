@@ -0,0 +1,273 @@
+import os
+import shutil
+import hashlib
+import logging
+import importlib
+import tempfile
+from flask import current_app
+from app import metrics
+from app.models.book import Chapter
+from app.services.epub_exporter import EpubExporter
+from app.services.markdown_exporter import MarkdownExporter
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ExportCache:
+    """
+    Caché en disco de los archivos exportados de cada libro.
+    
+    Cada archivo se identifica por un hash del contenido de los capítulos y de la
+    versión del exportador, de modo que un cambio en el libro produce una clave nueva.
+    El tamaño total está acotado y se expulsan primero los archivos menos usados (LRU).
+    """
+    
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+    
+    @staticmethod
+    def cache_key(book, chapters, exporter_version):
+        """
+        Calcula la clave de caché a partir de los metadatos del libro y del hash de cada capítulo.
+        
+        Args:
+            book: Instancia del modelo Book
+            chapters: Capítulos del libro (solo se usan sus metadatos)
+            exporter_version: Versión del exportador que genera el archivo
+        """
+        digest = hashlib.sha256()
+        digest.update(f"{exporter_version}\0{book.title}\0{book.market_niche}\0{book.purpose}".encode('utf-8'))
+        for chapter in chapters:
+            # Los capítulos sin prerenderizar se identifican por su ID (regenerar crea uno nuevo)
+            chapter_hash = chapter.content_hash or f"id-{chapter.id}"
+            digest.update(f"\0{chapter.chapter_number}\0{chapter.title}\0{chapter_hash}".encode('utf-8'))
+        return digest.hexdigest()
+    
+    def _path(self, book_uuid, key, extension):
+        return os.path.join(self.cache_dir, f"{book_uuid}-{key}.{extension}")
+    
+    def get(self, book_uuid, key, extension):
+        """
+        Devuelve la ruta del archivo en caché o None si no existe.
+        Actualiza su fecha de modificación para la política LRU.
+        """
+        path = self._path(book_uuid, key, extension)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+    
+    def open(self, book_uuid, key, extension):
+        """
+        Abre el archivo en caché en modo binario, o devuelve None si no existe.
+        Una vez abierto sigue siendo legible aunque otra petición lo elimine de la
+        caché (una versión nueva del libro, la expulsión LRU o una invalidación).
+        """
+        path = self.get(book_uuid, key, extension)
+        if path is None:
+            return None
+        try:
+            return open(path, 'rb')
+        except FileNotFoundError:
+            return None
+    
+    def put(self, book_uuid, key, extension, fileobj):
+        """
+        Guarda un archivo exportado de forma atómica y elimina las versiones anteriores del libro.
+        
+        Returns:
+            str: Ruta del archivo guardado
+        """
+        return self.commit(book_uuid, key, extension, self._write_temp(fileobj))
+    
+    def _write_temp(self, fileobj):
+        """Copia un archivo exportado a un temporal de la caché y devuelve su ruta"""
+        tmp_path = self.new_temp_path()
+        try:
+            with open(tmp_path, 'wb') as tmp_file:
+                shutil.copyfileobj(fileobj, tmp_file)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return tmp_path
+    
+    def new_temp_path(self):
+        """Crea un archivo temporal vacío en el directorio de la caché y devuelve su ruta"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        os.close(fd)
+        return tmp_path
+    
+    def commit(self, book_uuid, key, extension, tmp_path):
+        """
+        Mueve a la caché un archivo ya escrito en `new_temp_path()` (p. ej. por un proceso
+        del pipeline de exportación) y elimina las versiones anteriores del libro.
+        
+        Returns:
+            str: Ruta del archivo guardado
+        """
+        path = self._path(book_uuid, key, extension)
+        try:
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        
+        self.invalidate(book_uuid, extension=extension, keep=path)
+        self._evict()
+        return path
+    
+    def invalidate(self, book_uuid, extension=None, keep=None):
+        """Elimina los archivos en caché de un libro (opcionalmente solo de una extensión)"""
+        prefix = f"{book_uuid}-"
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if not name.startswith(prefix) or path == keep:
+                continue
+            if extension and not name.endswith(f".{extension}"):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    
+    def _evict(self):
+        """Expulsa los archivos menos usados hasta respetar el tamaño máximo"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.tmp'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                logger.info(f"Caché de exportación: expulsado {os.path.basename(path)}")
+            except FileNotFoundError:
+                pass
+    
+    def open_or_build(self, book, extension, exporter_version, build):
+        """
+        Abre el archivo exportado, generándolo con `build()` si no está en caché.
+        
+        Se devuelve abierto (y no su ruta) para que otra petición no pueda
+        eliminarlo de la caché antes de que se lea.
+        
+        Args:
+            book: Instancia del modelo Book
+            extension: Extensión del archivo ('docx', ...)
+            exporter_version: Versión del exportador
+            build: Función que genera el archivo y devuelve un objeto tipo archivo
+        
+        Returns:
+            Archivo abierto en modo binario; quien lo recibe debe cerrarlo
+        """
+        chapters = Chapter.query.filter_by(book_id=book.id).order_by(Chapter.chapter_number).all()
+        key = self.cache_key(book, chapters, exporter_version)
+        export_file = self.open(book.uuid, key, extension)
+        if export_file is not None:
+            logger.info(f"Exportación {extension} del libro {book.id} servida desde caché")
+            metrics.EXPORT_CACHE_REQUESTS.inc(format=extension, result='hit')
+            return export_file
+        
+        metrics.EXPORT_CACHE_REQUESTS.inc(format=extension, result='miss')
+        with metrics.EXPORT_SECONDS.time(format=extension, exporter=exporter_version):
+            tmp_path = self._write_temp(build())
+            # Abrirlo antes de moverlo a la caché, donde podría expulsarse enseguida
+            export_file = open(tmp_path, 'rb')
+            try:
+                self.commit(book.uuid, key, extension, tmp_path)
+            except Exception:
+                export_file.close()
+                raise
+        return export_file
+
+def get_export_cache():
+    """Devuelve la caché de exportación de la aplicación actual"""
+    cache = current_app.extensions.get('export_cache')
+    if cache is None:
+        cache = ExportCache(
+            current_app.config['EXPORT_CACHE_DIR'],
+            current_app.config['EXPORT_CACHE_MAX_BYTES']
+        )
+        current_app.extensions['export_cache'] = cache
+    return cache
+
+# Exportadores DOCX disponibles según Config.DOCX_WRITER (módulo y clase).
+# Se importan al usarlos para que arrancar la aplicación no cargue python-docx.
+DOCX_WRITERS = {
+    'python-docx': ('app.services.docx_exporter', 'DocxExporter'),
+    'streaming': ('app.services.docx_stream_writer', 'StreamingDocxExporter'),
+}
+
+def load_docx_writer(writer):
+    """Devuelve la clase del exportador DOCX `writer` (una clave de DOCX_WRITERS)"""
+    if writer not in DOCX_WRITERS:
+        raise ValueError(f"DOCX_WRITER no válido: {writer}")
+    module_name, class_name = DOCX_WRITERS[writer]
+    return getattr(importlib.import_module(module_name), class_name)
+
+def get_docx_exporter_class():
+    """Devuelve la clase del exportador DOCX configurada"""
+    return load_docx_writer(current_app.config['DOCX_WRITER'])
+
+def cache_version(exporter_class):
+    """Versión con la que se indexan en caché los archivos generados por `exporter_class`"""
+    return f"{exporter_class.__name__}-{exporter_class.EXPORTER_VERSION}"
+
+def open_docx_export(book):
+    """Abre el DOCX del libro, generándolo solo si su contenido ha cambiado"""
+    exporter_class = get_docx_exporter_class()
+    return get_export_cache().open_or_build(
+        book,
+        'docx',
+        cache_version(exporter_class),
+        lambda: exporter_class(book).generate_docx()
+    )
+
+def open_epub_export(book):
+    """Abre el EPUB del libro, generándolo solo si su contenido ha cambiado"""
+    return get_export_cache().open_or_build(
+        book,
+        'epub',
+        cache_version(EpubExporter),
+        lambda: EpubExporter(book).generate_epub()
+    )
+
+def open_markdown_export(book):
+    """Abre el Markdown del libro, generándolo solo si su contenido ha cambiado"""
+    return get_export_cache().open_or_build(
+        book,
+        'md',
+        cache_version(MarkdownExporter),
+        lambda: MarkdownExporter(book).generate_markdown()
+    )
+
+def prerender_docx_export(book):
+    """
+    Genera por adelantado el DOCX de un libro recién completado para que la
+    primera descarga sea inmediata. Los errores se registran pero no se propagan.
+    """
+    if not current_app.config['EXPORT_PRERENDER_ON_COMPLETE']:
+        return
+    try:
+        if book.status == 'completed' and book.completed_chapters >= 10:
+            open_docx_export(book).close()
+            logger.info(f"DOCX del libro {book.id} pregenerado en caché")
+    except Exception as e:
+        logger.error(f"Error al pregenerar el DOCX del libro {book.id}: {str(e)}")
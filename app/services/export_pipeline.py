@@ -0,0 +1,221 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app
+from app import db
+from app.models.book import Book, Chapter
+from app.services.docx_stream_writer import (
+    StreamingDocxExporter, book_core_xml, deflate_fragment, render_chapter_xml, render_title_xml,
+    render_toc_xml, write_docx_package
+)
+from app.services.export_cache import cache_version, get_docx_exporter_class, get_export_cache
+from app.services.parsed_book import ParsedBook
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _render_chapter(chapter):
+    """
+    Tarea del pool: XML de un capítulo (ParsedChapter), ya comprimido.
+    La compresión es la parte más costosa, por eso se hace también en el proceso hijo.
+    """
+    return deflate_fragment(render_chapter_xml(chapter.number, chapter.title, chapter.blocks))
+
+def _book_chunks(parsed_book, chapter_chunks):
+    yield deflate_fragment(render_title_xml(parsed_book.title))
+    yield deflate_fragment(render_toc_xml([
+        (chapter.number, chapter.title, chapter.headings) for chapter in parsed_book.chapters
+    ]))
+    yield from chapter_chunks
+
+def export_book_job(parsed_book, path):
+    """Tarea del pool: genera el paquete DOCX completo de un libro (ParsedBook) en `path`"""
+    with open(path, 'wb') as output:
+        chunks = (_render_chapter(chapter) for chapter in parsed_book.chapters)
+        write_docx_package(output, book_core_xml(parsed_book), _book_chunks(parsed_book, chunks))
+    return path
+
+def export_python_docx_job(parsed_book, path):
+    """Tarea del pool: genera con python-docx (DocxExporter) el DOCX de un libro (ParsedBook) en `path`"""
+    from app.services.docx_exporter import DocxExporter
+    
+    with open(path, 'wb') as output:
+        shutil.copyfileobj(DocxExporter(None, parsed_book).generate_docx(), output)
+    return path
+
+class ExportPipeline:
+    """
+    Pipeline de exportación DOCX sobre un pool de procesos.
+    
+    - Un libro grande se reparte por capítulos entre los procesos y los fragmentos
+      se escriben en orden en el paquete a medida que llegan.
+    - En exportaciones masivas cada proceso genera un libro completo mientras el
+      proceso principal lee el siguiente de la base de datos.
+    
+    Con `max_workers` 0 o 1 todo se ejecuta en el proceso actual: con un solo
+    núcleo el coste de serializar los capítulos supera lo que se gana.
+    """
+    
+    def __init__(self, max_workers, min_chapters):
+        self.max_workers = max_workers
+        self.min_chapters = min_chapters
+        self._executor = None
+        self._lock = threading.Lock()
+    
+    @property
+    def enabled(self):
+        return self.max_workers > 1
+    
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # 'spawn' evita heredar hilos y conexiones abiertas del proceso web
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+    
+    def reset(self):
+        """Descarta el pool actual (p. ej. si un proceso murió); se recrea en el siguiente uso"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+    
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+    
+    def write_book(self, fileobj, parsed_book):
+        """
+        Escribe el DOCX de un libro en `fileobj`, renderizando los capítulos en el pool
+        si el libro tiene al menos `min_chapters` capítulos.
+        
+        Args:
+            fileobj: Archivo binario de destino (con soporte de seek/truncate)
+            parsed_book: Libro analizado (ParsedBook)
+        """
+        chapters = parsed_book.chapters
+        if self.enabled and len(chapters) >= self.min_chapters:
+            try:
+                chunksize = max(1, len(chapters) // (self.max_workers * 4))
+                chunks = self._get_executor().map(_render_chapter, chapters, chunksize=chunksize)
+                write_docx_package(fileobj, book_core_xml(parsed_book), _book_chunks(parsed_book, chunks))
+                return
+            except BrokenProcessPool:
+                logger.error("El pool de exportación se interrumpió; se renderiza en el proceso actual")
+                self.reset()
+                fileobj.seek(0)
+                fileobj.truncate()
+        
+        chunks = (_render_chapter(chapter) for chapter in chapters)
+        write_docx_package(fileobj, book_core_xml(parsed_book), _book_chunks(parsed_book, chunks))
+    
+    def submit_book(self, parsed_book, path, job=export_book_job):
+        """
+        Encola la exportación completa de un libro a `path`.
+        
+        Args:
+            parsed_book: Libro analizado (ParsedBook)
+            path: Archivo de destino
+            job: Tarea que genera el documento (export_book_job o export_python_docx_job)
+        
+        Returns:
+            Future: Se resuelve con la ruta cuando el archivo está escrito
+        """
+        if self.enabled:
+            return self._get_executor().submit(job, parsed_book, path)
+        
+        future = Future()
+        try:
+            future.set_result(job(parsed_book, path))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+def get_export_pipeline():
+    """Devuelve el pipeline de exportación de la aplicación actual"""
+    pipeline = current_app.extensions.get('export_pipeline')
+    if pipeline is None:
+        pipeline = ExportPipeline(
+            current_app.config['EXPORT_POOL_WORKERS'],
+            current_app.config['EXPORT_POOL_MIN_CHAPTERS']
+        )
+        atexit.register(pipeline.shutdown)
+        current_app.extensions['export_pipeline'] = pipeline
+    return pipeline
+
+def _finish_exports(cache, pipeline, pending, done):
+    for future in done:
+        book_uuid, key, tmp_path = pending.pop(future)
+        try:
+            future.result()
+            yield book_uuid, cache.commit(book_uuid, key, 'docx', tmp_path), 'exported'
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                pipeline.reset()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            logger.error(f"Error al exportar el libro {book_uuid}: {str(e)}")
+            yield book_uuid, None, 'error'
+
+def export_all_books(status='completed', force=False):
+    """
+    Exporta a DOCX (en la caché de exportación) todos los libros con el estado indicado
+    y al menos 10 capítulos, con el exportador configurado (DOCX_WRITER) y la misma
+    clave de caché que las descargas. Los libros se reparten entre los procesos del
+    pipeline, sea cual sea el exportador, y solo se cargan sus bloques si no están en caché.
+    
+    Args:
+        status: Estado de los libros a exportar
+        force: Regenerar también los libros que ya están en caché
+    
+    Yields:
+        tuple: (uuid del libro, ruta del archivo o None, 'exported' | 'cached' | 'error')
+    """
+    cache = get_export_cache()
+    pipeline = get_export_pipeline()
+    exporter_class = get_docx_exporter_class()
+    version = cache_version(exporter_class)
+    job = export_book_job if exporter_class is StreamingDocxExporter else export_python_docx_job
+    # Mantener ocupados los procesos sin cargar en memoria todo el catálogo
+    window = max(2, pipeline.max_workers * 2)
+    
+    book_ids = [book_id for (book_id,) in db.session.query(Book.id).filter(
+        Book.status == status,
+        Book.completed_chapters >= 10
+    ).order_by(Book.id)]
+    
+    pending = {}
+    for book_id in book_ids:
+        book = Book.query.get(book_id)
+        # La clave solo necesita los metadatos de los capítulos (sin columnas diferidas)
+        chapters = Chapter.query.filter_by(book_id=book_id).order_by(Chapter.chapter_number).all()
+        key = cache.cache_key(book, chapters, version)
+        
+        cached = None if force else cache.get(book.uuid, key, 'docx')
+        if cached:
+            yield book.uuid, cached, 'cached'
+        else:
+            tmp_path = cache.new_temp_path()
+            pending[pipeline.submit_book(ParsedBook.load(book), tmp_path, job)] = (book.uuid, key, tmp_path)
+        
+        # Liberar los objetos del libro ya enviado
+        db.session.expunge_all()
+        
+        if len(pending) >= window:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from _finish_exports(cache, pipeline, pending, done)
+    
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        yield from _finish_exports(cache, pipeline, pending, done)
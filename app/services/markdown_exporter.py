@@ -0,0 +1,62 @@
+import tempfile
+from app.services.parsed_book import ParsedBook, heading_text
+
+# Tamaño a partir del cual el archivo generado pasa de memoria a disco
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+def iter_book_markdown(parsed_book):
+    """
+    Genera el Markdown del libro (ParsedBook) bloque a bloque.
+    Cada capítulo lleva un ancla explícita para que los enlaces del índice
+    funcionen con cualquier visor.
+    
+    Yields:
+        str: Fragmentos del documento
+    """
+    yield f"# {parsed_book.title}\n\n"
+    
+    yield "## Tabla de Contenidos\n\n"
+    for chapter in parsed_book.chapters:
+        yield f"- [{chapter.full_title}](#chapter-{chapter.number})\n"
+        # Limitar a 5 subtítulos por capítulo, igual que el índice del DOCX
+        for heading in chapter.headings[:5]:
+            yield f"  - {heading_text(heading)}\n"
+    yield "\n"
+    
+    for chapter in parsed_book.chapters:
+        parts = [f'<a id="chapter-{chapter.number}"></a>\n\n## {chapter.full_title}\n']
+        for block_type, text in chapter.blocks:
+            if block_type == 'heading':
+                parts.append(f"### {heading_text(text)}\n")
+            else:
+                parts.append(f"{text}\n")
+        yield '\n'.join(parts) + '\n'
+
+class MarkdownExporter:
+    """Exportador a Markdown, para las herramientas que procesan los manuscritos"""
+    
+    # Incrementar cuando cambie el documento generado para invalidar la caché de exportación
+    EXPORTER_VERSION = 1
+    
+    def __init__(self, book):
+        """
+        Inicializa el exportador con un libro específico
+        
+        Args:
+            book: Instancia del modelo Book a exportar
+        """
+        self.book = book
+        self.parsed_book = ParsedBook.load(book)
+    
+    def generate_markdown(self):
+        """
+        Genera el documento Markdown para el libro.
+        
+        Returns:
+            SpooledTemporaryFile: Contenido en UTF-8, posicionado al inicio
+        """
+        output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        for fragment in iter_book_markdown(self.parsed_book):
+            output.write(fragment.encode('utf-8'))
+        output.seek(0)
+        return output
@@ -0,0 +1,157 @@
+import os
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from flask import current_app
+from app.services.event_broker import event_broker
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class LocalPageCache:
+    """Caché LRU en memoria del proceso, acotada por el tamaño total de las páginas"""
+    
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = value
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+    
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                self._size -= len(self._entries.pop(key))
+
+class FilesystemPageCache:
+    """
+    Backend compartido entre los procesos de la máquina, sobre un directorio.
+    Sustituye a un servidor de caché (Redis, memcached) con la misma interfaz.
+    """
+    
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+    
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.html")
+    
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as cached:
+                return cached.read()
+        except FileNotFoundError:
+            return None
+    
+    def set(self, key, value):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as tmp_file:
+                tmp_file.write(value)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    
+    def delete_prefix(self, prefix):
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and name.endswith('.html'):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+class PageCache:
+    """
+    Caché de páginas renderizadas en dos niveles: LRU del proceso y, opcionalmente,
+    un backend compartido.
+    
+    Las claves incluyen la versión del libro (o la huella del catálogo), así que una
+    entrada nunca queda obsoleta; al cambiar el estado o los capítulos de un libro se
+    eliminan además sus entradas y las del índice para liberar espacio.
+    """
+    
+    def __init__(self, local, shared=None):
+        self.local = local
+        self.shared = shared
+    
+    @staticmethod
+    def book_page_key(book_id, version):
+        return f"book-page-{book_id}-{version}"
+    
+    @staticmethod
+    def index_key(fingerprint):
+        return "index-" + '-'.join(str(part) for part in fingerprint)
+    
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value)
+        return value
+    
+    def set(self, key, value):
+        self.local.set(key, value)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value)
+            except OSError as e:
+                logger.error(f"No se pudo guardar la página {key} en la caché compartida: {str(e)}")
+    
+    def get_or_render(self, key, render):
+        """Devuelve la página en caché o la renderiza con `render()` y la guarda"""
+        value = self.get(key)
+        if value is None:
+            value = render()
+            self.set(key, value)
+        return value
+    
+    def invalidate(self, prefix):
+        self.local.delete_prefix(prefix)
+        if self.shared is not None:
+            self.shared.delete_prefix(prefix)
+    
+    def invalidate_book(self, book_id, event_type=None, data=None):
+        """Elimina la página del libro y el índice (listener del bus de eventos)"""
+        self.invalidate(f"book-page-{book_id}-")
+        self.invalidate("index-")
+
+def get_page_cache():
+    """Devuelve la caché de páginas de la aplicación actual (None si está desactivada)"""
+    if not current_app.config['PAGE_CACHE_ENABLED']:
+        return None
+    cache = current_app.extensions.get('page_cache')
+    if cache is None:
+        shared_dir = current_app.config['PAGE_CACHE_DIR']
+        cache = PageCache(
+            LocalPageCache(current_app.config['PAGE_CACHE_MAX_BYTES']),
+            FilesystemPageCache(shared_dir) if shared_dir else None
+        )
+        # Invalidación dirigida cuando se confirma un cambio de estado o de capítulos
+        event_broker.add_listener(cache.invalidate_book)
+        current_app.extensions['page_cache'] = cache
+    return cache
@@ -0,0 +1,79 @@
+from app import db
+from app.models.book import Chapter
+from app.services.chapter_renderer import chapter_renderer, clean_text
+
+def heading_text(text):
+    """Quita las marcas '#' que el modelo a veces deja en los encabezados"""
+    return text.lstrip('#').strip() or text
+
+class ParsedChapter:
+    """Capítulo ya analizado: título y bloques (tipo, texto) listos para cualquier formato"""
+    
+    __slots__ = ('number', 'title', 'blocks', 'headings')
+    
+    def __init__(self, number, title, blocks, headings):
+        self.number = number
+        self.title = title
+        self.blocks = blocks
+        self.headings = headings
+    
+    @property
+    def full_title(self):
+        return f"Capítulo {self.number}: {self.title}"
+    
+    @property
+    def outline(self):
+        """Encabezados del cuerpo del capítulo, en orden"""
+        return [text for block_type, text in self.blocks if block_type == 'heading']
+
+class ParsedBook:
+    """
+    Representación de un libro común a todos los exportadores.
+    
+    Los bloques y los encabezados de cada capítulo salen de su forma prerenderizada
+    (ver ChapterRenderer), que se calcula al guardar el capítulo: construirla no
+    recorre el texto salvo en capítulos aún no prerenderizados con la versión actual.
+    Cada exportador la carga por su cuenta con load. Solo contiene datos simples,
+    ya limpios de caracteres de control, y puede enviarse a otros procesos.
+    """
+    
+    __slots__ = ('uuid', 'title', 'market_niche', 'purpose', 'chapters')
+    
+    def __init__(self, uuid, title, market_niche, purpose, chapters):
+        self.uuid = uuid
+        self.title = title
+        self.market_niche = market_niche
+        self.purpose = purpose
+        self.chapters = chapters
+    
+    @classmethod
+    def from_models(cls, book, chapters):
+        """
+        Args:
+            book: Instancia del modelo Book
+            chapters: Capítulos del libro ordenados por número, con los bloques y la estructura cargados
+        """
+        parsed_chapters = []
+        for chapter in chapters:
+            parsed_chapters.append(ParsedChapter(
+                chapter.chapter_number,
+                clean_text(chapter.title),
+                chapter_renderer.get_blocks(chapter),
+                chapter_renderer.get_structure(chapter)['headings']
+            ))
+        return cls(book.uuid, clean_text(book.title), clean_text(book.market_niche), clean_text(book.purpose), parsed_chapters)
+    
+    @classmethod
+    def load(cls, book):
+        """Carga los capítulos del libro con sus bloques y su estructura (sin el contenido ni el HTML)"""
+        chapters = Chapter.query.options(db.undefer(Chapter.blocks_data), db.undefer(Chapter.structure)).filter_by(
+            book_id=book.id
+        ).order_by(Chapter.chapter_number).all()
+        return cls.from_models(book, chapters)
+    
+    @property
+    def description(self):
+        """Propósito del libro limitado a 255 caracteres para los metadatos"""
+        if self.purpose and len(self.purpose) > 250:
+            return self.purpose[:250] + "..."
+        return self.purpose
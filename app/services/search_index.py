@@ -0,0 +1,423 @@
+import re
+import math
+import logging
+import sqlite3
+from collections import namedtuple
+from markupsafe import escape
+from sqlalchemy import event, text, inspect as db_inspect
+from sqlalchemy.engine import Engine
+from app import db
+from app.models.book import Chapter, decompress_text
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Marcadores del texto resaltado: caracteres de uso privado que no aparecen en los capítulos,
+# para poder escapar el fragmento antes de sustituirlos por <mark>
+HIGHLIGHT_START = '\ue000'
+HIGHLIGHT_END = '\ue001'
+
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 50
+
+class SearchUnavailable(Exception):
+    """La base de datos actual no admite la búsqueda de texto completo"""
+
+def highlight_html(snippet):
+    """Escapa un fragmento devuelto por la base de datos y marca los términos encontrados"""
+    return str(escape(snippet or '')).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+
+SearchHit = namedtuple('SearchHit', 'rank snippet chapter_number chapter_title book_uuid book_title')
+
+class SearchIndex:
+    """
+    Índice de texto completo de los capítulos (tabla chapter_search).
+    
+    El índice no guarda una segunda copia del texto (el contenido de la tabla
+    chapters está comprimido): los fragmentos de los resultados se extraen del
+    contenido de los capítulos de la página pedida. Se actualiza en la misma
+    transacción en la que se guarda el capítulo. Cada subclase implementa el
+    índice de un motor concreto.
+    """
+    
+    SCHEMA = ()
+    DROP_SCHEMA = ()
+    
+    def create_schema(self, connection):
+        for statement in self.SCHEMA:
+            connection.execute(text(statement))
+    
+    def drop_schema(self, connection):
+        for statement in self.DROP_SCHEMA:
+            connection.execute(text(statement))
+    
+    def index_chapter(self, connection, chapter_id, book_id, title, body):
+        raise NotImplementedError
+    
+    def update_title(self, connection, chapter_id, title):
+        raise NotImplementedError
+    
+    def before_change(self, connection, chapter_id):
+        """Se llama antes de modificar o eliminar un capítulo, con sus datos anteriores aún en chapters"""
+    
+    def remove_chapter(self, connection, chapter_id):
+        raise NotImplementedError
+    
+    def rebuild(self, connection, book_id=None):
+        """
+        Vuelve a indexar todos los capítulos, o solo los de un libro.
+        
+        Returns:
+            int: Número de capítulos indexados
+        """
+        query = db.session.query(Chapter.id, Chapter.book_id, Chapter.title, Chapter.content_data)
+        if book_id is None:
+            connection.execute(text("DELETE FROM chapter_search"))
+        else:
+            self.remove_book(connection, book_id)
+            query = query.filter(Chapter.book_id == book_id)
+        
+        indexed = 0
+        for chapter_id, chapter_book_id, title, content_data in query.yield_per(200):
+            self.index_chapter(connection, chapter_id, chapter_book_id, title, decompress_text(content_data) or '')
+            indexed += 1
+        return indexed
+    
+    def remove_book(self, connection, book_id):
+        raise NotImplementedError
+    
+    def optimize(self, connection):
+        """Compacta el índice después de una reconstrucción completa"""
+    
+    def count(self, connection, query, book_id=None):
+        raise NotImplementedError
+    
+    def hits(self, connection, query, limit, offset, book_id=None):
+        raise NotImplementedError
+    
+    def search(self, connection, query, page=1, per_page=DEFAULT_PER_PAGE, book_id=None):
+        """
+        Busca en los capítulos indexados.
+        
+        Args:
+            connection: Conexión de SQLAlchemy
+            query: Texto buscado
+            page: Página de resultados (desde 1)
+            per_page: Resultados por página (como máximo MAX_PER_PAGE)
+            book_id: Limitar la búsqueda a un libro
+        
+        Returns:
+            dict: Total de resultados y la página pedida, ordenada por relevancia,
+            con un fragmento del capítulo en HTML con los términos marcados
+        """
+        page = max(1, page)
+        per_page = min(max(1, per_page), MAX_PER_PAGE)
+        total = self.count(connection, query, book_id)
+        results = []
+        if total and (page - 1) * per_page < total:
+            for row in self.hits(connection, query, per_page, (page - 1) * per_page, book_id):
+                results.append({
+                    'book_uuid': row.book_uuid,
+                    'book_title': row.book_title,
+                    'chapter_number': row.chapter_number,
+                    'chapter_title': row.chapter_title,
+                    'rank': float(row.rank),
+                    'snippet': highlight_html(row.snippet)
+                })
+        return {
+            'query': query,
+            'page': page,
+            'per_page': per_page,
+            'total': total,
+            'pages': math.ceil(total / per_page),
+            'results': results
+        }
+
+class PostgresSearchIndex(SearchIndex):
+    """
+    Índice sobre un tsvector con la configuración 'spanish' (raíces y palabras
+    vacías del español) y un índice GIN. El título pesa más que el texto. Solo se
+    guarda el tsvector: ts_headline recibe el texto descomprimido de los
+    capítulos de la página de resultados.
+    """
+    
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS chapter_search (
+            chapter_id INTEGER PRIMARY KEY REFERENCES chapters (id) ON DELETE CASCADE,
+            book_id INTEGER NOT NULL REFERENCES books (id) ON DELETE CASCADE,
+            search_vector TSVECTOR NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_chapter_search_vector ON chapter_search USING GIN (search_vector)",
+        "CREATE INDEX IF NOT EXISTS ix_chapter_search_book_id ON chapter_search (book_id)",
+    )
+    DROP_SCHEMA = ("DROP TABLE IF EXISTS chapter_search",)
+    
+    HEADLINE_OPTIONS = (
+        f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, '
+        'MinWords=15, MaxWords=35, MaxFragments=2, FragmentDelimiter=" … "'
+    )
+    
+    def index_chapter(self, connection, chapter_id, book_id, title, body):
+        connection.execute(text(
+            "INSERT INTO chapter_search (chapter_id, book_id, search_vector) "
+            "VALUES (:chapter_id, :book_id, "
+            "setweight(to_tsvector('spanish', :title), 'A') || setweight(to_tsvector('spanish', :body), 'B')) "
+            "ON CONFLICT (chapter_id) DO UPDATE SET "
+            "book_id = EXCLUDED.book_id, search_vector = EXCLUDED.search_vector"
+        ), {'chapter_id': chapter_id, 'book_id': book_id, 'title': title, 'body': body})
+    
+    def update_title(self, connection, chapter_id, title):
+        # El texto conserva su peso 'B': basta con sustituir los lexemas del título
+        connection.execute(text(
+            "UPDATE chapter_search SET search_vector = "
+            "setweight(to_tsvector('spanish', :title), 'A') || ts_filter(search_vector, '{b}') "
+            "WHERE chapter_id = :chapter_id"
+        ), {'chapter_id': chapter_id, 'title': title})
+    
+    def remove_chapter(self, connection, chapter_id):
+        connection.execute(text("DELETE FROM chapter_search WHERE chapter_id = :chapter_id"),
+                           {'chapter_id': chapter_id})
+    
+    def remove_book(self, connection, book_id):
+        connection.execute(text("DELETE FROM chapter_search WHERE book_id = :book_id"), {'book_id': book_id})
+    
+    def optimize(self, connection):
+        connection.execute(text("ANALYZE chapter_search"))
+    
+    def count(self, connection, query, book_id=None):
+        return connection.execute(text(
+            "SELECT count(*) FROM chapter_search "
+            "WHERE search_vector @@ websearch_to_tsquery('spanish', :query) "
+            "AND (CAST(:book_id AS INTEGER) IS NULL OR book_id = :book_id)"
+        ), {'query': query, 'book_id': book_id}).scalar()
+    
+    def hits(self, connection, query, limit, offset, book_id=None):
+        rows = connection.execute(text(
+            "WITH q AS (SELECT websearch_to_tsquery('spanish', :query) AS query), "
+            "page AS ("
+            "  SELECT s.chapter_id, ts_rank_cd(s.search_vector, q.query) AS rank "
+            "  FROM chapter_search s, q "
+            "  WHERE s.search_vector @@ q.query "
+            "  AND (CAST(:book_id AS INTEGER) IS NULL OR s.book_id = :book_id) "
+            "  ORDER BY rank DESC, s.chapter_id LIMIT :limit OFFSET :offset"
+            ") "
+            "SELECT page.rank, c.content_data, "
+            "c.chapter_number, c.title AS chapter_title, b.uuid AS book_uuid, b.title AS book_title "
+            "FROM page "
+            "JOIN chapters c ON c.id = page.chapter_id "
+            "JOIN books b ON b.id = c.book_id "
+            "ORDER BY page.rank DESC, page.chapter_id"
+        ), {'query': query, 'book_id': book_id, 'limit': limit, 'offset': offset}).all()
+        if not rows:
+            return []
+        
+        # ts_headline vuelve a analizar el texto: se calcula solo para la página pedida
+        snippets = connection.execute(text(
+            "SELECT ts_headline('spanish', t.body, websearch_to_tsquery('spanish', :query), :options) "
+            "FROM unnest(CAST(:bodies AS TEXT[])) WITH ORDINALITY AS t (body, position) "
+            "ORDER BY t.position"
+        ), {
+            'query': query, 'options': self.HEADLINE_OPTIONS,
+            'bodies': [decompress_text(row.content_data) or '' for row in rows]
+        }).scalars().all()
+        return [
+            SearchHit(row.rank, snippet, row.chapter_number, row.chapter_title, row.book_uuid, row.book_title)
+            for row, snippet in zip(rows, snippets)
+        ]
+
+class SqliteSearchIndex(SearchIndex):
+    """
+    Índice FTS5 para desarrollo local. El rowid es el id del capítulo. El tokenizador
+    unicode61 ignora mayúsculas y tildes, pero no reduce las palabras a su raíz.
+    
+    Es un índice de contenido externo sobre la vista chapter_search_source, que
+    descomprime el texto de chapters con la función chapter_text (registrada en
+    cada conexión): FTS5 solo guarda el índice y lee el texto de la vista para los
+    fragmentos. Por eso las entradas se eliminan con el comando 'delete' antes de
+    modificar o eliminar el capítulo, con los mismos valores que se indexaron.
+    """
+    
+    SCHEMA = (
+        "CREATE VIEW IF NOT EXISTS chapter_search_source AS "
+        "SELECT id, title, chapter_text(content_data) AS body FROM chapters",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS chapter_search USING fts5("
+        "title, body, content = 'chapter_search_source', content_rowid = 'id', "
+        "tokenize = 'unicode61 remove_diacritics 2')",
+    )
+    DROP_SCHEMA = (
+        "DROP TABLE IF EXISTS chapter_search",
+        "DROP VIEW IF EXISTS chapter_search_source",
+    )
+    
+    # Pesos de bm25 para (title, body); bm25 devuelve valores menores cuanto más relevante
+    RANK = "bm25(chapter_search, 5.0, 1.0)"
+    
+    # Filtro opcional por libro (el índice no guarda el libro de cada capítulo)
+    BOOK_FILTER = "(:book_id IS NULL OR rowid IN (SELECT id FROM chapters WHERE book_id = :book_id))"
+    
+    @staticmethod
+    def match_expression(query):
+        """
+        Convierte el texto buscado en una expresión MATCH segura: cada palabra se
+        busca como término literal y todas deben aparecer en el capítulo.
+        """
+        return ' '.join(f'"{word}"' for word in re.findall(r'\w+', query))
+    
+    def index_chapter(self, connection, chapter_id, book_id, title, body):
+        connection.execute(text(
+            "INSERT INTO chapter_search (rowid, title, body) VALUES (:chapter_id, :title, :body)"
+        ), {'chapter_id': chapter_id, 'title': title, 'body': body})
+    
+    def update_title(self, connection, chapter_id, title):
+        # La entrada anterior ya se eliminó en before_change
+        connection.execute(text(
+            "INSERT INTO chapter_search (rowid, title, body) "
+            "SELECT id, title, body FROM chapter_search_source WHERE id = :chapter_id"
+        ), {'chapter_id': chapter_id})
+    
+    def before_change(self, connection, chapter_id):
+        self.remove_chapter(connection, chapter_id)
+    
+    def remove_chapter(self, connection, chapter_id):
+        # Debe ejecutarse mientras chapters conserva los valores indexados
+        connection.execute(text(
+            "INSERT INTO chapter_search (chapter_search, rowid, title, body) "
+            "SELECT 'delete', id, title, body FROM chapter_search_source WHERE id = :chapter_id"
+        ), {'chapter_id': chapter_id})
+    
+    def rebuild(self, connection, book_id=None):
+        # Con contenido externo se reconstruye siempre todo el índice a partir de la vista
+        connection.execute(text("INSERT INTO chapter_search (chapter_search) VALUES ('rebuild')"))
+        query = db.session.query(db.func.count(Chapter.id))
+        if book_id is not None:
+            query = query.filter(Chapter.book_id == book_id)
+        return query.scalar()
+    
+    def optimize(self, connection):
+        connection.execute(text("INSERT INTO chapter_search (chapter_search) VALUES ('optimize')"))
+    
+    def count(self, connection, query, book_id=None):
+        expression = self.match_expression(query)
+        if not expression:
+            return 0
+        return connection.execute(text(
+            f"SELECT count(*) FROM chapter_search WHERE chapter_search MATCH :query AND {self.BOOK_FILTER}"
+        ), {'query': expression, 'book_id': book_id}).scalar()
+    
+    def hits(self, connection, query, limit, offset, book_id=None):
+        # SQLite evalúa las columnas de todas las filas ordenadas, también las que salta el OFFSET:
+        # primero se elige la página por relevancia y después se extraen los fragmentos solo de ella
+        return connection.execute(text(
+            "WITH page AS ("
+            f"  SELECT rowid AS chapter_id, {self.RANK} AS score FROM chapter_search "
+            f"  WHERE chapter_search MATCH :query AND {self.BOOK_FILTER} "
+            "  ORDER BY score, rowid LIMIT :limit OFFSET :offset"
+            ") "
+            "SELECT -page.score AS rank, "
+            "snippet(chapter_search, 1, :start, :end, ' … ', 32) AS snippet, "
+            "c.chapter_number, c.title AS chapter_title, b.uuid AS book_uuid, b.title AS book_title "
+            "FROM chapter_search "
+            "JOIN page ON page.chapter_id = chapter_search.rowid "
+            "JOIN chapters c ON c.id = page.chapter_id "
+            "JOIN books b ON b.id = c.book_id "
+            "WHERE chapter_search MATCH :query "
+            "ORDER BY page.score, page.chapter_id"
+        ), {
+            'query': self.match_expression(query), 'book_id': book_id, 'limit': limit, 'offset': offset,
+            'start': HIGHLIGHT_START, 'end': HIGHLIGHT_END
+        })
+
+SEARCH_INDEXES = {
+    'postgresql': PostgresSearchIndex(),
+    'sqlite': SqliteSearchIndex(),
+}
+
+def get_search_index(connection):
+    """Devuelve el índice del motor de la conexión, o None si no tiene búsqueda de texto completo"""
+    return SEARCH_INDEXES.get(connection.dialect.name)
+
+def search_chapters(query, page=1, per_page=DEFAULT_PER_PAGE, book_id=None):
+    """Busca en los capítulos con el índice de la base de datos de la aplicación (ver SearchIndex.search)"""
+    # Solo lectura: puede usar la réplica (ver app/replica.py)
+    connection = db.session.connection(bind_arguments={'read_only': True})
+    index = get_search_index(connection)
+    if index is None:
+        raise SearchUnavailable(f"La búsqueda no está disponible con {connection.dialect.name}")
+    return index.search(connection, query, page=page, per_page=per_page, book_id=book_id)
+
+def rebuild_search_index(book_id=None):
+    """
+    Reconstruye el índice de todos los capítulos, o solo los de un libro, en una transacción.
+    
+    Returns:
+        int: Número de capítulos indexados
+    """
+    connection = db.session.connection()
+    index = get_search_index(connection)
+    if index is None:
+        raise SearchUnavailable(f"La búsqueda no está disponible con {connection.dialect.name}")
+    
+    index.create_schema(connection)
+    indexed = index.rebuild(connection, book_id)
+    if book_id is None:
+        index.optimize(connection)
+    db.session.commit()
+    return indexed
+
+# El índice se crea junto con la tabla de capítulos (db.create_all) y se mantiene
+# en la misma transacción en la que se guardan o eliminan los capítulos
+
+@event.listens_for(Chapter.__table__, 'after_create')
+def _create_search_schema(target, connection, **kw):
+    index = get_search_index(connection)
+    if index is not None:
+        index.create_schema(connection)
+
+@event.listens_for(Chapter.__table__, 'before_drop')
+def _drop_search_schema(target, connection, **kw):
+    index = get_search_index(connection)
+    if index is not None:
+        index.drop_schema(connection)
+
+@event.listens_for(Engine, 'connect')
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    """Función chapter_text de la vista chapter_search_source en todas las conexiones SQLite"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('chapter_text', 1, decompress_text, deterministic=True)
+
+@event.listens_for(Chapter, 'after_insert')
+def _index_inserted_chapter(mapper, connection, target):
+    index = get_search_index(connection)
+    if index is not None:
+        index.index_chapter(connection, target.id, target.book_id, target.title, target.content or '')
+
+def _indexed_fields_changed(target):
+    state = db_inspect(target)
+    return any(state.attrs[name].history.has_changes() for name in ('content_data', 'book_id', 'title'))
+
+@event.listens_for(Chapter, 'before_update')
+def _before_chapter_update(mapper, connection, target):
+    index = get_search_index(connection)
+    if index is not None and _indexed_fields_changed(target):
+        index.before_change(connection, target.id)
+
+@event.listens_for(Chapter, 'after_update')
+def _index_updated_chapter(mapper, connection, target):
+    index = get_search_index(connection)
+    if index is None:
+        return
+    state = db_inspect(target)
+    if state.attrs.content_data.history.has_changes() or state.attrs.book_id.history.has_changes():
+        index.index_chapter(connection, target.id, target.book_id, target.title, target.content or '')
+    elif state.attrs.title.history.has_changes():
+        index.update_title(connection, target.id, target.title)
+
+@event.listens_for(Chapter, 'before_delete')
+def _remove_deleted_chapter(mapper, connection, target):
+    # Antes de eliminar la fila: el índice de SQLite necesita los valores indexados
+    index = get_search_index(connection)
+    if index is not None:
+        index.remove_chapter(connection, target.id)
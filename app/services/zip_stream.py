@@ -0,0 +1,175 @@
+import struct
+import time
+import zlib
+
+# Bloque final vacío de un flujo deflate: cierra una secuencia de fragmentos concatenados
+DEFLATE_END = zlib.compressobj(6, zlib.DEFLATED, -15).flush()
+
+# Límite de los campos de 32 bits del formato ZIP; por encima se usan los registros ZIP64
+ZIP_MAX_SIZE = 0xFFFFFFFF
+ZIP_MAX_ENTRIES = 0xFFFF
+# Valores que indican que el dato real está en el registro ZIP64
+ZIP64_SIZE_MARKER = 0xFFFFFFFF
+ZIP64_COUNT_MARKER = 0xFFFF
+
+def deflate_chunk(data, level=6):
+    """
+    Comprime `data` como un fragmento deflate independiente y alineado a byte
+    (Z_SYNC_FLUSH), de modo que varios fragmentos comprimidos por separado, incluso
+    en procesos distintos, se pueden concatenar en un único flujo deflate.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+def _dos_datetime(timestamp):
+    t = time.localtime(timestamp)
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+class ZipStreamWriter:
+    """
+    Escritor ZIP secuencial: no necesita hacer seek sobre el destino y escribe
+    cada entrada a medida que se producen sus datos (tamaños y CRC van en un
+    descriptor de datos tras el contenido, salvo en las entradas de write_bytes).
+    
+    A diferencia de zipfile, admite entradas cuyo contenido ya llega comprimido
+    en fragmentos deflate (ver deflate_chunk). El archivo completo puede superar
+    4 GB (desplazamientos ZIP64), aunque cada entrada debe quedar por debajo.
+    """
+    
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.offset = 0
+        self.entries = []
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+    
+    def _write(self, data):
+        self.fileobj.write(data)
+        self.offset += len(data)
+    
+    def _iter_entry(self, name, method, chunks):
+        """
+        Escribe una entrada a partir de pares (datos sin comprimir, datos a escribir),
+        cediendo el control tras escribir cada bloque.
+        """
+        encoded_name = name.encode('utf-8')
+        dos_time, dos_date = _dos_datetime(time.time())
+        header_offset = self.offset
+        # Bit 3: CRC y tamaños en el descriptor de datos; bit 11: nombre en UTF-8
+        flags = 0x08 | 0x800
+        self._write(struct.pack(
+            '<IHHHHHIIIHH', 0x04034b50, 20, flags, method, dos_time, dos_date,
+            0, 0, 0, len(encoded_name), 0
+        ) + encoded_name)
+        
+        crc = 0
+        size = 0
+        compressed_size = 0
+        for raw, data in chunks:
+            crc = zlib.crc32(raw, crc)
+            size += len(raw)
+            compressed_size += len(data)
+            self._write(data)
+            yield
+        
+        if size > ZIP_MAX_SIZE or compressed_size > ZIP_MAX_SIZE:
+            raise ValueError(f"La entrada {name} supera 4 GB")
+        
+        self._write(struct.pack('<IIII', 0x08074b50, crc, compressed_size, size))
+        self.entries.append((encoded_name, flags, method, dos_time, dos_date, crc, compressed_size, size, header_offset))
+        yield
+    
+    def _write_entry(self, name, method, chunks):
+        for _ in self._iter_entry(name, method, chunks):
+            pass
+    
+    def write_deflated(self, name, chunks):
+        """
+        Añade una entrada comprimida a partir de pares (datos, deflate_chunk(datos)).
+        
+        Args:
+            name: Ruta de la entrada dentro del ZIP
+            chunks: Iterable de tuplas (bytes sin comprimir, fragmento deflate)
+        """
+        def with_end():
+            yield from chunks
+            yield b'', DEFLATE_END
+        self._write_entry(name, 8, with_end())
+    
+    def write_stored(self, name, chunks):
+        """Añade una entrada sin comprimir a partir de un iterable de bloques de bytes"""
+        self._write_entry(name, 0, ((chunk, chunk) for chunk in chunks))
+    
+    def iter_stored(self, name, chunks):
+        """
+        Como write_stored, pero es un generador que cede el control tras escribir cada
+        bloque, para vaciar el destino a medida que se produce (p. ej. en una respuesta HTTP).
+        """
+        return self._iter_entry(name, 0, ((chunk, chunk) for chunk in chunks))
+    
+    def write_bytes(self, name, data, compress=True):
+        """
+        Añade una entrada con todo su contenido en memoria. Como los datos ya se
+        conocen, el CRC y los tamaños van en la cabecera local (sin descriptor de
+        datos), que es lo que exigen algunos lectores para ciertas entradas, p. ej.
+        el 'mimetype' de un EPUB: primera entrada, sin comprimir y sin campo extra.
+        """
+        payload = deflate_chunk(data) + DEFLATE_END if compress else data
+        if len(data) > ZIP_MAX_SIZE or len(payload) > ZIP_MAX_SIZE:
+            raise ValueError(f"La entrada {name} supera 4 GB")
+        
+        encoded_name = name.encode('utf-8')
+        dos_time, dos_date = _dos_datetime(time.time())
+        header_offset = self.offset
+        method = 8 if compress else 0
+        # Bit 11 (nombre en UTF-8) solo si hace falta: la cabecera queda como la de zipfile
+        flags = 0 if encoded_name.isascii() else 0x800
+        crc = zlib.crc32(data)
+        self._write(struct.pack(
+            '<IHHHHHIIIHH', 0x04034b50, 20, flags, method, dos_time, dos_date,
+            crc, len(payload), len(data), len(encoded_name), 0
+        ) + encoded_name)
+        self._write(payload)
+        self.entries.append((encoded_name, flags, method, dos_time, dos_date, crc, len(payload), len(data), header_offset))
+    
+    def close(self):
+        """Escribe el directorio central y el registro de fin de archivo"""
+        directory_offset = self.offset
+        for encoded_name, flags, method, dos_time, dos_date, crc, compressed_size, size, header_offset in self.entries:
+            version = 20
+            extra = b''
+            if header_offset > ZIP_MAX_SIZE:
+                # Campo extra ZIP64 con el desplazamiento real de la cabecera local
+                version = 45
+                extra = struct.pack('<HHQ', 0x0001, 8, header_offset)
+                header_offset = ZIP64_SIZE_MARKER
+            self._write(struct.pack(
+                '<IHHHHHHIIIHHHHHII', 0x02014b50, version, version, flags, method, dos_time, dos_date,
+                crc, compressed_size, size, len(encoded_name), len(extra), 0, 0, 0, 0, header_offset
+            ) + encoded_name + extra)
+        directory_size = self.offset - directory_offset
+        count = len(self.entries)
+        
+        zip64 = directory_offset > ZIP_MAX_SIZE or directory_size > ZIP_MAX_SIZE or count >= ZIP_MAX_ENTRIES
+        if zip64:
+            zip64_offset = self.offset
+            self._write(struct.pack(
+                '<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0, count, count, directory_size, directory_offset
+            ))
+            self._write(struct.pack('<IIQI', 0x07064b50, 0, zip64_offset, 1))
+        
+        self._write(struct.pack(
+            '<IHHHHIIH', 0x06054b50, 0, 0,
+            ZIP64_COUNT_MARKER if zip64 else count,
+            ZIP64_COUNT_MARKER if zip64 else count,
+            ZIP64_SIZE_MARKER if zip64 else directory_size,
+            ZIP64_SIZE_MARKER if zip64 else directory_offset,
+            0
+        ))
@@ -0,0 +1,212 @@
+"""
+Trazas de la generación de libros.
+
+Cada petición de generación abre una traza; las operaciones que cuelgan de ella
+(hilo de trabajo, tabla de contenidos, capítulos, llamadas a Claude, reintentos y
+esperas) se registran como tramos anidados en la tabla generation_events.
+
+El tramo actual se guarda en una variable de contexto, de modo que se propaga por
+las llamadas sin pasar argumentos y, con `bind_context`, a los hilos de trabajo.
+Fuera de una traza `span()` no registra nada.
+"""
+import time
+import logging
+import secrets
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from app import db
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_current_span = contextvars.ContextVar('libros_current_span', default=None)
+
+class Span:
+    """Tramo de una traza: operación con nombre, inicio, duración, estado y atributos"""
+    
+    def __init__(self, book_id, trace_id, name, parent_id=None, attributes=None):
+        self.book_id = book_id
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.status = 'ok'
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self.duration_ms = None
+    
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+    
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+    
+    def set_error(self, message):
+        self.status = 'error'
+        self.attributes['error'] = str(message)[:500]
+    
+    def finish(self):
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+        _persist(self)
+
+class _NullSpan:
+    """Tramo vacío que se devuelve fuera de una traza"""
+    
+    def set_attribute(self, key, value):
+        pass
+    
+    def set_attributes(self, **attributes):
+        pass
+    
+    def set_error(self, message):
+        pass
+
+NULL_SPAN = _NullSpan()
+
+def _persist(span):
+    """Guarda el tramo terminado en su propia transacción, sin tocar la sesión del llamador"""
+    from app.models.book import GenerationEvent
+    
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(GenerationEvent.__table__.insert().values(
+                book_id=span.book_id,
+                trace_id=span.trace_id,
+                span_id=span.span_id,
+                parent_id=span.parent_id,
+                name=span.name,
+                started_at=span.started_at,
+                duration_ms=span.duration_ms,
+                status=span.status,
+                attributes=span.attributes
+            ))
+    except Exception as e:
+        # La traza nunca debe interrumpir la generación
+        logger.error(f"No se pudo guardar el tramo {span.name} de la traza {span.trace_id}: {str(e)}")
+
+@contextmanager
+def _activate(span):
+    token = _current_span.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.set_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.finish()
+
+def start_trace(book_id, name, **attributes):
+    """
+    Abre una traza nueva para un libro con un tramo raíz.
+    
+    Uso:
+        with tracing.start_trace(book.id, 'http.generate'):
+            ...
+    """
+    return _activate(Span(book_id, secrets.token_hex(16), name, attributes=attributes))
+
+@contextmanager
+def span(name, **attributes):
+    """Registra un tramo hijo del tramo actual (no hace nada fuera de una traza)"""
+    parent = _current_span.get()
+    if parent is None:
+        yield NULL_SPAN
+        return
+    with _activate(Span(parent.book_id, parent.trace_id, name, parent.span_id, attributes)) as child:
+        yield child
+
+def current_span():
+    """Devuelve el tramo actual (o uno vacío fuera de una traza)"""
+    return _current_span.get() or NULL_SPAN
+
+def annotate(**attributes):
+    """Añade atributos al tramo actual"""
+    current_span().set_attributes(**attributes)
+
+def bind_context(function):
+    """
+    Envuelve `function` para que se ejecute con el contexto actual (y por tanto
+    dentro de la traza actual) aunque se llame desde otro hilo.
+    """
+    context = contextvars.copy_context()
+    
+    def run(*args, **kwargs):
+        return context.run(function, *args, **kwargs)
+    return run
+
+def load_timeline(book_id):
+    """
+    Reconstruye las trazas de un libro para la vista en cascada.
+    
+    Los tramos de una generación en curso se guardan al terminar, de modo que los
+    que aún no tienen padre guardado se muestran colgando de la raíz de su traza.
+    
+    Returns:
+        dict: 'traces' (tramos ordenados con desplazamiento, profundidad y tiempo
+        propio) y 'summary' (tiempo total y propio por tipo de tramo, de mayor a menor)
+    """
+    from app.models.book import GenerationEvent
+    
+    events = GenerationEvent.query.filter_by(book_id=book_id).order_by(
+        GenerationEvent.started_at, GenerationEvent.id
+    ).all()
+    
+    by_trace = {}
+    for event in events:
+        by_trace.setdefault(event.trace_id, []).append(event)
+    
+    traces = []
+    summary = {}
+    for trace_id, trace_events in by_trace.items():
+        ids = {event.span_id for event in trace_events}
+        children_ms = {}
+        for event in trace_events:
+            if event.parent_id:
+                children_ms[event.parent_id] = children_ms.get(event.parent_id, 0) + event.duration_ms
+        
+        trace_start = trace_events[0].started_at
+        depths = {}
+        spans = []
+        trace_end_ms = 0
+        for event in trace_events:
+            if event.parent_id is None:
+                depth = 0
+            else:
+                depth = depths.get(event.parent_id, 0 if event.parent_id not in ids else None)
+                depth = 1 if depth is None else depth + 1
+            depths[event.span_id] = depth
+            
+            offset_ms = (event.started_at - trace_start).total_seconds() * 1000
+            trace_end_ms = max(trace_end_ms, offset_ms + event.duration_ms)
+            self_ms = max(0.0, event.duration_ms - children_ms.get(event.span_id, 0))
+            span = event.to_dict()
+            span.update(offset_ms=round(offset_ms, 1), depth=depth, self_ms=round(self_ms, 1))
+            spans.append(span)
+            
+            totals = summary.setdefault(event.name, {'name': event.name, 'count': 0, 'total_ms': 0.0, 'self_ms': 0.0, 'errors': 0})
+            totals['count'] += 1
+            totals['total_ms'] += event.duration_ms
+            totals['self_ms'] += self_ms
+            totals['errors'] += event.status != 'ok'
+        
+        root = next((span for span in spans if span['parent_id'] is None), spans[0])
+        traces.append({
+            'trace_id': trace_id,
+            'name': root['name'],
+            'started_at': spans[0]['started_at'],
+            'duration_ms': round(trace_end_ms, 1),
+            'spans': spans
+        })
+    
+    for totals in summary.values():
+        totals['total_ms'] = round(totals['total_ms'], 1)
+        totals['self_ms'] = round(totals['self_ms'], 1)
+    
+    return {
+        'traces': traces,
+        'summary': sorted(summary.values(), key=lambda totals: totals['self_ms'], reverse=True)
+    }
@@ -0,0 +1 @@
+# Scripts de rendimiento; ejecutar desde la raíz del repositorio con `python -m benchmarks.<script>`
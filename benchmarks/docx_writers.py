@@ -0,0 +1,90 @@
+"""
+Benchmark de los exportadores DOCX (python-docx frente a escritura en streaming).
+
+Cada exportación se ejecuta en un proceso hijo para que el pico de memoria residente
+(ru_maxrss) de un exportador no contamine la medida del otro.
+
+Uso:
+    python -m benchmarks.docx_writers [--chapters 10 100] [--words 3000] [--repetitions 3]
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from app.models.book import Book
+from benchmarks.fixtures import create_bench_app, create_synthetic_book, temporary_database_url
+
+WRITERS = ['python-docx', 'streaming']
+
+def max_rss_mb():
+    """Pico de memoria residente del proceso actual en MB (ru_maxrss está en KB en Linux)"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+def run_child(database_url, writer, book_id):
+    """Exporta un libro con el exportador indicado e imprime las medidas en JSON"""
+    from app.services.export_cache import load_docx_writer
+    
+    app = create_bench_app(database_url)
+    with app.app_context():
+        book = Book.query.get(book_id)
+        exporter_class = load_docx_writer(writer)
+        # Cargar plantillas e imports antes de medir
+        exporter_class(book)
+        baseline = max_rss_mb()
+        
+        start = time.perf_counter()
+        output = exporter_class(book).generate_docx()
+        output.seek(0, 2)
+        size = output.tell()
+        elapsed = time.perf_counter() - start
+    
+    print(json.dumps({
+        'seconds': elapsed,
+        'size': size,
+        'baseline_rss_mb': baseline,
+        'peak_rss_mb': max_rss_mb()
+    }))
+
+def measure(database_url, writer, book_id):
+    result = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.docx_writers', '--child', database_url, writer, str(book_id)],
+        check=True, capture_output=True, text=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chapters', type=int, nargs='+', default=[10, 100], help="Tamaños de libro a medir")
+    parser.add_argument('--words', type=int, default=3000, help="Palabras por capítulo")
+    parser.add_argument('--repetitions', type=int, default=3, help="Exportaciones por combinación")
+    parser.add_argument('--child', nargs=3, metavar=('URL', 'WRITER', 'BOOK_ID'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        database_url, writer, book_id = args.child
+        run_child(database_url, writer, int(book_id))
+        return
+    
+    database_url = temporary_database_url('docx_writers.db')
+    app = create_bench_app(database_url)
+    with app.app_context():
+        books = {}
+        for chapter_count in args.chapters:
+            print(f"Creando libro de {chapter_count} capítulos de {args.words} palabras...")
+            books[chapter_count] = create_synthetic_book(chapter_count, args.words).id
+    
+    print(f"\n{'capítulos':>10} {'exportador':>12} {'tiempo (s)':>11} {'tamaño (KB)':>12} {'RSS pico (MB)':>14} {'RSS export (MB)':>16}")
+    for chapter_count, book_id in books.items():
+        for writer in WRITERS:
+            runs = [measure(database_url, writer, book_id) for _ in range(args.repetitions)]
+            best = min(runs, key=lambda run: run['seconds'])
+            peak = max(run['peak_rss_mb'] for run in runs)
+            delta = max(run['peak_rss_mb'] - run['baseline_rss_mb'] for run in runs)
+            print(f"{chapter_count:>10} {writer:>12} {best['seconds']:>11.3f} {best['size'] / 1024:>12.0f} {peak:>14.1f} {delta:>16.1f}")
+
+if __name__ == '__main__':
+    main()
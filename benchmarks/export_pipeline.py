@@ -0,0 +1,80 @@
+"""
+Benchmark del pipeline de exportación DOCX con y sin pool de procesos.
+
+Mide dos casos:
+- un libro grande, repartiendo sus capítulos entre los procesos;
+- el catálogo completo (export_all_books), repartiendo libros entre los procesos.
+
+Uso:
+    python -m benchmarks.export_pipeline [--books 60] [--chapters 12] [--large-chapters 200] [--workers 4]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from app.models.book import Book
+from app.services.docx_stream_writer import StreamingDocxExporter
+from app.services.export_pipeline import export_all_books
+from benchmarks.fixtures import create_bench_app, create_synthetic_book, temporary_database_url
+
+def configure(app, workers):
+    """Aplica el número de procesos y descarta el pipeline anterior"""
+    pipeline = app.extensions.pop('export_pipeline', None)
+    if pipeline:
+        pipeline.shutdown()
+    app.config['EXPORT_POOL_WORKERS'] = workers
+    app.config['EXPORT_POOL_MIN_CHAPTERS'] = 1
+
+def time_large_book(app, book_id, workers, repetitions):
+    configure(app, workers)
+    book = Book.query.get(book_id)
+    # Primera exportación fuera de la medida: arranque del pool y de la plantilla
+    StreamingDocxExporter(book).generate_docx()
+    timings = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        StreamingDocxExporter(book).generate_docx()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def time_catalogue(app, workers):
+    configure(app, workers)
+    cache_dir = tempfile.mkdtemp()
+    app.config['EXPORT_CACHE_DIR'] = cache_dir
+    app.extensions.pop('export_cache', None)
+    start = time.perf_counter()
+    results = [result for _, _, result in export_all_books(force=True)]
+    elapsed = time.perf_counter() - start
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    return elapsed, len(results)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=60, help="Libros del catálogo")
+    parser.add_argument('--chapters', type=int, default=12, help="Capítulos por libro del catálogo")
+    parser.add_argument('--large-chapters', type=int, default=200, help="Capítulos del libro grande")
+    parser.add_argument('--words', type=int, default=3000, help="Palabras por capítulo")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Procesos del pool")
+    parser.add_argument('--repetitions', type=int, default=3, help="Exportaciones del libro grande por configuración")
+    args = parser.parse_args()
+    
+    app = create_bench_app(temporary_database_url('export_pipeline.db'))
+    with app.app_context():
+        print(f"Creando {args.books} libros de {args.chapters} capítulos y uno de {args.large_chapters}...")
+        for number in range(args.books):
+            create_synthetic_book(args.chapters, args.words, title=f"Libro {number}", seed=number)
+        large_id = create_synthetic_book(args.large_chapters, args.words, title="Libro grande").id
+        
+        print(f"\n{'caso':<34} {'procesos':>8} {'tiempo (s)':>11}")
+        for workers in (0, args.workers):
+            elapsed = time_large_book(app, large_id, workers, args.repetitions)
+            print(f"{f'libro de {args.large_chapters} capítulos':<34} {workers:>8} {elapsed:>11.3f}")
+        for workers in (0, args.workers):
+            elapsed, count = time_catalogue(app, workers)
+            print(f"{f'catálogo ({count} libros)':<34} {workers:>8} {elapsed:>11.3f}")
+        configure(app, 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Datos sintéticos compartidos por los benchmarks.
+
+Genera libros con capítulos de tamaño realista (encabezados y párrafos en el mismo
+formato que devuelve Claude) sobre una base de datos desechable.
+"""
+import os
+import random
+import tempfile
+
+from app import create_app, db
+from app.config import Config
+from app.models.book import Book, Chapter
+
+WORDS = ("el la de que y en un una para con por los las del se su como más pero "
+         "libro capítulo lector idea práctica ejemplo estrategia mercado nicho proceso "
+         "resultado método objetivo tiempo paso clave valor cliente negocio hábito").split()
+
+def temporary_database_url(name='bench.db'):
+    """URL de una base de datos SQLite en un directorio temporal nuevo"""
+    return f"sqlite:///{os.path.join(tempfile.mkdtemp(), name)}"
+
+def create_bench_app(database_url):
+    """Crea la aplicación apuntando a `database_url` con el esquema ya creado"""
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+    
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+    return app
+
+def chapter_text(words_per_chapter=3000, sections=6, rng=None):
+    """Texto de un capítulo con `sections` subtítulos y párrafos de unas 120 palabras"""
+    rng = rng or random.Random(0)
+    parts = []
+    section_words = words_per_chapter // sections
+    for section in range(1, sections + 1):
+        parts.append(f"## Sección {section}: {rng.choice(WORDS).capitalize()} {rng.choice(WORDS)}")
+        remaining = section_words
+        while remaining > 0:
+            length = min(remaining, rng.randint(80, 160))
+            parts.append(' '.join(rng.choice(WORDS) for _ in range(length)).capitalize() + '.')
+            remaining -= length
+    return '\n\n'.join(parts)
+
+def create_synthetic_book(chapter_count, words_per_chapter=3000, title=None, seed=0):
+    """
+    Inserta un libro completado con `chapter_count` capítulos. Requiere un contexto de aplicación.
+    
+    Returns:
+        Book: Libro creado
+    """
+    rng = random.Random(seed)
+    book = Book(
+        title=title or f"Libro sintético de {chapter_count} capítulos",
+        market_niche="Productividad",
+        purpose="Libro generado para medir el rendimiento",
+        status='completed'
+    )
+    db.session.add(book)
+    db.session.commit()
+    
+    for number in range(1, chapter_count + 1):
+        db.session.add(Chapter(
+            book_id=book.id,
+            chapter_number=number,
+            title=f"Capítulo sintético {number}",
+            scope="Alcance sintético",
+            content=chapter_text(words_per_chapter, rng=rng)
+        ))
+        # Confirmar en lotes para no acumular todos los capítulos en la sesión
+        if number % 20 == 0:
+            db.session.commit()
+    db.session.commit()
+    return book
@@ -0,0 +1,190 @@
+"""
+Registro, ejecución y almacenamiento de los benchmarks de la suite.
+
+Cada benchmark es una función decorada con `@benchmark` que recibe la escala
+(diccionario con los tamaños de los datos), prepara sus datos y devuelve la función
+que se cronometra. Los resultados de cada ejecución se guardan en JSON por máquina,
+commit y escala, de modo que se pueden comparar dos commits cualesquiera.
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# Variación de la mediana a partir de la cual se marca una regresión o una mejora
+DEFAULT_THRESHOLD = 0.10
+
+BENCHMARKS = {}
+
+class Benchmark:
+    """Benchmark registrado: función de preparación, rondas de medida y de calentamiento"""
+    
+    def __init__(self, name, setup, rounds, warmup):
+        self.name = name
+        self.setup = setup
+        self.rounds = rounds
+        self.warmup = warmup
+    
+    def run(self, scale):
+        """
+        Prepara los datos y cronometra `rounds` llamadas tras `warmup` de calentamiento.
+        
+        Returns:
+            dict: Estadísticas de las rondas en segundos
+        """
+        function = self.setup(scale)
+        for _ in range(self.warmup):
+            function()
+        
+        timings = []
+        for _ in range(self.rounds):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        
+        return {
+            'min': min(timings),
+            'median': statistics.median(timings),
+            'mean': statistics.fmean(timings),
+            'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+            'rounds': len(timings)
+        }
+
+def benchmark(name=None, rounds=5, warmup=1):
+    """
+    Registra un benchmark.
+    
+    Uso:
+        @benchmark('export.docx', rounds=3)
+        def bench_export_docx(scale):
+            book = ...
+            return lambda: DocxExporter(book).generate_docx()
+    """
+    def register(setup):
+        benchmark_name = name or setup.__name__.removeprefix('bench_')
+        if benchmark_name in BENCHMARKS:
+            raise ValueError(f"Benchmark duplicado: {benchmark_name}")
+        BENCHMARKS[benchmark_name] = Benchmark(benchmark_name, setup, rounds, warmup)
+        return setup
+    return register
+
+def _git(*args):
+    try:
+        result = subprocess.run(['git', *args], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+def current_commit():
+    """Commit actual y si el árbol de trabajo tiene cambios sin confirmar"""
+    commit = _git('rev-parse', 'HEAD') or 'unknown'
+    dirty = bool(_git('status', '--porcelain', '--untracked-files=no'))
+    return commit, dirty
+
+def resolve_commit(reference):
+    """Resuelve una referencia de git (rama, etiqueta, HEAD~1...) a su hash completo"""
+    return _git('rev-parse', '--verify', '--quiet', f"{reference}^{{commit}}")
+
+def machine_name():
+    return platform.node() or 'unknown'
+
+def results_path(results_dir, commit, scale_name):
+    return os.path.join(results_dir, machine_name(), f"{commit[:12]}-{scale_name}.json")
+
+def save_results(results_dir, scale_name, scale, results):
+    """
+    Guarda los resultados de una ejecución (sobrescribe los del mismo commit y escala).
+    
+    Returns:
+        str: Ruta del archivo guardado
+    """
+    commit, dirty = current_commit()
+    path = results_path(results_dir, commit, scale_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as output:
+        json.dump({
+            'commit': commit,
+            'dirty': dirty,
+            'machine': machine_name(),
+            'python': platform.python_version(),
+            'platform': sys.platform,
+            'scale_name': scale_name,
+            'scale': scale,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'results': results
+        }, output, indent=2, sort_keys=True)
+    return path
+
+def load_results(path):
+    with open(path, encoding='utf-8') as source:
+        return json.load(source)
+
+def find_baseline(results_dir, scale_name, reference=None):
+    """
+    Busca los resultados con los que comparar en esta máquina.
+    
+    Args:
+        reference: Commit, referencia de git o ruta de un archivo de resultados.
+            Sin referencia se usa la ejecución más reciente de otro commit.
+    
+    Returns:
+        str: Ruta del archivo de resultados o None si no hay ninguno
+    """
+    if reference and os.path.isfile(reference):
+        return reference
+    
+    if reference:
+        commit = resolve_commit(reference) or reference
+        path = results_path(results_dir, commit, scale_name)
+        return path if os.path.isfile(path) else None
+    
+    directory = os.path.join(results_dir, machine_name())
+    if not os.path.isdir(directory):
+        return None
+    current, _ = current_commit()
+    candidates = [
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.endswith(f"-{scale_name}.json") and not name.startswith(current[:12])
+    ]
+    return max(candidates, key=os.path.getmtime) if candidates else None
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compara las medianas con las de otra ejecución.
+    
+    Returns:
+        list: Filas (nombre, mediana, mediana anterior, cociente, veredicto)
+    """
+    rows = []
+    for name, stats in results.items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            rows.append((name, stats['median'], None, None, 'nuevo'))
+            continue
+        ratio = stats['median'] / previous['median'] if previous['median'] else None
+        if ratio is None:
+            verdict = ''
+        elif ratio > 1 + threshold:
+            verdict = 'REGRESIÓN'
+        elif ratio < 1 - threshold:
+            verdict = 'mejora'
+        else:
+            verdict = 'igual'
+        rows.append((name, stats['median'], previous['median'], ratio, verdict))
+    return rows
+
+def format_seconds(seconds):
+    if seconds is None:
+        return '-'
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds:.3f} s"
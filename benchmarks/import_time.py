@@ -0,0 +1,116 @@
+"""
+Benchmark del tiempo de importación al arrancar la aplicación (python -X importtime).
+
+Mide en un proceso nuevo lo que paga cada proceso del servidor al crear la
+aplicación y cada invocación de la CLI de flask al cargar run.py. Muestra los
+paquetes que más tardan y falla si el arranque importa alguna de las dependencias
+pesadas que solo necesitan las exportaciones o las llamadas a Claude.
+
+Uso:
+    python -m benchmarks.import_time [--repetitions 5] [--top 15] [--max-ms 400]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Código que ejecuta cada tipo de proceso al arrancar
+SCENARIOS = {
+    'create_app': "from app import create_app; create_app()",
+    'flask-cli': "import run",
+}
+
+# Dependencias que deben cargarse al usarse (exportar, llamar a Claude), no al arrancar
+LAZY_MODULES = ('docx', 'lxml', 'slugify', 'requests')
+
+LINE_PATTERN = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)$')
+
+def run_statement(statement, importtime=False):
+    """
+    Ejecuta `statement` en un intérprete nuevo desde la raíz del repositorio.
+    
+    Returns:
+        str: Salida de error (el informe de -X importtime si se pidió)
+    """
+    env = dict(os.environ)
+    # create_app() exige una base de datos configurada aunque no se conecte
+    env.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.gettempdir(), 'import_time.db')}")
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', statement]
+    result = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Falló `{statement}`:\n{result.stderr[-2000:]}")
+    return result.stderr
+
+def parse_importtime(report):
+    """
+    Devuelve (total en µs, {módulo: (propio µs, acumulado µs)}) de un informe de -X importtime.
+    El total suma el tiempo acumulado de las importaciones de primer nivel.
+    """
+    modules = {}
+    total = 0
+    for line in report.splitlines():
+        match = LINE_PATTERN.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = int(match.group(1)), int(match.group(2)), match.group(3), match.group(4)
+        modules[name] = (self_us, cumulative_us)
+        if len(indent) == 1:
+            total += cumulative_us
+    return total, modules
+
+def measure(statement, repetitions):
+    """
+    Importa `statement` varias veces y devuelve la mediana del total (ms), el
+    tiempo propio medio por paquete de primer nivel (ms) y los módulos importados.
+    """
+    totals = []
+    packages = {}
+    modules = set()
+    for _ in range(repetitions):
+        total, imported = parse_importtime(run_statement(statement, importtime=True))
+        totals.append(total / 1000)
+        modules.update(imported)
+        for name, (self_us, _) in imported.items():
+            package = name.split('.')[0]
+            packages[package] = packages.get(package, 0) + self_us / 1000 / repetitions
+    return statistics.median(totals), packages, modules
+
+def lazy_modules_loaded(modules):
+    """Dependencias de LAZY_MODULES que se importaron al arrancar"""
+    return sorted({name.split('.')[0] for name in modules} & set(LAZY_MODULES))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repetitions', type=int, default=5, help="Arranques por escenario")
+    parser.add_argument('--top', type=int, default=15, help="Paquetes más lentos que se muestran")
+    parser.add_argument('--max-ms', type=float, help="Tiempo máximo de importación por escenario")
+    args = parser.parse_args()
+    
+    failures = []
+    for name, statement in SCENARIOS.items():
+        total, packages, modules = measure(statement, args.repetitions)
+        print(f"\n== {name}: {total:.1f} ms (mediana de {args.repetitions}, {len(modules)} módulos)")
+        print(f"   {'paquete':<28} {'ms propios':>10}")
+        for package, milliseconds in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+            print(f"   {package:<28} {milliseconds:>10.1f}")
+        
+        loaded = lazy_modules_loaded(modules)
+        if loaded:
+            failures.append(f"{name}: importa al arrancar {', '.join(loaded)}")
+        if args.max_ms is not None and total > args.max_ms:
+            failures.append(f"{name}: {total:.1f} ms > {args.max_ms:.1f} ms")
+    
+    if failures:
+        print("\nRegresiones:")
+        for failure in failures:
+            print(f"   {failure}")
+        sys.exit(1)
+    print(f"\nNingún escenario importa {', '.join(LAZY_MODULES)} al arrancar")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark de la serialización de /api/books.
+
+Compara el método anterior (Book.to_dict() de todos los libros y jsonify de una vez)
+con el array JSON generado en streaming desde una consulta por lotes. Mide el tiempo
+y el pico de memoria asignada por Python (tracemalloc) para varios tamaños de catálogo.
+
+Uso:
+    python -m benchmarks.json_serialization [--books 50 200] [--words 3000]
+"""
+import argparse
+import time
+import tracemalloc
+
+from flask import jsonify
+
+from app.models.book import Book
+from app.serialization import iter_books, iter_json_array, orjson
+from benchmarks.fixtures import create_bench_app, create_synthetic_book, temporary_database_url
+
+def legacy():
+    books = Book.query.order_by(Book.created_at.desc()).all()
+    return len(jsonify([book.to_dict() for book in books]).get_data())
+
+def streamed():
+    return sum(len(chunk) for chunk in iter_json_array(iter_books()))
+
+def measure(app, function):
+    with app.test_request_context():
+        tracemalloc.start()
+        start = time.perf_counter()
+        size = function()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        from app import db
+        db.session.remove()
+    return elapsed, peak, size
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, nargs='+', default=[50, 200], help="Tamaños de catálogo")
+    parser.add_argument('--words', type=int, default=3000, help="Palabras por capítulo")
+    args = parser.parse_args()
+    
+    print(f"Codificador: {'orjson' if orjson else 'json (biblioteca estándar)'}")
+    print(f"\n{'libros':>7} {'método':>10} {'tiempo (s)':>11} {'pico (MB)':>10} {'JSON (MB)':>10}")
+    for book_count in args.books:
+        app = create_bench_app(temporary_database_url('json_serialization.db'))
+        with app.app_context():
+            for number in range(book_count):
+                create_synthetic_book(10, args.words, title=f"Libro {number}", seed=number)
+        for name, function in (('to_dict', legacy), ('streaming', streamed)):
+            elapsed, peak, size = measure(app, function)
+            print(f"{book_count:>7} {name:>10} {elapsed:>11.3f} {peak / 2**20:>10.1f} {size / 2**20:>10.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,512 @@
+"""
+Prueba de carga: generaciones simultáneas con pestañas de navegador siguiendo el progreso.
+
+Levanta una API de Claude falsa (latencia y tasa de errores configurables) y, salvo
+que se indique --url, la aplicación sobre una base de datos desechable. Después lanza
+clientes concurrentes que reproducen lo que hacen las plantillas:
+
+- generaciones: POST /generate y seguimiento del libro (SSE o sondeo cada 5 s)
+- sondeo: GET /api/book/<uuid>/progress periódico con If-None-Match
+- canal del libro: Server-Sent Events de /api/book/<uuid>/events
+- portada: GET / y canal /api/books/events, pidiendo /api/books en cada 'refresh'
+- exportaciones: descargas de DOCX de libros completados
+
+Al terminar muestra rendimiento, latencias p50/p95/p99 y tasa de errores por
+operación, y comprueba los objetivos indicados con --slo.
+
+Uso:
+    python -m benchmarks.load_test [--generations 5] [--pollers 20] [--streams 20] [--index-tabs 5]
+        [--exporters 2] [--duration 120] [--slo progress:p95<=200] [--json informe.json]
+
+Para probar otro despliegue, arrancarlo con CLAUDE_API_URL apuntando a la API falsa
+(--claude-port fijo) y pasar su dirección con --url.
+"""
+import argparse
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from benchmarks.fixtures import chapter_text, create_bench_app, create_synthetic_book, temporary_database_url
+
+class FakeClaudeHandler(BaseHTTPRequestHandler):
+    """API de Claude falsa: responde tras `latency` segundos (±20 %) con una tabla de contenidos o un capítulo"""
+    
+    latency = 2.0
+    error_rate = 0.0
+    toc = None
+    chapter = None
+    rng = random.Random(0)
+    lock = threading.Lock()
+    
+    def log_message(self, *args):
+        pass
+    
+    def do_GET(self):
+        # API de modelos: la usa la comprobación de conexión de la aplicación
+        data = json.dumps({'type': 'model', 'id': self.path.rsplit('/', 1)[-1]}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        prompt = body['messages'][0]['content']
+        with self.lock:
+            delay = self.latency * self.rng.uniform(0.8, 1.2)
+            failed = self.rng.random() < self.error_rate
+        time.sleep(delay)
+        
+        if failed:
+            status, payload = 529, {'type': 'error', 'error': {'type': 'overloaded_error', 'message': 'Overloaded'}}
+        else:
+            text = self.toc if 'tabla de contenidos' in prompt else self.chapter
+            status, payload = 200, {
+                'content': [{'type': 'text', 'text': text}],
+                'usage': {'input_tokens': len(prompt) // 4, 'output_tokens': len(text) // 4}
+            }
+        
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+def start_fake_claude(port, latency, error_rate, words_per_chapter):
+    """Arranca la API falsa en un hilo y devuelve el servidor"""
+    FakeClaudeHandler.latency = latency
+    FakeClaudeHandler.error_rate = error_rate
+    FakeClaudeHandler.toc = json.dumps({
+        'title': 'Libro de prueba de carga',
+        'chapters': [
+            {'number': number, 'title': f"Capítulo {number}", 'scope': "Alcance del capítulo"}
+            for number in range(1, 11)
+        ]
+    })
+    FakeClaudeHandler.chapter = chapter_text(words_per_chapter)
+    server = ThreadingHTTPServer(('127.0.0.1', port), FakeClaudeHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='fake-claude', daemon=True).start()
+    return server
+
+def start_local_app(args, claude_url):
+    """Arranca la aplicación con el servidor de Werkzeug (multihilo) y devuelve (servidor, URL)"""
+    from werkzeug.serving import make_server
+    from app import db
+    
+    app = create_bench_app(args.database_url or temporary_database_url('load_test.db'))
+    app.config.update(
+        CLAUDE_API_KEY='load-test',
+        CLAUDE_API_URL=claude_url,
+        CLAUDE_MODEL='load-test-model',
+        CHAPTER_PAUSE_SECONDS=args.chapter_pause,
+        SSE_HEARTBEAT_SECONDS=args.heartbeat
+    )
+    with app.app_context():
+        print(f"Creando {args.catalog_books} libros completados para /api/books y las exportaciones...")
+        for number in range(args.catalog_books):
+            create_synthetic_book(10, args.words, title=f"Libro de catálogo {number}", seed=number)
+        db.session.remove()
+    
+    server = make_server('127.0.0.1', args.port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='app-server', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+def percentile(sorted_values, q):
+    """Percentil por rango más cercano de una lista ordenada"""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(q / 100 * len(sorted_values)) - 1)]
+
+class Recorder:
+    """Latencias y errores por operación, compartidos por todos los clientes"""
+    
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.latencies = {}
+        self.errors = {}
+        self.error_kinds = {}
+        self.lock = threading.Lock()
+    
+    def record(self, operation, seconds, error=None):
+        with self.lock:
+            self.latencies.setdefault(operation, [])
+            self.errors.setdefault(operation, 0)
+            if error is None:
+                self.latencies[operation].append(seconds)
+            else:
+                self.errors[operation] += 1
+                key = (operation, error)
+                self.error_kinds[key] = self.error_kinds.get(key, 0) + 1
+    
+    def request(self, session, operation, method, url, ok=(200,), **kwargs):
+        """Hace una petición, registra su latencia y devuelve la respuesta (o None si falló)"""
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, **kwargs)
+            response.content
+        except requests.Timeout:
+            self.record(operation, None, 'timeout')
+            return None
+        except requests.RequestException as e:
+            self.record(operation, None, type(e).__name__)
+            return None
+        elapsed = time.perf_counter() - start
+        self.record(operation, elapsed, None if response.status_code in ok else f"HTTP {response.status_code}")
+        return response
+    
+    def report(self, duration):
+        rows = {}
+        with self.lock:
+            for operation in sorted(set(self.latencies) | set(self.errors)):
+                values = sorted(self.latencies.get(operation, []))
+                errors = self.errors.get(operation, 0)
+                total = len(values) + errors
+                rows[operation] = {
+                    'requests': total,
+                    'errors': errors,
+                    'error_rate': errors / total if total else 0.0,
+                    'throughput': total / duration if duration else 0.0,
+                    'p50_ms': _ms(percentile(values, 50)),
+                    'p95_ms': _ms(percentile(values, 95)),
+                    'p99_ms': _ms(percentile(values, 99)),
+                    'max_ms': _ms(values[-1] if values else None)
+                }
+            errors = {f"{operation}: {kind}": count for (operation, kind), count in sorted(self.error_kinds.items())}
+        return rows, errors
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+class Generations:
+    """Libros en generación lanzados por la prueba y su duración hasta terminar"""
+    
+    def __init__(self):
+        self.uuids = []
+        self.finished = {}
+        self.available = threading.Condition()
+    
+    def add(self, uuid):
+        with self.available:
+            self.uuids.append(uuid)
+            self.available.notify_all()
+    
+    def pick(self, index, stop):
+        """
+        Libro en generación que sigue el cliente `index` (reparto circular entre los
+        que no han terminado); espera a que haya alguno.
+        """
+        with self.available:
+            while not stop.is_set():
+                active = [uuid for uuid in self.uuids if uuid not in self.finished]
+                if active:
+                    return active[index % len(active)]
+                self.available.wait(0.5)
+            return None
+    
+    def finish(self, uuid, status, seconds):
+        with self.available:
+            self.finished[uuid] = (status, seconds)
+            self.available.notify_all()
+
+def follow_progress_polling(base_url, uuid, recorder, stop, interval, until_done=False):
+    """Sondeo de generate.html / view_book.html: progreso periódico revalidando con ETag"""
+    session = requests.Session()
+    etag = None
+    while not stop.is_set():
+        headers = {'If-None-Match': etag} if etag else {}
+        response = recorder.request(session, 'progress', 'GET', f"{base_url}/api/book/{uuid}/progress",
+                                    ok=(200, 304), headers=headers)
+        if response is not None and response.status_code == 200:
+            etag = response.headers.get('ETag')
+            if until_done and response.json()['status'] in ('completed', 'error'):
+                return response.json()['status']
+        stop.wait(interval)
+    return None
+
+def follow_events(base_url, path, operation, recorder, stop, heartbeat, on_event=None, measure_first_event=True):
+    """
+    Mantiene abierto un canal SSE como EventSource (reconectando si se corta) y
+    llama a `on_event(tipo, datos)` por cada evento; si devuelve False se cierra el canal.
+    Con `measure_first_event` registra el tiempo hasta el primer evento (el estado inicial).
+    """
+    session = requests.Session()
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            with session.get(f"{base_url}{path}", stream=True, timeout=(recorder.timeout, heartbeat * 3)) as response:
+                if response.status_code != 200:
+                    recorder.record(operation, None, f"HTTP {response.status_code}")
+                    stop.wait(1)
+                    continue
+                event_type, data = None, None
+                # Leer byte a byte: con bloques mayores la lectura esperaría a llenar el bloque
+                for line in response.iter_lines(chunk_size=1, decode_unicode=True):
+                    if stop.is_set():
+                        return
+                    if line.startswith('event: '):
+                        event_type = line[len('event: '):]
+                    elif line.startswith('data: '):
+                        data = json.loads(line[len('data: '):])
+                    elif not line and event_type:
+                        if measure_first_event:
+                            recorder.record(operation, time.perf_counter() - start)
+                            measure_first_event = False
+                        if on_event and on_event(event_type, data) is False:
+                            return
+                        event_type, data = None, None
+        except requests.RequestException as e:
+            if stop.is_set():
+                return
+            recorder.record(f"{operation}.disconnect", None, type(e).__name__)
+            stop.wait(1)
+
+def _is_finished(event_type, data):
+    return event_type == 'progress' and data['status'] in ('completed', 'error')
+
+def generation_client(index, args, base_url, recorder, generations, stop, run_id):
+    """Pestaña de generate.html: lanza generaciones una tras otra y sigue cada una hasta que termina"""
+    session = requests.Session()
+    for attempt in range(sys.maxsize):
+        if stop.is_set():
+            return
+        start = time.perf_counter()
+        response = recorder.request(session, 'generate', 'POST', f"{base_url}/generate", data={
+            'title': f"Prueba de carga {run_id}-{index}-{attempt}",
+            'market_niche': "Productividad",
+            'purpose': "Medir la capacidad del despliegue"
+        })
+        if response is None or response.status_code != 200:
+            stop.wait(1)
+            continue
+        uuid = response.json()['book_uuid']
+        generations.add(uuid)
+        
+        if args.follow == 'poll':
+            status = follow_progress_polling(base_url, uuid, recorder, stop, args.poll_interval, until_done=True)
+        else:
+            outcome = {}
+            
+            def on_event(event_type, data):
+                if _is_finished(event_type, data):
+                    outcome['status'] = data['status']
+                    return False
+            
+            follow_events(base_url, f"/api/book/{uuid}/events", 'book_events', recorder, stop, args.heartbeat, on_event)
+            status = outcome.get('status')
+        
+        if status:
+            generations.finish(uuid, status, time.perf_counter() - start)
+
+def poller_client(index, args, base_url, recorder, generations, stop):
+    """Pestaña que sondea el progreso de un libro en generación y pasa a otro cuando termina"""
+    while not stop.is_set():
+        uuid = generations.pick(index, stop)
+        if uuid is None:
+            return
+        follow_progress_polling(base_url, uuid, recorder, stop, args.poll_interval, until_done=True)
+
+def stream_client(index, args, base_url, recorder, generations, stop):
+    """Pestaña con el canal SSE de un libro en generación; pasa a otro cuando termina"""
+    while not stop.is_set():
+        uuid = generations.pick(index, stop)
+        if uuid is None:
+            return
+        follow_events(base_url, f"/api/book/{uuid}/events", 'book_events', recorder, stop, args.heartbeat,
+                      lambda event_type, data: not _is_finished(event_type, data))
+
+def index_client(index, args, base_url, recorder, generations, stop):
+    """Pestaña de index.html: portada, canal de la lista y /api/books en cada 'refresh'"""
+    session = requests.Session()
+    recorder.request(session, 'index', 'GET', f"{base_url}/")
+    
+    def on_event(event_type, data):
+        if event_type == 'refresh':
+            recorder.request(session, 'api_books', 'GET', f"{base_url}/api/books",
+                             headers={'Accept-Encoding': 'gzip'})
+    
+    # El canal de la lista no envía nada al conectarse, así que no se mide su primer evento
+    follow_events(base_url, '/api/books/events', 'books_events', recorder, stop, args.heartbeat, on_event,
+                  measure_first_event=False)
+
+def export_client(index, args, base_url, recorder, generations, stop):
+    """Descargas de DOCX de los libros completados del catálogo, con una pausa entre ellas"""
+    session = requests.Session()
+    response = recorder.request(session, 'api_books', 'GET', f"{base_url}/api/books")
+    if response is None:
+        return
+    completed = [book['uuid'] for book in response.json() if book['status'] == 'completed']
+    if not completed:
+        return
+    rng = random.Random(index)
+    while not stop.is_set():
+        uuid = rng.choice(completed)
+        recorder.request(session, 'export_docx', 'GET', f"{base_url}/book/{uuid}/export/docx")
+        stop.wait(args.think_time)
+
+SLO_PATTERN = re.compile(r'^(?P<operation>[\w.]+):(?P<metric>p50|p95|p99|max|error_rate)<=?(?P<limit>[\d.]+)$')
+
+def check_slos(rows, slos, max_error_rate):
+    """Devuelve la lista de objetivos incumplidos"""
+    failures = []
+    for operation, row in rows.items():
+        if row['error_rate'] > max_error_rate:
+            failures.append(f"{operation}: tasa de errores {row['error_rate']:.2%} > {max_error_rate:.2%}")
+    for slo in slos:
+        match = SLO_PATTERN.match(slo)
+        operation, metric, limit = match.group('operation'), match.group('metric'), float(match.group('limit'))
+        row = rows.get(operation)
+        if row is None:
+            failures.append(f"{slo}: no hubo peticiones de {operation}")
+            continue
+        value = row['error_rate'] if metric == 'error_rate' else row[f"{metric}_ms"]
+        if value is None:
+            failures.append(f"{slo}: sin peticiones correctas")
+        elif value > limit:
+            failures.append(f"{slo}: valor {value:.4g}")
+    return failures
+
+def _slo(value):
+    if not SLO_PATTERN.match(value):
+        raise argparse.ArgumentTypeError("formato esperado operación:p95<=250 (p50, p95, p99, max en ms o error_rate)")
+    return value
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help="Aplicación ya desplegada (por defecto se arranca una local)")
+    parser.add_argument('--port', type=int, default=0, help="Puerto de la aplicación local")
+    parser.add_argument('--database-url', help="Base de datos de la aplicación local (por defecto, SQLite temporal)")
+    parser.add_argument('--generations', type=int, default=5, help="Generaciones simultáneas")
+    parser.add_argument('--follow', choices=['sse', 'poll'], default='sse', help="Cómo sigue cada generación su pestaña")
+    parser.add_argument('--pollers', type=int, default=20, help="Pestañas que sondean el progreso")
+    parser.add_argument('--poll-interval', type=float, default=5, help="Segundos entre sondeos")
+    parser.add_argument('--streams', type=int, default=20, help="Pestañas con el canal SSE de un libro")
+    parser.add_argument('--index-tabs', type=int, default=5, help="Pestañas de la portada")
+    parser.add_argument('--exporters', type=int, default=2, help="Clientes que descargan DOCX")
+    parser.add_argument('--think-time', type=float, default=2, help="Segundos entre descargas de cada cliente")
+    parser.add_argument('--catalog-books', type=int, default=20, help="Libros completados de la aplicación local")
+    parser.add_argument('--words', type=int, default=3000, help="Palabras por capítulo del catálogo")
+    parser.add_argument('--duration', type=float, default=120, help="Duración de la prueba en segundos")
+    parser.add_argument('--timeout', type=float, default=30, help="Tiempo máximo de cada petición")
+    parser.add_argument('--heartbeat', type=int, default=5, help="Latido SSE de la aplicación local")
+    parser.add_argument('--chapter-pause', type=float, default=0, help="Pausa entre capítulos de la aplicación local")
+    parser.add_argument('--claude-port', type=int, default=0, help="Puerto de la API de Claude falsa")
+    parser.add_argument('--claude-latency', type=float, default=2, help="Segundos por respuesta de la API falsa")
+    parser.add_argument('--claude-error-rate', type=float, default=0, help="Fracción de respuestas 529 de la API falsa")
+    parser.add_argument('--slo', type=_slo, action='append', default=[], help="Objetivo, p. ej. progress:p95<=200")
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help="Tasa de errores máxima por operación")
+    parser.add_argument('--json', metavar='PATH', help="Guardar el informe en JSON")
+    args = parser.parse_args()
+    
+    # Los registros de la aplicación y del servidor taparían el informe
+    logging.getLogger().setLevel(logging.WARNING)
+    for name in ('app', 'werkzeug'):
+        logging.getLogger(name).setLevel(logging.ERROR)
+    
+    claude = start_fake_claude(args.claude_port, args.claude_latency, args.claude_error_rate, 3500)
+    claude_url = f"http://127.0.0.1:{claude.server_port}/v1/messages"
+    print(f"API de Claude falsa en {claude_url}")
+    
+    app_server = None
+    base_url = args.url.rstrip('/') if args.url else None
+    if base_url is None:
+        app_server, base_url = start_local_app(args, claude_url)
+    print(f"Aplicación en {base_url}")
+    
+    recorder = Recorder(args.timeout)
+    generations = Generations()
+    stop = threading.Event()
+    run_id = time.strftime('%Y%m%d%H%M%S')
+    
+    clients = [(generation_client, (run_id,), args.generations)]
+    clients += [(client, (), count) for client, count in (
+        (poller_client, args.pollers),
+        (stream_client, args.streams),
+        (index_client, args.index_tabs),
+        (export_client, args.exporters),
+    )]
+    threads = []
+    for client, extra, count in clients:
+        for index in range(count):
+            thread = threading.Thread(
+                target=client, args=(index, args, base_url, recorder, generations, stop, *extra),
+                name=f"{client.__name__}-{index}", daemon=True
+            )
+            threads.append(thread)
+    
+    print(f"Lanzando {len(threads)} clientes durante {args.duration:.0f} s...")
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    
+    # Las generaciones se encadenan durante toda la prueba para mantener la concurrencia
+    time.sleep(args.duration)
+    duration = time.perf_counter() - start
+    stop.set()
+    for thread in threads:
+        thread.join(args.heartbeat * 3)
+    
+    rows, errors = recorder.report(duration)
+    finished = generations.finished
+    completed = sorted(seconds for status, seconds in finished.values() if status == 'completed')
+    
+    print(f"\nDuración: {duration:.1f} s")
+    print(f"Generaciones: {len(generations.uuids)} iniciadas, {len(completed)} completadas, "
+          f"{sum(status == 'error' for status, _ in finished.values())} con error, "
+          f"{len(generations.uuids) - len(finished)} sin terminar")
+    if completed:
+        print(f"Duración de la generación: p50={percentile(completed, 50):.1f} s  p95={percentile(completed, 95):.1f} s  "
+              f"capítulos/min={len(completed) * 10 / (duration / 60):.1f}")
+    
+    def fmt(value):
+        return '-' if value is None else f"{value:.1f}"
+    
+    print(f"\n{'operación':<24} {'peticiones':>10} {'req/s':>8} {'errores':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'máx ms':>9}")
+    for operation, row in rows.items():
+        print(f"{operation:<24} {row['requests']:>10} {row['throughput']:>8.2f} {row['error_rate']:>8.2%} "
+              f"{fmt(row['p50_ms']):>9} {fmt(row['p95_ms']):>9} {fmt(row['p99_ms']):>9} {fmt(row['max_ms']):>9}")
+    for kind, count in errors.items():
+        print(f"  error {kind}: {count}")
+    
+    failures = check_slos(rows, args.slo, args.max_error_rate)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as output:
+            json.dump({
+                'arguments': {key: value for key, value in vars(args).items() if key != 'json'},
+                'duration_seconds': duration,
+                'generations': {
+                    'started': len(generations.uuids),
+                    'completed': len(completed),
+                    'failed': sum(status == 'error' for status, _ in finished.values()),
+                    'p50_seconds': percentile(completed, 50),
+                    'p95_seconds': percentile(completed, 95)
+                },
+                'operations': rows,
+                'errors': errors,
+                'slo_failures': failures
+            }, output, indent=2)
+    
+    if app_server is not None:
+        app_server.shutdown()
+    claude.shutdown()
+    
+    if failures:
+        print("\nObjetivos incumplidos:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nTodos los objetivos se cumplen")
+
+if __name__ == '__main__':
+    main()
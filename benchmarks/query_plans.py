@@ -0,0 +1,150 @@
+"""
+Benchmark de las consultas frecuentes sobre libros y capítulos.
+
+Crea una base de datos con decenas de miles de libros sintéticos y muestra el plan
+de ejecución y la latencia de cada consulta sin los índices secundarios y con ellos.
+
+Uso:
+    python -m benchmarks.query_plans [--books 20000] [--database-url sqlite:////tmp/bench.db]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+from app import db
+from app.models.book import Book, Chapter
+
+STATUSES = ['completed'] * 8 + ['error', 'processing']
+
+# Consultas equivalentes a las que hacen las rutas y el generador
+QUERIES = {
+    'generate: libro por título': (
+        "SELECT id FROM books WHERE title = :title LIMIT 1",
+        lambda n: {'title': f"Libro {random.randrange(n)}"}
+    ),
+    'generate_book: libro por título y nicho': (
+        "SELECT id FROM books WHERE title = :title AND market_niche = :niche LIMIT 1",
+        lambda n: {'title': f"Libro {random.randrange(n)}", 'niche': 'Nicho 0'}
+    ),
+    'capítulo por libro y número': (
+        "SELECT id FROM chapters WHERE book_id = :book_id AND chapter_number = :number LIMIT 1",
+        lambda n: {'book_id': random.randrange(1, n + 1), 'number': random.randrange(1, 11)}
+    ),
+    'index: libros por fecha de creación': (
+        "SELECT id, title FROM books ORDER BY created_at DESC LIMIT 50",
+        lambda n: {}
+    ),
+    'libros en proceso': (
+        "SELECT id FROM books WHERE status = :status",
+        lambda n: {'status': 'processing'}
+    ),
+}
+
+def seed(engine, book_count, chapters_per_book):
+    """Inserta libros y capítulos sintéticos (con contenido mínimo) en lotes"""
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    now = datetime.utcnow()
+    books = Book.__table__
+    chapters = Chapter.__table__
+    with engine.begin() as connection:
+        for start in range(0, book_count, 1000):
+            batch = range(start, min(start + 1000, book_count))
+            connection.execute(books.insert(), [{
+                'id': i + 1,
+                'uuid': f"00000000-0000-0000-0000-{i:012d}",
+                'title': f"Libro {i}",
+                'market_niche': f"Nicho {i % 50}",
+                'purpose': "Propósito sintético",
+                'created_at': now - timedelta(minutes=i),
+                'status': random.choice(STATUSES),
+                'completed_chapters': chapters_per_book,
+                'progress_version': 0
+            } for i in batch])
+            connection.execute(chapters.insert(), [{
+                'book_id': i + 1,
+                'chapter_number': number,
+                'title': f"Capítulo {number}",
+                'scope': "Alcance",
+                'content_data': b'',
+                'word_count': 0
+            } for i in batch for number in range(1, chapters_per_book + 1)])
+
+def secondary_indexes():
+    """Índices añadidos por la migración 7b93f05d8e21"""
+    names = {'ix_books_title', 'ix_books_status', 'ix_books_created_at', 'ix_chapters_book_id_chapter_number'}
+    return [index for table in (Book.__table__, Chapter.__table__) for index in table.indexes if index.name in names]
+
+def explain(connection, sql, params):
+    """Devuelve el plan de ejecución de la consulta según el motor de base de datos"""
+    if connection.dialect.name == 'sqlite':
+        rows = connection.execute(sa.text(f"EXPLAIN QUERY PLAN {sql}"), params).fetchall()
+        return [row[-1] for row in rows]
+    rows = connection.execute(sa.text(f"EXPLAIN {sql}"), params).fetchall()
+    return [row[0] for row in rows]
+
+def measure(engine, book_count, repetitions):
+    """Ejecuta cada consulta varias veces y devuelve plan y latencias en milisegundos"""
+    results = {}
+    with engine.connect() as connection:
+        for name, (sql, make_params) in QUERIES.items():
+            plan = explain(connection, sql, make_params(book_count))
+            timings = []
+            for _ in range(repetitions):
+                params = make_params(book_count)
+                start = time.perf_counter()
+                connection.execute(sa.text(sql), params).fetchall()
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            results[name] = {
+                'plan': plan,
+                'p50': statistics.median(timings),
+                'p95': timings[int(len(timings) * 0.95) - 1]
+            }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=20000, help="Número de libros sintéticos")
+    parser.add_argument('--chapters', type=int, default=10, help="Capítulos por libro")
+    parser.add_argument('--repetitions', type=int, default=200, help="Ejecuciones por consulta")
+    parser.add_argument('--database-url', help="Base de datos desechable (por defecto, SQLite temporal)")
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'query_plans.db')}"
+    engine = sa.create_engine(database_url)
+
+    print(f"Sembrando {args.books} libros con {args.chapters} capítulos en {engine.url.render_as_string()}...")
+    seed(engine, args.books, args.chapters)
+
+    indexes = secondary_indexes()
+    for index in indexes:
+        index.drop(engine)
+    before = measure(engine, args.books, args.repetitions)
+
+    for index in indexes:
+        index.create(engine)
+    with engine.begin() as connection:
+        if connection.dialect.name == 'sqlite':
+            connection.execute(sa.text("ANALYZE"))
+    after = measure(engine, args.books, args.repetitions)
+
+    for name in QUERIES:
+        print(f"\n== {name}")
+        print(f"   sin índices: p50={before[name]['p50']:.3f} ms  p95={before[name]['p95']:.3f} ms")
+        for line in before[name]['plan']:
+            print(f"      {line}")
+        print(f"   con índices: p50={after[name]['p50']:.3f} ms  p95={after[name]['p95']:.3f} ms")
+        for line in after[name]['plan']:
+            print(f"      {line}")
+
+    engine.dispose()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark de /api/search.
+
+Crea un catálogo sintético (por defecto 100 libros de 10 capítulos de 3000 palabras,
+unos 3 millones de palabras) y mide la latencia de varias búsquedas: un término
+presente en todos los capítulos, uno que solo aparece en unos pocos, varios
+términos a la vez y una página profunda de resultados.
+
+Uso:
+    python -m benchmarks.search [--books 100] [--words 3000] [--repeat 20] [--database-url URL]
+"""
+import argparse
+import statistics
+import time
+
+from app import db
+from app.models.book import Chapter
+from benchmarks.fixtures import chapter_text, create_bench_app, create_synthetic_book, temporary_database_url
+
+# Términos que solo aparecen en algunos capítulos
+RARE_TERMS = "algoritmo cuántico"
+
+QUERIES = (
+    ('término común', {'q': 'estrategia'}),
+    ('término raro', {'q': 'algoritmo'}),
+    ('varios términos', {'q': 'cliente negocio hábito'}),
+    ('página 10', {'q': 'estrategia', 'page': 10}),
+)
+
+def build_catalog(app, book_count, words):
+    with app.app_context():
+        for number in range(book_count):
+            book = create_synthetic_book(10, words, title=f"Libro {number}", seed=number)
+            # Un capítulo de cada diez libros menciona los términos raros
+            if number % 10 == 0:
+                chapter = Chapter.query.filter_by(book_id=book.id, chapter_number=5).first()
+                chapter.content = chapter_text(words) + f"\n\nEl {RARE_TERMS} cambia el mercado."
+                db.session.commit()
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=100, help="Libros del catálogo")
+    parser.add_argument('--words', type=int, default=3000, help="Palabras por capítulo")
+    parser.add_argument('--repeat', type=int, default=20, help="Repeticiones de cada búsqueda")
+    parser.add_argument('--database-url', help="Base de datos vacía a usar (por defecto, SQLite temporal)")
+    args = parser.parse_args()
+    
+    app = create_bench_app(args.database_url or temporary_database_url('search.db'))
+    start = time.perf_counter()
+    build_catalog(app, args.books, args.words)
+    print(f"Catálogo de {args.books * 10 * args.words / 1e6:.1f} millones de palabras "
+          f"indexado en {time.perf_counter() - start:.1f} s")
+    
+    client = app.test_client()
+    print(f"\n{'búsqueda':>16} {'resultados':>11} {'mediana (ms)':>13} {'p95 (ms)':>9}")
+    for name, params in QUERIES:
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            response = client.get('/api/search', query_string=params)
+            samples.append((time.perf_counter() - start) * 1000)
+        total = response.get_json()['total']
+        print(f"{name:>16} {total:>11} {statistics.median(samples):>13.1f} {percentile(samples, 0.95):>9.1f}")
+
+if __name__ == '__main__':
+    main()
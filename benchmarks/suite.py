@@ -0,0 +1,258 @@
+"""
+Suite de benchmarks de la aplicación.
+
+Mide la exportación DOCX, el análisis del contenido de los capítulos, la
+serialización de libros, /api/books, el endpoint de progreso con un catálogo
+grande, una generación completa de un libro con un cliente de Claude simulado
+y el arranque de la aplicación en un proceso nuevo.
+Los resultados se guardan en benchmarks/results/<máquina>/<commit>-<escala>.json
+y se comparan con los de otro commit para detectar regresiones.
+
+Uso:
+    python -m benchmarks.suite [--scale quick|full] [--filter export] [--compare main]
+    python -m benchmarks.suite --list
+"""
+import argparse
+import functools
+import json
+import logging
+import random
+import sys
+
+from app import db
+from app.models.book import Book
+from app.services.book_generator import BookGenerator
+from app.services.claude_api import ClaudeClient
+from app.services.export_cache import load_docx_writer
+from benchmarks import import_time, query_plans
+from benchmarks.fixtures import chapter_text, create_bench_app, create_synthetic_book, temporary_database_url
+from benchmarks.harness import (
+    BENCHMARKS, DEFAULT_THRESHOLD, RESULTS_DIR, benchmark, compare, find_baseline,
+    format_seconds, load_results, save_results
+)
+
+# Tamaños de los datos sintéticos. Los resultados solo son comparables dentro de una escala.
+SCALES = {
+    'quick': {
+        'chapters': 10,          # capítulos del libro de exportación y to_dict
+        'words': 1000,           # palabras por capítulo
+        'catalog_books': 20,     # libros de 10 capítulos para /api/books
+        'progress_books': 2000,  # libros del catálogo para el endpoint de progreso
+        'progress_requests': 50,
+        'generated_chapters': 3,
+    },
+    'full': {
+        'chapters': 100,
+        'words': 3000,
+        'catalog_books': 200,
+        'progress_books': 20000,
+        'progress_requests': 200,
+        'generated_chapters': 10,
+    },
+}
+
+class StubClaudeClient(ClaudeClient):
+    """Cliente de Claude que responde al instante con una tabla de contenidos o un capítulo sintético"""
+    
+    def __init__(self, chapter_count, words_per_chapter=3500):
+        super().__init__(api_key='bench', api_url='http://127.0.0.1/', model='bench-model')
+        rng = random.Random(0)
+        self.toc = json.dumps({
+            'title': 'Libro de benchmark',
+            'chapters': [
+                {'number': number, 'title': f"Capítulo {number}", 'scope': "Alcance del capítulo"}
+                for number in range(1, chapter_count + 1)
+            ]
+        })
+        # Textos generados de antemano para no medir el generador de texto aleatorio
+        self.chapters = [chapter_text(words_per_chapter, rng=rng) for _ in range(4)]
+        self.calls = 0
+    
+    def _generate_text(self, prompt, max_tokens):
+        self.calls += 1
+        text = self.toc if 'tabla de contenidos' in prompt else self.chapters[self.calls % len(self.chapters)]
+        return {
+            'text': text,
+            'input_tokens': len(prompt) // 4,
+            'output_tokens': len(text) // 4,
+            'thinking_tokens': 0
+        }
+
+def _new_app():
+    app = create_bench_app(temporary_database_url('suite.db'))
+    app.config.update(
+        CHAPTER_PAUSE_SECONDS=0,
+        EXPORT_PRERENDER_ON_COMPLETE=False,
+        PAGE_CACHE_ENABLED=False
+    )
+    return app
+
+@functools.lru_cache(maxsize=None)
+def book_app(chapters, words):
+    """Aplicación con un único libro de `chapters` capítulos (compartida entre benchmarks)"""
+    app = _new_app()
+    with app.app_context():
+        book_id = create_synthetic_book(chapters, words).id
+    return app, book_id
+
+@functools.lru_cache(maxsize=None)
+def catalog_app(books, words):
+    """Aplicación con `books` libros completados de 10 capítulos"""
+    app = _new_app()
+    with app.app_context():
+        for number in range(books):
+            create_synthetic_book(10, words, title=f"Libro {number}", seed=number)
+    return app
+
+@benchmark('export.docx.python-docx', rounds=3)
+def bench_export_docx(scale):
+    return _export_docx(scale, 'python-docx')
+
+@benchmark('export.docx.streaming', rounds=3)
+def bench_export_docx_streaming(scale):
+    return _export_docx(scale, 'streaming')
+
+def _export_docx(scale, writer):
+    app, book_id = book_app(scale['chapters'], scale['words'])
+    exporter_class = load_docx_writer(writer)
+    
+    def run():
+        with app.app_context():
+            exporter_class(db.session.get(Book, book_id)).generate_docx()
+    return run
+
+@benchmark('docx.process_chapter_content', rounds=20)
+def bench_process_chapter_content(scale):
+    app, book_id = book_app(scale['chapters'], scale['words'])
+    with app.app_context():
+        book = db.session.get(Book, book_id)
+        exporter = load_docx_writer('python-docx')(book)
+        contents = [chapter.content for chapter in book.chapters]
+    
+    def run():
+        for content in contents:
+            exporter._process_chapter_content(content)
+    return run
+
+@benchmark('model.book_to_dict', rounds=10)
+def bench_book_to_dict(scale):
+    app, book_id = book_app(scale['chapters'], scale['words'])
+    
+    def run():
+        # Sesión nueva en cada ronda para medir también la carga de los capítulos
+        with app.app_context():
+            db.session.get(Book, book_id).to_dict()
+    return run
+
+@benchmark('api.books', rounds=5)
+def bench_api_books(scale):
+    client = catalog_app(scale['catalog_books'], scale['words']).test_client()
+    
+    def run():
+        response = client.get('/api/books')
+        assert response.status_code == 200
+        response.get_data()
+    return run
+
+def _progress_client(scale):
+    app = _new_app()
+    # seed() reparte los estados de los libros con el generador global de random
+    random.seed(0)
+    with app.app_context():
+        query_plans.seed(db.engine, scale['progress_books'], 10)
+    uuids = [f"00000000-0000-0000-0000-{i:012d}" for i in range(scale['progress_books'])]
+    rng = random.Random(0)
+    return app.test_client(), [rng.choice(uuids) for _ in range(scale['progress_requests'])]
+
+@benchmark('api.book_progress', rounds=5)
+def bench_book_progress(scale):
+    client, uuids = _progress_client(scale)
+    
+    def run():
+        for uuid in uuids:
+            assert client.get(f'/api/book/{uuid}/progress').status_code == 200
+    return run
+
+@benchmark('api.book_progress.not_modified', rounds=5)
+def bench_book_progress_not_modified(scale):
+    client, uuids = _progress_client(scale)
+    etags = {uuid: client.get(f'/api/book/{uuid}/progress').headers['ETag'] for uuid in set(uuids)}
+    
+    def run():
+        for uuid in uuids:
+            assert client.get(f'/api/book/{uuid}/progress', headers={'If-None-Match': etags[uuid]}).status_code == 304
+    return run
+
+@benchmark('generator.generate_book', rounds=3)
+def bench_generate_book(scale):
+    app = _new_app()
+    generator = BookGenerator(StubClaudeClient(scale['generated_chapters']))
+    counter = iter(range(sys.maxsize))
+    
+    def run():
+        with app.app_context():
+            result = generator.generate_book(f"Libro generado {next(counter)}", "Productividad", "Benchmark")
+            assert 'error' not in result, result
+    return run
+
+@benchmark('startup.create_app', rounds=5)
+def bench_startup_create_app(scale):
+    # Proceso nuevo en cada ronda: incluye el arranque del intérprete y todas las importaciones
+    return lambda: import_time.run_statement(import_time.SCENARIOS['create_app'])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='full', help="Tamaño de los datos sintéticos")
+    parser.add_argument('--filter', action='append', default=[], help="Ejecutar solo los benchmarks que contienen este texto")
+    parser.add_argument('--compare', metavar='REF', help="Commit, rama o archivo de resultados con el que comparar "
+                                                         "(por defecto, la ejecución más reciente de otro commit)")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="Variación de la mediana que se considera regresión")
+    parser.add_argument('--results-dir', default=RESULTS_DIR, help="Directorio de resultados")
+    parser.add_argument('--no-save', action='store_true', help="No guardar los resultados")
+    parser.add_argument('--fail-on-regression', action='store_true', help="Terminar con código 1 si hay regresiones")
+    parser.add_argument('--list', action='store_true', help="Mostrar los benchmarks disponibles")
+    args = parser.parse_args()
+    
+    selected = [b for name, b in BENCHMARKS.items() if not args.filter or any(f in name for f in args.filter)]
+    if args.list:
+        for item in selected:
+            print(item.name)
+        return
+    
+    # Los registros INFO de la generación ocultarían la tabla de resultados
+    logging.getLogger().setLevel(logging.WARNING)
+    for name in logging.root.manager.loggerDict:
+        if name.startswith('app'):
+            logging.getLogger(name).setLevel(logging.WARNING)
+    
+    scale = SCALES[args.scale]
+    results = {}
+    print(f"{'benchmark':<36} {'mediana':>11} {'mínimo':>11} {'desv.':>11} {'rondas':>7}")
+    for item in selected:
+        stats = results[item.name] = item.run(scale)
+        print(f"{item.name:<36} {format_seconds(stats['median']):>11} {format_seconds(stats['min']):>11} "
+              f"{format_seconds(stats['stdev']):>11} {stats['rounds']:>7}", flush=True)
+    
+    if not args.no_save:
+        print(f"\nResultados guardados en {save_results(args.results_dir, args.scale, scale, results)}")
+    
+    baseline_path = find_baseline(args.results_dir, args.scale, args.compare)
+    if baseline_path is None:
+        if args.compare:
+            print(f"No hay resultados de {args.compare} con la escala {args.scale} en esta máquina")
+        return
+    
+    baseline = load_results(baseline_path)
+    print(f"\nComparación con {baseline['commit'][:12]}{' (con cambios sin confirmar)' if baseline['dirty'] else ''}:")
+    print(f"{'benchmark':<36} {'ahora':>11} {'antes':>11} {'cociente':>9}")
+    regressions = 0
+    for name, median, previous, ratio, verdict in compare(results, baseline, args.threshold):
+        ratio_text = f"{ratio:.2f}x" if ratio is not None else '-'
+        print(f"{name:<36} {format_seconds(median):>11} {format_seconds(previous):>11} {ratio_text:>9}  {verdict}")
+        regressions += verdict == 'REGRESIÓN'
+    
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""Eventos (tramos de trazas) de la generación de libros
+
+Revision ID: 2f8a6d1c5b93
+Revises: 9c4e2f7a1d36
+Create Date: 2026-10-19 17:24:12.603518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2f8a6d1c5b93'
+down_revision = '9c4e2f7a1d36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('generation_events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('trace_id', sa.String(length=32), nullable=False),
+    sa.Column('span_id', sa.String(length=16), nullable=False),
+    sa.Column('parent_id', sa.String(length=16), nullable=True),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('duration_ms', sa.Float(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attributes', sa.JSON(), nullable=True),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('generation_events', schema=None) as batch_op:
+        batch_op.create_index('ix_generation_events_book_id_started_at', ['book_id', 'started_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('generation_events', schema=None) as batch_op:
+        batch_op.drop_index('ix_generation_events_book_id_started_at')
+
+    op.drop_table('generation_events')
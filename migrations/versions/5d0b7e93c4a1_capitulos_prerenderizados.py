@@ -0,0 +1,31 @@
+"""Estructura y HTML prerenderizados de los capítulos
+
+Revision ID: 5d0b7e93c4a1
+Revises: c81e4b7a2d05
+Create Date: 2026-10-19 12:40:55.218730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d0b7e93c4a1'
+down_revision = 'c81e4b7a2d05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Los capítulos existentes se prerenderizan con `flask prerender-chapters`
+    with op.batch_alter_table('chapters', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('content_html', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('structure', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('chapters', schema=None) as batch_op:
+        batch_op.drop_column('structure')
+        batch_op.drop_column('content_html')
+        batch_op.drop_column('content_hash')
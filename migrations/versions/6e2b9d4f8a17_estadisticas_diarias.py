@@ -0,0 +1,47 @@
+"""Estadísticas diarias de la generación
+
+Revision ID: 6e2b9d4f8a17
+Revises: 2f8a6d1c5b93
+Create Date: 2026-10-19 19:02:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e2b9d4f8a17'
+down_revision = '2f8a6d1c5b93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_stats',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('model', sa.String(length=100), nullable=False),
+    sa.Column('books_completed', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('books_failed', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('chapters', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('chapter_failures', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('expansions', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('expansion_failures', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('input_tokens', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('output_tokens', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('thinking_tokens', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('latency_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('latency_seconds_total', sa.Float(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('day', 'model')
+    )
+    op.create_table('daily_latency_buckets',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('model', sa.String(length=100), nullable=False),
+    sa.Column('le_seconds', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('day', 'model', 'le_seconds')
+    )
+
+
+def downgrade():
+    op.drop_table('daily_latency_buckets')
+    op.drop_table('daily_stats')
@@ -0,0 +1,84 @@
+"""Índices para las consultas frecuentes de libros y capítulos
+
+Revision ID: 7b93f05d8e21
+Revises: e4c27a9f1b63
+Create Date: 2026-10-19 15:21:08.447913
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b93f05d8e21'
+down_revision = 'e4c27a9f1b63'
+branch_labels = None
+depends_on = None
+
+
+logger = logging.getLogger('alembic.env')
+
+# Tabla en la que se conservan los capítulos duplicados que impiden crear el índice único
+DUPLICATES_TABLE = 'chapters_duplicates'
+
+DUPLICATES_QUERY = (
+    "SELECT * FROM chapters WHERE id NOT IN ("
+    "SELECT MAX(id) FROM chapters GROUP BY book_id, chapter_number)"
+)
+
+
+def upgrade():
+    # Para crear el índice único cada libro solo puede tener un capítulo con cada número:
+    # se mantiene el más reciente y los anteriores se mueven a chapters_duplicates
+    connection = op.get_bind()
+    duplicates = connection.execute(sa.text(
+        f"SELECT id, book_id, chapter_number FROM ({DUPLICATES_QUERY}) duplicates "
+        "ORDER BY book_id, chapter_number, id"
+    )).all()
+    if duplicates:
+        op.execute(f"CREATE TABLE {DUPLICATES_TABLE} AS {DUPLICATES_QUERY}")
+        for chapter_id, book_id, chapter_number in duplicates:
+            logger.warning(
+                f"Capítulo duplicado {chapter_id} (libro {book_id}, capítulo {chapter_number}) "
+                f"movido a {DUPLICATES_TABLE}"
+            )
+        logger.warning(
+            f"{len(duplicates)} capítulos duplicados conservados en {DUPLICATES_TABLE}; "
+            "revísalos y elimina la tabla cuando ya no sean necesarios"
+        )
+        op.execute(f"DELETE FROM chapters WHERE id IN (SELECT id FROM {DUPLICATES_TABLE})")
+    op.execute(
+        "UPDATE books SET completed_chapters = "
+        "(SELECT COUNT(*) FROM chapters WHERE chapters.book_id = books.id)"
+    )
+
+    with op.batch_alter_table('chapters', schema=None) as batch_op:
+        batch_op.create_index('ix_chapters_book_id_chapter_number', ['book_id', 'chapter_number'], unique=True)
+
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_books_title'), ['title'], unique=False)
+        batch_op.create_index(batch_op.f('ix_books_status'), ['status'], unique=False)
+        batch_op.create_index(batch_op.f('ix_books_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_books_created_at'))
+        batch_op.drop_index(batch_op.f('ix_books_status'))
+        batch_op.drop_index(batch_op.f('ix_books_title'))
+
+    with op.batch_alter_table('chapters', schema=None) as batch_op:
+        batch_op.drop_index('ix_chapters_book_id_chapter_number')
+
+    # Devolver los capítulos duplicados que se apartaron al crear el índice
+    connection = op.get_bind()
+    if sa.inspect(connection).has_table(DUPLICATES_TABLE):
+        columns = ', '.join(column['name'] for column in sa.inspect(connection).get_columns(DUPLICATES_TABLE))
+        op.execute(f"INSERT INTO chapters ({columns}) SELECT {columns} FROM {DUPLICATES_TABLE}")
+        op.execute(f"DROP TABLE {DUPLICATES_TABLE}")
+        op.execute(
+            "UPDATE books SET completed_chapters = "
+            "(SELECT COUNT(*) FROM chapters WHERE chapters.book_id = books.id)"
+        )
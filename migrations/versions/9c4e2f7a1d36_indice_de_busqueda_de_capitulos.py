@@ -0,0 +1,44 @@
+"""Índice de búsqueda de texto completo de los capítulos
+
+Revision ID: 9c4e2f7a1d36
+Revises: 7b93f05d8e21
+Create Date: 2026-10-19 16:02:37.915204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4e2f7a1d36'
+down_revision = '7b93f05d8e21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Los capítulos existentes se indexan con `flask reindex-search`
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute(
+            "CREATE TABLE chapter_search ("
+            "chapter_id INTEGER PRIMARY KEY REFERENCES chapters (id) ON DELETE CASCADE, "
+            "book_id INTEGER NOT NULL REFERENCES books (id) ON DELETE CASCADE, "
+            "title TEXT NOT NULL, "
+            "body TEXT NOT NULL, "
+            "search_vector TSVECTOR GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('spanish', title), 'A') || setweight(to_tsvector('spanish', body), 'B')"
+            ") STORED)"
+        )
+        op.execute("CREATE INDEX ix_chapter_search_vector ON chapter_search USING GIN (search_vector)")
+        op.execute("CREATE INDEX ix_chapter_search_book_id ON chapter_search (book_id)")
+    elif dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE chapter_search USING fts5("
+            "title, body, book_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name in ('postgresql', 'sqlite'):
+        op.execute("DROP TABLE chapter_search")
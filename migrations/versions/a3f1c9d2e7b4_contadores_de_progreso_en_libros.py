@@ -0,0 +1,34 @@
+"""Contadores de progreso desnormalizados en libros
+
+Revision ID: a3f1c9d2e7b4
+Revises: 48d2690d0070
+Create Date: 2026-10-19 09:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f1c9d2e7b4'
+down_revision = '48d2690d0070'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('completed_chapters', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('progress_version', sa.Integer(), nullable=False, server_default='0'))
+
+    # Inicializar los contadores con los capítulos ya existentes
+    op.execute(
+        "UPDATE books SET completed_chapters = "
+        "(SELECT COUNT(*) FROM chapters WHERE chapters.book_id = books.id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.drop_column('progress_version')
+        batch_op.drop_column('completed_chapters')
@@ -0,0 +1,173 @@
+"""Capítulos sin copias sin comprimir del texto
+
+Revision ID: b58e3d1a9c24
+Revises: 6e2b9d4f8a17
+Create Date: 2026-10-20 10:14:06.532871
+
+"""
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b58e3d1a9c24'
+down_revision = '6e2b9d4f8a17'
+branch_labels = None
+depends_on = None
+
+
+# Capítulos indexados por sentencia al rellenar el índice de búsqueda
+INDEX_BATCH_SIZE = 200
+
+chapters = sa.table(
+    'chapters',
+    sa.column('id', sa.Integer),
+    sa.column('book_id', sa.Integer),
+    sa.column('title', sa.String),
+    sa.column('content_data', sa.LargeBinary),
+    sa.column('content_html', sa.Text),
+    sa.column('content_html_data', sa.LargeBinary),
+    sa.column('structure', sa.JSON)
+)
+
+
+def _chapter_text(data):
+    return zlib.decompress(data).decode('utf-8') if data is not None else None
+
+
+def _index_chapters(connection, statement):
+    """Ejecuta `statement` por lotes con el ID, el libro, el título y el texto de cada capítulo"""
+    chapter_ids = [row.id for row in connection.execute(sa.select(chapters.c.id).order_by(chapters.c.id))]
+    for start in range(0, len(chapter_ids), INDEX_BATCH_SIZE):
+        rows = connection.execute(
+            sa.select(chapters.c.id, chapters.c.book_id, chapters.c.title, chapters.c.content_data)
+            .where(chapters.c.id.in_(chapter_ids[start:start + INDEX_BATCH_SIZE]))
+        ).all()
+        if rows:
+            connection.execute(sa.text(statement), [
+                {'chapter_id': row.id, 'book_id': row.book_id, 'title': row.title, 'body': _chapter_text(row.content_data) or ''}
+                for row in rows
+            ])
+
+
+def upgrade():
+    connection = op.get_bind()
+    dialect = connection.dialect.name
+
+    # El índice de búsqueda se rehace sin el texto; en SQLite la vista sobre
+    # chapters debe crearse después de modificar la tabla
+    if dialect in ('postgresql', 'sqlite'):
+        op.execute("DROP TABLE chapter_search")
+
+    with op.batch_alter_table('chapters', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_html_data', sa.LargeBinary(), nullable=True))
+
+    # Comprimir el HTML y quitar los bloques de la estructura fila a fila
+    chapter_ids = [row.id for row in connection.execute(sa.select(chapters.c.id))]
+    for chapter_id in chapter_ids:
+        row = connection.execute(
+            sa.select(chapters.c.content_html, chapters.c.structure).where(chapters.c.id == chapter_id)
+        ).one()
+        structure = row.structure
+        if structure:
+            structure = {key: value for key, value in structure.items() if key != 'blocks'}
+        connection.execute(
+            chapters.update()
+            .where(chapters.c.id == chapter_id)
+            .values(
+                content_html_data=zlib.compress(row.content_html.encode('utf-8'), 6) if row.content_html is not None else None,
+                structure=structure if structure is not None else sa.null()
+            )
+        )
+
+    with op.batch_alter_table('chapters', schema=None) as batch_op:
+        batch_op.drop_column('content_html')
+
+    if dialect == 'postgresql':
+        op.execute(
+            "CREATE TABLE chapter_search ("
+            "chapter_id INTEGER PRIMARY KEY REFERENCES chapters (id) ON DELETE CASCADE, "
+            "book_id INTEGER NOT NULL REFERENCES books (id) ON DELETE CASCADE, "
+            "search_vector TSVECTOR NOT NULL)"
+        )
+        op.execute("CREATE INDEX ix_chapter_search_vector ON chapter_search USING GIN (search_vector)")
+        op.execute("CREATE INDEX ix_chapter_search_book_id ON chapter_search (book_id)")
+        # El texto ya no está en la tabla: se descomprime aquí para indexarlo
+        _index_chapters(
+            connection,
+            "INSERT INTO chapter_search (chapter_id, book_id, search_vector) VALUES (:chapter_id, :book_id, "
+            "setweight(to_tsvector('spanish', :title), 'A') || setweight(to_tsvector('spanish', :body), 'B'))"
+        )
+    elif dialect == 'sqlite':
+        # Índice de contenido externo: debe reflejar exactamente la vista, así que se llena aquí
+        connection.connection.driver_connection.create_function('chapter_text', 1, _chapter_text, deterministic=True)
+        op.execute(
+            "CREATE VIEW chapter_search_source AS "
+            "SELECT id, title, chapter_text(content_data) AS body FROM chapters"
+        )
+        op.execute(
+            "CREATE VIRTUAL TABLE chapter_search USING fts5("
+            "title, body, content = 'chapter_search_source', content_rowid = 'id', "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        op.execute("INSERT INTO chapter_search (chapter_search) VALUES ('rebuild')")
+
+
+def downgrade():
+    connection = op.get_bind()
+    dialect = connection.dialect.name
+
+    if dialect == 'postgresql':
+        op.execute("DROP TABLE chapter_search")
+    elif dialect == 'sqlite':
+        op.execute("DROP TABLE chapter_search")
+        op.execute("DROP VIEW chapter_search_source")
+
+    with op.batch_alter_table('chapters', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_html', sa.Text(), nullable=True))
+
+    # Sin los bloques, la estructura anterior no es válida: se vacía y
+    # `flask prerender-chapters` la vuelve a calcular
+    chapter_ids = [row.id for row in connection.execute(sa.select(chapters.c.id))]
+    for chapter_id in chapter_ids:
+        content_html_data = connection.execute(
+            sa.select(chapters.c.content_html_data).where(chapters.c.id == chapter_id)
+        ).scalar()
+        connection.execute(
+            chapters.update()
+            .where(chapters.c.id == chapter_id)
+            .values(content_html=_chapter_text(content_html_data), structure=sa.null())
+        )
+
+    with op.batch_alter_table('chapters', schema=None) as batch_op:
+        batch_op.drop_column('content_html_data')
+
+    if dialect == 'postgresql':
+        op.execute(
+            "CREATE TABLE chapter_search ("
+            "chapter_id INTEGER PRIMARY KEY REFERENCES chapters (id) ON DELETE CASCADE, "
+            "book_id INTEGER NOT NULL REFERENCES books (id) ON DELETE CASCADE, "
+            "title TEXT NOT NULL, "
+            "body TEXT NOT NULL, "
+            "search_vector TSVECTOR GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('spanish', title), 'A') || setweight(to_tsvector('spanish', body), 'B')"
+            ") STORED)"
+        )
+        op.execute("CREATE INDEX ix_chapter_search_vector ON chapter_search USING GIN (search_vector)")
+        op.execute("CREATE INDEX ix_chapter_search_book_id ON chapter_search (book_id)")
+        _index_chapters(
+            connection,
+            "INSERT INTO chapter_search (chapter_id, book_id, title, body) "
+            "VALUES (:chapter_id, :book_id, :title, :body)"
+        )
+    elif dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE chapter_search USING fts5("
+            "title, body, book_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        _index_chapters(
+            connection,
+            "INSERT INTO chapter_search (rowid, title, body, book_id) VALUES (:chapter_id, :title, :body, :book_id)"
+        )
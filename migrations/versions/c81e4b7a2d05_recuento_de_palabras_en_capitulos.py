@@ -0,0 +1,34 @@
+"""Recuento de palabras en capítulos
+
+Revision ID: c81e4b7a2d05
+Revises: a3f1c9d2e7b4
+Create Date: 2026-10-19 11:02:17.604392
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81e4b7a2d05'
+down_revision = 'a3f1c9d2e7b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('chapters', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('word_count', sa.Integer(), nullable=False, server_default='0'))
+
+    # Calcular el recuento de palabras de los capítulos existentes
+    connection = op.get_bind()
+    chapters = sa.table('chapters', sa.column('id', sa.Integer), sa.column('content', sa.Text), sa.column('word_count', sa.Integer))
+    for chapter_id, content in connection.execute(sa.select(chapters.c.id, chapters.c.content)).fetchall():
+        connection.execute(
+            chapters.update().where(chapters.c.id == chapter_id).values(word_count=len((content or '').split()))
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('chapters', schema=None) as batch_op:
+        batch_op.drop_column('word_count')
@@ -0,0 +1,26 @@
+"""Bloques prerenderizados de los capítulos
+
+Revision ID: d3a7c6f1e852
+Revises: b58e3d1a9c24
+Create Date: 2026-10-20 16:32:18.904517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3a7c6f1e852'
+down_revision = 'b58e3d1a9c24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Los capítulos existentes se prerenderizan con `flask prerender-chapters`.
+    # Sin batch: en SQLite recrear la tabla rompería la vista del índice de búsqueda
+    op.add_column('chapters', sa.Column('blocks_data', sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('chapters', 'blocks_data')
@@ -0,0 +1,69 @@
+"""Contenido de los capítulos comprimido con zlib
+
+Revision ID: e4c27a9f1b63
+Revises: 5d0b7e93c4a1
+Create Date: 2026-10-19 14:05:32.871046
+
+"""
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4c27a9f1b63'
+down_revision = '5d0b7e93c4a1'
+branch_labels = None
+depends_on = None
+
+
+chapters = sa.table(
+    'chapters',
+    sa.column('id', sa.Integer),
+    sa.column('content', sa.Text),
+    sa.column('content_data', sa.LargeBinary)
+)
+
+
+def upgrade():
+    with op.batch_alter_table('chapters', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_data', sa.LargeBinary(), nullable=True))
+
+    # Comprimir el contenido de los capítulos existentes fila a fila
+    connection = op.get_bind()
+    chapter_ids = [row.id for row in connection.execute(sa.select(chapters.c.id))]
+    for chapter_id in chapter_ids:
+        content = connection.execute(
+            sa.select(chapters.c.content).where(chapters.c.id == chapter_id)
+        ).scalar()
+        connection.execute(
+            chapters.update()
+            .where(chapters.c.id == chapter_id)
+            .values(content_data=zlib.compress((content or '').encode('utf-8'), 6))
+        )
+
+    with op.batch_alter_table('chapters', schema=None) as batch_op:
+        batch_op.alter_column('content_data', existing_type=sa.LargeBinary(), nullable=False)
+        batch_op.drop_column('content')
+
+
+def downgrade():
+    with op.batch_alter_table('chapters', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content', sa.Text(), nullable=True))
+
+    connection = op.get_bind()
+    chapter_ids = [row.id for row in connection.execute(sa.select(chapters.c.id))]
+    for chapter_id in chapter_ids:
+        content_data = connection.execute(
+            sa.select(chapters.c.content_data).where(chapters.c.id == chapter_id)
+        ).scalar()
+        connection.execute(
+            chapters.update()
+            .where(chapters.c.id == chapter_id)
+            .values(content=zlib.decompress(content_data).decode('utf-8'))
+        )
+
+    with op.batch_alter_table('chapters', schema=None) as batch_op:
+        batch_op.alter_column('content', existing_type=sa.Text(), nullable=False)
+        batch_op.drop_column('content_data')
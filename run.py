@@ -1,6 +1,13 @@
+import os
+import shutil
+import click
 from app import create_app, db
+from app.models.book import Book, Chapter
 from flask_migrate import upgrade
 
+# Los servicios que usan los comandos se importan dentro de cada comando para
+# que los procesos del servidor (que también cargan este módulo) arranquen antes.
+
 app = create_app()
 
 @app.cli.command("init-db")
@@ -10,5 +17,71 @@ def init_db():
         db.create_all()
         print("Base de datos inicializada.")
 
+@app.cli.command("prerender-chapters")
+def prerender_chapters():
+    """Prerenderiza la estructura, los bloques y el HTML de los capítulos que no están actualizados."""
+    from app.services.chapter_renderer import chapter_renderer
+    
+    with app.app_context():
+        updated = 0
+        for chapter in Chapter.query.options(
+            db.undefer(Chapter.structure), db.undefer(Chapter.blocks_data), db.undefer(Chapter.content_html_data)
+        ).yield_per(100):
+            if not chapter_renderer.is_current(chapter):
+                chapter_renderer.apply(chapter)
+                updated += 1
+        db.session.commit()
+        print(f"{updated} capítulos prerenderizados.")
+
+@app.cli.command("export-all")
+@click.option('--status', default='completed', show_default=True, help="Estado de los libros a exportar.")
+@click.option('--output-dir', type=click.Path(file_okay=False), help="Copiar además los DOCX a este directorio.")
+@click.option('--force', is_flag=True, help="Regenerar también los libros que ya están en caché.")
+def export_all(status, output_dir, force):
+    """Exporta a DOCX todo el catálogo con el exportador configurado (DOCX_WRITER)."""
+    from app.services.export_pipeline import export_all_books
+    from app.services.bulk_export import archive_filename
+    
+    with app.app_context():
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        totals = {'exported': 0, 'cached': 0, 'error': 0}
+        for book_uuid, path, result in export_all_books(status=status, force=force):
+            totals[result] += 1
+            if path and output_dir:
+                title = db.session.query(Book.title).filter_by(uuid=book_uuid).scalar()
+                shutil.copyfile(path, os.path.join(output_dir, archive_filename(title, book_uuid)))
+            click.echo(f"{result:>8}  {book_uuid}")
+        print(f"{totals['exported']} exportados, {totals['cached']} ya en caché, {totals['error']} con error.")
+
+@app.cli.command("reindex-search")
+@click.option('--book', 'book_uuid', help="Reindexar solo el libro con este UUID.")
+def reindex_search(book_uuid):
+    """Reconstruye el índice de búsqueda de texto completo de los capítulos."""
+    from app.services.search_index import rebuild_search_index
+    
+    with app.app_context():
+        book_id = None
+        if book_uuid:
+            book_id = db.session.query(Book.id).filter_by(uuid=book_uuid).scalar()
+            if book_id is None:
+                raise click.BadParameter(f"No existe el libro {book_uuid}", param_hint='--book')
+        indexed = rebuild_search_index(book_id)
+        print(f"{indexed} capítulos indexados.")
+
+@app.cli.command("rebuild-stats")
+@click.option('--since', help="Recalcular solo desde este día (AAAA-MM-DD).")
+def rebuild_stats(since):
+    """Recalcula las estadísticas diarias a partir de los libros, capítulos y trazas."""
+    from app.analytics import parse_day, rebuild_daily_stats
+    
+    try:
+        since_day = parse_day(since) if since else None
+    except ValueError:
+        raise click.BadParameter("Formato AAAA-MM-DD", param_hint='--since')
+    with app.app_context():
+        rows = rebuild_daily_stats(since_day)
+        print(f"{rows} filas de estadísticas diarias recalculadas.")
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file